@@ -0,0 +1,129 @@
+# Will Kearney
+# analysis_cache.py
+#
+# Defines the AnalysisCache class, a persistent SQLite cache of search results shared by every process that opens it.
+#
+# Results are keyed by position key (which includes the player to move), engine version and search settings, and hold
+# the best move, score and depth searched. CheckersGame stores them under the canonical key (see symmetry.py) when the
+# evaluation allows, so a position and its color-reversed twin share an entry. A lookup only hits if the stored search was at least as deep as the one
+# asked for. The least recently used entries are evicted once the cache holds more than max_entries.
+#
+# A search also depends on how the game got to the position: the halfmove clock decides when the no-progress rule
+# ends lines, and earlier positions count towards repetitions. Both go into the settings part of the key; the history
+# as a digest of the earlier positions since the last capture or man move (see get_history_digest).
+
+import hashlib
+import sqlite3
+import time
+
+from .constants import *
+
+# how many stores happen between checks of the cache size
+EVICTION_CHECK_INTERVAL = 256
+
+# when the cache is over its limit, it is trimmed down to this fraction of max_entries
+EVICTION_TARGET = 0.9
+
+class AnalysisCache(object):
+	"""Class for a size-bounded, least recently used cache of search results stored in an SQLite database."""
+	def __init__(self, path, max_entries=1000000):
+		super(AnalysisCache, self).__init__()
+
+		self.path = path
+		self.max_entries = max_entries
+		self.stores_since_eviction_check = 0
+
+		self.hits = 0
+		self.misses = 0
+
+		# autocommit, and write-ahead logging so several processes can read while one writes
+		self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS analysis ("
+			"position_key INTEGER NOT NULL, "
+			"settings TEXT NOT NULL, "
+			"best_move INTEGER, "
+			"score REAL, "
+			"depth INTEGER NOT NULL, "
+			"last_used REAL NOT NULL, "
+			"UNIQUE (position_key, settings))"
+		)
+		self.connection.execute("CREATE INDEX IF NOT EXISTS analysis_last_used ON analysis (last_used)")
+
+	def lookup(self, position_key, settings, depth):
+		'''Return (best_move, score, depth) from a search at least depth plies deep, or None if there isn't one.'''
+
+		# position keys are XORs of keys below 2**63, so they always fit in SQLite's signed 64-bit integers
+		row = self.connection.execute(
+			"SELECT rowid, best_move, score, depth FROM analysis WHERE position_key = ? AND settings = ? AND depth >= ?",
+			(position_key, settings, depth),
+		).fetchone()
+
+		if row is None:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		self.connection.execute("UPDATE analysis SET last_used = ? WHERE rowid = ?", (time.time(), row[0]))
+
+		return row[1], row[2], row[3]
+
+	def store(self, position_key, settings, best_move, score, depth):
+		'''Store a search result, unless a deeper one is already stored for the same position and settings.'''
+
+		self.connection.execute(
+			"INSERT INTO analysis (position_key, settings, best_move, score, depth, last_used) VALUES (?, ?, ?, ?, ?, ?) "
+			"ON CONFLICT (position_key, settings) DO UPDATE SET "
+			"best_move = excluded.best_move, score = excluded.score, depth = excluded.depth, last_used = excluded.last_used "
+			"WHERE excluded.depth >= analysis.depth",
+			(position_key, settings, best_move, float(score), depth, time.time()),
+		)
+
+		self.stores_since_eviction_check += 1
+		if self.stores_since_eviction_check >= EVICTION_CHECK_INTERVAL:
+			self.stores_since_eviction_check = 0
+			self.evict()
+
+	def evict(self):
+		'''Delete the least recently used entries if the cache is over max_entries.'''
+
+		num_entries = self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+		if num_entries <= self.max_entries:
+			return
+
+		num_to_delete = num_entries - int(self.max_entries * EVICTION_TARGET)
+		self.connection.execute(
+			"DELETE FROM analysis WHERE rowid IN (SELECT rowid FROM analysis ORDER BY last_used LIMIT ?)",
+			(num_to_delete,),
+		)
+
+	def get_hit_rate(self):
+		'''Returns the fraction of lookups that hit, or None if there haven't been any.'''
+
+		lookups = self.hits + self.misses
+		if lookups == 0:
+			return None
+
+		return self.hits / lookups
+
+	def close(self):
+		'''Close the database connection.'''
+
+		self.connection.close()
+
+def get_history_digest(position_history, position_key):
+	'''Returns a digest of a position history (a Counter of position keys, see CheckersGame) without the current
+	position, whose key is position_key, or None if there are no earlier positions.'''
+
+	earlier_positions = sorted((key, count - (key == position_key)) for key, count in position_history.items() if count - (key == position_key) > 0)
+	if len(earlier_positions) == 0:
+		return None
+
+	return hashlib.blake2b(repr(earlier_positions).encode(), digest_size=8).hexdigest()
+
+def get_cache_settings(evaluator_name, static_eval_limit, draw_plies, halfmove_clock=0, history_digest=None):
+	'''Build the settings part of a cache key. Anything that can change a search result belongs here.'''
+
+	return "v{} evaluator={} static_eval_limit={} draw_plies={} clock={} history={}".format(ENGINE_VERSION, evaluator_name, static_eval_limit, draw_plies, halfmove_clock, history_digest)
@@ -0,0 +1,194 @@
+# Will Kearney
+# assets.py
+#
+# Loads the images and font used by the GUI, on first use rather than at import.
+#
+# Decoding the full-size wood JPEGs and scaling the king PNGs is most of the GUI's startup time, so the first launch
+# stores the prepared surfaces (backgrounds cropped to the window, kings scaled to KING_ICON_SCALE) as raw pixels in a
+# cache file. Later launches read that file in one go and build the surfaces straight from the buffer. The cache is
+# keyed by the window and icon sizes and the source files, so changing either rebuilds it.
+#
+# The cache lives in assets/.cache unless CHECKERS_ASSET_CACHE names another file. To build it ahead of time (e.g. when
+# installing on a display machine), run:
+#   python -m checkers.assets
+
+import os
+import json
+import pygame
+import pygame.freetype
+
+from .constants import *
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), "../assets")
+
+# name -> (source file, how it is prepared, pixel format)
+ASSET_SOURCES = {
+	"dark_background": ("cherry-wood-background.jpeg", "crop", "RGB"),
+	"light_background": ("light-wood-background.jpeg", "crop", "RGB"),
+	"black_king": ("black-king.png", "king", "RGBA"),
+	"white_king": ("white-king.png", "king", "RGBA"),
+}
+
+# bump this if the cache file layout changes
+ASSET_CACHE_VERSION = 1
+
+# prepared surfaces by name, and the font, once loaded
+_surfaces = None
+_game_font = None
+
+def get_asset_cache_path():
+	'''Returns the path of the asset cache file for the current window and icon sizes.'''
+
+	default_path = os.path.join(ASSETS_DIR, ".cache", "assets-{}x{}-{}-{}.bin".format(WIDTH, HEIGHT, TILE_SIZE, KING_ICON_SCALE))
+
+	return os.environ.get("CHECKERS_ASSET_CACHE", default_path)
+
+def get_asset_cache_key():
+	'''Returns everything a cache file must match to be reused: the sizes it was built for and the source files.'''
+
+	sources = {}
+	for name, (file_name, _, _) in sorted(ASSET_SOURCES.items()):
+		source_stat = os.stat(os.path.join(ASSETS_DIR, file_name))
+		sources[name] = [source_stat.st_size, source_stat.st_mtime_ns]
+
+	return {"version": ASSET_CACHE_VERSION, "size": [WIDTH, HEIGHT, TILE_SIZE, KING_ICON_SCALE], "sources": sources}
+
+def prepare_surface(name):
+	'''Load a source image and crop or scale it for drawing.'''
+
+	file_name, preparation, _ = ASSET_SOURCES[name]
+	surface = pygame.image.load(os.path.join(ASSETS_DIR, file_name))
+
+	if preparation == "crop":
+		# the board only ever blits tiles from the top left WIDTH x HEIGHT of a background
+		width = min(surface.get_width(), WIDTH)
+		height = min(surface.get_height(), HEIGHT)
+		return surface.subsurface((0, 0, width, height)).copy()
+
+	return pygame.transform.scale(surface, (KING_ICON_SCALE, KING_ICON_SCALE))
+
+def write_asset_cache(path, surfaces):
+	'''Write prepared surfaces to a cache file: a JSON header line followed by the raw pixels of each surface.'''
+
+	entries = []
+	pixel_data = []
+	offset = 0
+
+	for name, surface in sorted(surfaces.items()):
+		pixel_format = ASSET_SOURCES[name][2]
+		pixels = pygame.image.tobytes(surface, pixel_format)
+
+		entries.append({"name": name, "size": surface.get_size(), "format": pixel_format, "offset": offset, "length": len(pixels)})
+		pixel_data.append(pixels)
+		offset += len(pixels)
+
+	header = json.dumps({"key": get_asset_cache_key(), "surfaces": entries}).encode("ascii")
+
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+	# write to a temporary file first, so a crash mid-write can't leave a truncated cache behind
+	temporary_path = path + ".tmp"
+	with open(temporary_path, "wb") as cache_file:
+		cache_file.write(header + b"\n")
+		for pixels in pixel_data:
+			cache_file.write(pixels)
+
+	os.replace(temporary_path, path)
+
+def read_asset_cache(path):
+	'''Read surfaces from a cache file. Returns None if there is no usable cache for the current sizes and sources.'''
+
+	try:
+		with open(path, "rb") as cache_file:
+			data = cache_file.read()
+	except OSError:
+		return None
+
+	header_end = data.find(b"\n")
+	if header_end < 0:
+		return None
+
+	try:
+		header = json.loads(data[:header_end].decode("ascii"))
+	except ValueError:
+		return None
+
+	if header.get("key") != get_asset_cache_key():
+		return None
+
+	pixels = memoryview(data)[header_end + 1:]
+
+	surfaces = {}
+	for entry in header["surfaces"]:
+		start = entry["offset"]
+		stop = start + entry["length"]
+		if stop > len(pixels):
+			return None
+
+		surfaces[entry["name"]] = pygame.image.frombytes(pixels[start:stop].tobytes(), tuple(entry["size"]), entry["format"])
+
+	if set(surfaces) != set(ASSET_SOURCES):
+		return None
+
+	return surfaces
+
+def build_asset_cache(path=None):
+	'''Prepare every surface from its source image and write the cache file. Returns the prepared surfaces.'''
+
+	path = path or get_asset_cache_path()
+	surfaces = {name: prepare_surface(name) for name in ASSET_SOURCES}
+
+	try:
+		write_asset_cache(path, surfaces)
+	except OSError as error:
+		# a read-only install still works, it just prepares the surfaces on every launch
+		print("Could not write the asset cache {}: {}".format(path, error))
+
+	return surfaces
+
+def load_surfaces():
+	'''Load the prepared surfaces from the cache, building it first if needed.'''
+
+	path = get_asset_cache_path()
+
+	surfaces = read_asset_cache(path)
+	if surfaces is None:
+		surfaces = build_asset_cache(path)
+
+	# once there is a window, convert to its pixel format so blits don't convert every frame
+	if pygame.display.get_init() and pygame.display.get_surface() is not None:
+		for name, surface in surfaces.items():
+			if ASSET_SOURCES[name][2] == "RGBA":
+				surfaces[name] = surface.convert_alpha()
+			else:
+				surfaces[name] = surface.convert()
+
+	return surfaces
+
+def get_asset(name):
+	'''Returns the prepared surface called name (see ASSET_SOURCES), loading every surface on first use.'''
+
+	global _surfaces
+
+	if _surfaces is None:
+		_surfaces = load_surfaces()
+
+	return _surfaces[name]
+
+def get_game_font():
+	'''Returns the font used for all text, loading it when the first text is drawn.'''
+
+	global _game_font
+
+	if _game_font is None:
+		pygame.freetype.init()
+
+		# pygame's bundled default font; looking it up by name with SysFont scans the system fonts and ends up here anyway
+		_game_font = pygame.freetype.Font(None, 0)
+
+	return _game_font
+
+if __name__ == '__main__':
+	pygame.init()
+	build_asset_cache()
+	print("Built {}".format(get_asset_cache_path()))
@@ -0,0 +1,180 @@
+# Will Kearney
+# batch.py
+#
+# A command line tool for scoring large sets of positions (e.g. blunder checks on recorded games).
+#
+# Positions are read from a file with one FEN string per line (blank lines and lines starting with # are skipped).
+# They are packed into a single int8 array in shared memory, so workers only receive (start, stop) index ranges
+# instead of pickled Board objects. Results are written as soon as each chunk finishes, so output order may differ from
+# input order; the first column is the index of the position in the input, counting only position lines.
+#
+# Usage: python -m checkers.batch positions.txt --depth 6 --workers 8 > results.tsv
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+
+from .game import CheckersGame
+from .kernel import get_backend
+from .analysis_cache import AnalysisCache
+from .notation import NUM_SQUARES, packed_from_fen, packed_to_fen, unpack_board, move_to_pdn
+from .constants import *
+
+# each packed row holds the 32 squares followed by the side to move
+PACKED_ROW_SIZE = NUM_SQUARES + 1
+
+# worker process globals, set up once per worker by attach_shared_positions()
+_shared_memory = None
+_shared_positions = None
+_analysis_cache = None
+
+def read_positions(path):
+	'''Read a file of FEN strings into an (N, 33) int8 array of packed positions.'''
+
+	rows = []
+	with open(path) as positions_file:
+		for line in positions_file:
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+
+			packed, player = packed_from_fen(line)
+			rows.append(np.append(packed, np.int8(player)))
+
+	if len(rows) == 0:
+		return np.zeros((0, PACKED_ROW_SIZE), dtype=np.int8)
+
+	return np.stack(rows)
+
+def attach_shared_positions(name, shape, backend, cache_path):
+	'''Worker initializer: attach to the shared position array created by the parent process, build the kernel backend and open the analysis cache.'''
+
+	global _shared_memory, _shared_positions, _analysis_cache
+
+	get_backend(backend)
+
+	if cache_path:
+		_analysis_cache = AnalysisCache(cache_path)
+
+	_shared_memory = shared_memory.SharedMemory(name=name)
+	_shared_positions = np.ndarray(shape, dtype=np.int8, buffer=_shared_memory.buf)
+
+def analyse_chunk(start, stop, depth, node_limit, time_limit, difficulty_level, aggressive, backend, multipv=1):
+	'''Search positions start to stop (exclusive) from the shared array. Returns a list of result dictionaries.
+	With multipv above 1, each result also lists the best multipv moves with their scores and principal variations.'''
+
+	results = []
+
+	# one game for the whole chunk, so its transposition table and move cache are only made once and carry over from
+	# position to position; set_position starts the history again for each one
+	game = CheckersGame(backend=backend)
+	game.difficulty_level = difficulty_level
+	game.aggressive_AI = aggressive
+	game.analysis_cache = _analysis_cache
+
+	for index in range(start, stop):
+		packed = _shared_positions[index, :NUM_SQUARES]
+		player = int(_shared_positions[index, NUM_SQUARES])
+
+		game.set_position(unpack_board(packed), player)
+
+		if multipv > 1:
+			depths_reached = []
+			lines = game.search_multipv(player, depth, multipv, node_limit=node_limit, time_limit=time_limit, info_callback=lambda current_depth, *_: depths_reached.append(current_depth))
+
+			move, evaluation, principal_variation = lines[0] if lines else (None, None, [])
+			depth_reached = depths_reached[-1] if depths_reached else 0
+			nodes = game.nodes_searched
+		else:
+			evaluation, move, depth_reached, nodes = game.search(player, depth, node_limit=node_limit, time_limit=time_limit)
+			principal_variation = game.principal_variation
+
+		result = {
+			"index": index,
+			"fen": packed_to_fen(packed, player),
+			"best_move": move_to_pdn(*move) if move else None,
+			"score": None if evaluation is None else float(evaluation),
+			"depth": depth_reached,
+			"nodes": nodes,
+			"pv": [move_to_pdn(*pv_move) for pv_move in principal_variation],
+		}
+
+		if multipv > 1:
+			result["lines"] = [{"move": move_to_pdn(*line_move), "score": float(line_evaluation), "pv": [move_to_pdn(*pv_move) for pv_move in principal_variation]} for line_move, line_evaluation, principal_variation in lines]
+
+		results.append(result)
+
+	return results
+
+def write_result(result, output, output_format):
+	'''Write a single result line in TSV or JSON lines format.'''
+
+	if output_format == "json":
+		output.write(json.dumps(result) + "\n")
+	else:
+		columns = [result["index"], result["fen"], result["best_move"] or "none", result["score"], result["depth"], result["nodes"]]
+
+		# multi-PV lines go in one extra column, e.g. "0.08 11-15 23-19; -0.1 9-13 22-18"
+		if "lines" in result:
+			columns.append("; ".join("{} {}".format(line["score"], " ".join(line["pv"])) for line in result["lines"]))
+
+		output.write("\t".join(str(column) for column in columns) + "\n")
+
+	output.flush()
+
+def analyse_positions(positions, depth, node_limit=None, time_limit=None, difficulty_level="Hard", aggressive=False, workers=None, chunk_size=4, backend="auto", cache_path=None, multipv=1):
+	'''Analyse an (N, 33) packed position array across a process pool, yielding result dictionaries as chunks finish.'''
+
+	workers = workers or os.cpu_count() or 1
+
+	if len(positions) == 0:
+		return
+
+	shared = shared_memory.SharedMemory(create=True, size=positions.nbytes)
+	try:
+		shared_positions = np.ndarray(positions.shape, dtype=np.int8, buffer=shared.buf)
+		shared_positions[:] = positions
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_positions, initargs=(shared.name, positions.shape, backend, cache_path)) as pool:
+			futures = []
+			for start in range(0, len(positions), chunk_size):
+				stop = min(start + chunk_size, len(positions))
+				futures.append(pool.submit(analyse_chunk, start, stop, depth, node_limit, time_limit, difficulty_level, aggressive, backend, multipv))
+
+			for future in concurrent.futures.as_completed(futures):
+				for result in future.result():
+					yield result
+
+		del shared_positions
+	finally:
+		shared.close()
+		shared.unlink()
+
+def main():
+	parser = argparse.ArgumentParser(description="Score a file of FEN positions with fixed-budget searches.")
+	parser.add_argument("positions", help="file with one FEN position per line")
+	parser.add_argument("--depth", type=int, default=6, help="maximum search depth")
+	parser.add_argument("--nodes", type=int, default=None, help="node budget per position")
+	parser.add_argument("--movetime", type=int, default=None, help="time budget per position, in milliseconds")
+	parser.add_argument("--level", default="Hard", choices=sorted(AI_SETTINGS), help="difficulty level (sets the static evaluation limit)")
+	parser.add_argument("--aggressive", action="store_true", help="use the Aggressive evaluation profile")
+	parser.add_argument("--multipv", type=int, default=1, help="report scores and principal variations for this many best moves")
+	parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+	parser.add_argument("--chunk-size", type=int, default=4, help="positions sent to a worker per task")
+	parser.add_argument("--format", choices=["tsv", "json"], default="tsv", help="output format")
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation and evaluation backend")
+	parser.add_argument("--cache", default=None, help="SQLite analysis cache shared by the workers (and later runs)")
+	args = parser.parse_args()
+
+	positions = read_positions(args.positions)
+	time_limit = args.movetime / 1000 if args.movetime else None
+
+	for result in analyse_positions(positions, args.depth, args.nodes, time_limit, args.level, args.aggressive, args.workers, args.chunk_size, args.backend, args.cache, args.multipv):
+		write_result(result, sys.stdout, args.format)
+
+if __name__ == '__main__':
+	main()
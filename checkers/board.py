@@ -10,24 +10,39 @@ import copy
 import numpy as np
 
 from .piece import Piece
+from .assets import get_asset
 from .constants import *
 
 class Board(object):
 	"""Class for representing a Board, which is owned by a CheckersGame object."""
-	def __init__(self):
+	def __init__(self, setup=True):
 		super(Board, self).__init__()
 
 		self.board = np.empty((NUM_ROWS, NUM_COLS), dtype=Piece) # init an 8x8 board with nothing
 
-		self.reset()
+		# Zobrist hash of the piece layout (not including the player to move), kept up to date by move_piece
+		self.hash = 0
+
+		# number of plies since the last capture or man move, used for the no-progress draw rule
+		self.halfmove_clock = 0
 
 		# is a piece selected?
 		self.selected_piece = None
 
 		# this is a list that stores tuples for legal moves, if a piece is selected
 		self.legal_move_tiles = []
+
+		# the human's legal moves this turn, as {from_location: [to_location, ...]}, computed once by update_human_moves
+		self.human_moves = {}
 		self.human_forced_capture_moves = [] # used to handle forced capture moves
 
+		# the most recent move made on this board, as a (from_location, to_location) tuple
+		self.last_move = None
+
+		# an empty board is used when building a position directly (e.g. from a FEN string)
+		if setup:
+			self.reset()
+
 	def reset(self):
 		'''Resets the board.'''
 
@@ -58,59 +73,44 @@ class Board(object):
 
 		# this is a list that stores tuples for legal moves, if a piece is selected
 		self.legal_move_tiles = []
-		self.human_forced_capture_moves = []
+		self.last_move = None
 
-	def update_force_capture_list(self):
-		'''Updates a list with all capture moves that are available.'''
+		self.compute_hash()
+		self.halfmove_clock = 0
 
-		all_positions = list(itertools.product(list(range(NUM_ROWS)), repeat=2))
+		self.update_human_moves()
 
-		self.human_forced_capture_moves = []
+	def compute_hash(self):
+		'''Recompute the Zobrist hash from scratch. Only needed after placing pieces in self.board directly; move_piece keeps it up to date.'''
 
-		for from_location in all_positions:
-			from_row = from_location[0]
-			from_col = from_location[1]
+		self.hash = 0
+		for index, (row, col) in enumerate(SQUARE_LOCATIONS):
+			if self.board[row, col]:
+				self.hash ^= ZOBRIST_TABLE[self.board[row, col].get_value() + 2][index]
 
-			if self.board[from_row, from_col] and self.board[from_row, from_col].indicator == -1:
-				# there is a piece here that can be moved. Let's see where it can be moved to...
+	def update_human_moves(self):
+		'''Updates the map of the human's (black's) legal moves, and the list of pieces that have a capture. Call once per human turn.'''
 
-				for to_location in all_positions:
+		self.human_moves = {}
+		self.human_forced_capture_moves = []
 
-					# print("\nChecking move ({}, {}) to ({}, {})".format(from_row, from_col, to_row, to_col))
-					move_legality = self.check_move_legality(from_location, to_location)
+		for from_location, to_location, captured_location in self.get_legal_moves(-1):
+			self.human_moves.setdefault(from_location, []).append(to_location)
 
-					# check if this is a capture scenario
-					if move_legality and not isinstance(move_legality, bool):
-						self.human_forced_capture_moves.append(from_location)
+			# get_legal_moves only returns captures when one is available
+			if captured_location is not None and from_location not in self.human_forced_capture_moves:
+				self.human_forced_capture_moves.append(from_location)
 
 	def update_legal_moves(self):
-		'''Updates a list with all the currently legal moves. Used by minimax to get possible next moves.'''
-
-		self.legal_move_tiles = []
+		'''Updates the list of tiles the selected piece can move to, from the human move map.'''
 
 		if not self.selected_piece:
-			# no piece is selected, so just do nothing
+			# no piece is selected, so there's nothing to highlight
+			self.legal_move_tiles = []
 			return
 
-		# otherwise, let's get the selected piece and see where it can move....
-		from_location = (self.selected_piece.row, self.selected_piece.col)
-
-		force_capture_moves = []
-		for to_row in range(NUM_ROWS):
-			for to_col in range(NUM_COLS):
-				to_location = (to_row, to_col)
-
-				move_legality = self.check_move_legality(from_location, to_location)
-				if move_legality:
-					self.legal_move_tiles.append(to_location)
-				if not isinstance(move_legality, bool):
-					# this is a capture
-					force_capture_moves.append((to_row, to_col))
-
-		# remove all the moves that aren't a capture, assuming that this is a capture
-		if len(force_capture_moves) > 0:
-			self.legal_move_tiles = force_capture_moves
-					
+		self.legal_move_tiles = self.human_moves.get((self.selected_piece.row, self.selected_piece.col), [])
+
 	def deselect_other_pieces(self, selected_piece):
 		'''Helper function to deselect all the pieces except for the one passed in as an argument.'''
 
@@ -122,41 +122,35 @@ class Board(object):
 	def select_piece(self, x, y):
 		'''Given x and y (position in window coordinates), select a piece if we need to.'''
 
-		for row in range(NUM_ROWS):
-			for col in range(NUM_COLS):
-
-				# check if there's a piece here AND our click selected it AND it's not already selected
-				if self.board[row, col] and self.board[row, col].check_select(x, y) and self.board[row, col].selected == False:
-
-					if self.board[row, col] and self.board[row, col].indicator == 1:
-						# if it's white, don't select it
-						return
-
-					# first select it
-					self.selected_piece = self.board[row, col]
-					self.board[row, col].selected = True
+		# every tile is the same size, so the clicked tile is found directly
+		row = int(y // TILE_SIZE)
+		col = int(x // TILE_SIZE)
 
-					self.deselect_other_pieces(self.board[row, col])
-
-					# update the legal moves
-					self.update_legal_moves()
+		if row < 0 or row >= NUM_ROWS or col < 0 or col >= NUM_COLS or not self.board[row, col]:
+			# this means no piece was clicked
+			return False
 
-					return True
+		piece = self.board[row, col]
 
-				elif self.board[row, col] and self.board[row, col].check_select(x, y) and self.board[row, col].selected == True:
+		if piece.indicator == 1:
+			# if it's white, don't select it
+			return
 
-					# deselect it
-					self.selected_piece = None
-					self.board[row, col].selected = False
+		if piece.selected == False:
+			# first select it
+			self.selected_piece = piece
+			piece.selected = True
 
-					# update the legal moves
-					self.update_legal_moves()
+			self.deselect_other_pieces(piece)
+		else:
+			# deselect it
+			self.selected_piece = None
+			piece.selected = False
 
-					return True
+		# update the legal moves
+		self.update_legal_moves()
 
-		else:
-			# this means no piece was clicked
-			return False
+		return True
 
 	def draw_board(self, window, pieces=True):
 		'''Given a pygame window, draw the current game state.'''
@@ -168,9 +162,9 @@ class Board(object):
 					# row and col are either both even or odd, so fill this in with red
 					# pygame.draw.rect(surface, RED, (col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE))
 
-					window.blit(LIGHT_BACKGROUND, (col*TILE_SIZE, row*TILE_SIZE), (col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE))
+					window.blit(get_asset("light_background"), (col*TILE_SIZE, row*TILE_SIZE), (col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE))
 				else:
-					window.blit(DARK_BACKGROUND, (col*TILE_SIZE, row*TILE_SIZE), (col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE))
+					window.blit(get_asset("dark_background"), (col*TILE_SIZE, row*TILE_SIZE), (col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE))
 
 				# check if there is a piece here, and if so draw it
 				if pieces and isinstance(self.board[row, col], Piece):
@@ -286,9 +280,17 @@ class Board(object):
 		if not move_legality:
 			return None
 
+		moving_piece = self.board[from_row, from_col]
+		was_king = moving_piece.king
+
+		# take the piece off its old square in the hash; it goes back in below, once we know if it was crowned
+		self.hash ^= ZOBRIST_TABLE[moving_piece.get_value() + 2][LOCATION_SQUARES[(from_row, from_col)]]
+
 		self.board[to_row, to_col] = self.board[from_row, from_col]
 		self.board[from_row, from_col] = None
 
+		self.last_move = ((from_row, from_col), (to_row, to_col))
+
 		# update the position in the piece object
 		self.board[to_row, to_col].row = to_row
 		self.board[to_row, to_col].col = to_col
@@ -307,49 +309,72 @@ class Board(object):
 			if self.board[move_legality[0], move_legality[1]].king == True:
 				self.board[to_row, to_col].king = True
 
+			self.hash ^= ZOBRIST_TABLE[self.board[move_legality[0], move_legality[1]].get_value() + 2][LOCATION_SQUARES[move_legality]]
+
 			self.board[move_legality[0], move_legality[1]] = None
 
+		self.hash ^= ZOBRIST_TABLE[moving_piece.get_value() + 2][LOCATION_SQUARES[(to_row, to_col)]]
+
+		# captures and man moves can't be undone, so they reset the draw clock
+		if was_king and isinstance(move_legality, bool):
+			self.halfmove_clock += 1
+		else:
+			self.halfmove_clock = 0
+
 		return self.board[to_row, to_col]
 
-	def get_possible_next_moves(self, player):
-		'''Given a board configuration and a player to move, return all possible moves that can be made in the form of new boards'''
+	def get_legal_moves(self, player):
+		'''Given a player, return all legal moves as (from_location, to_location, captured_location) tuples. If any capture is available only captures are returned.'''
 
-		all_positions = list(itertools.product(list(range(NUM_ROWS)), repeat=2))
+		legal_moves = []
+		capture_moves = []
 
-		possible_next_moves = []
-		forced_capture_moves = []
+		for from_row in range(NUM_ROWS):
+			for from_col in range(NUM_COLS):
+				piece = self.board[from_row, from_col]
+
+				if not piece or piece.indicator != player:
+					continue
 
-		for from_location in all_positions:
-			from_row = from_location[0]
-			from_col = from_location[1]
+				# a piece can only ever land one or two diagonal steps away, so there are at most 8 targets to check
+				for row_step in (piece.indicator, -piece.indicator):
+					if row_step != piece.indicator and not piece.king:
+						continue
 
-			if self.board[from_row, from_col] and self.board[from_row, from_col].indicator == player:
-				# there is a piece here that can be moved. Let's see where it can be moved to...
-				for to_location in all_positions:
-					to_row = to_location[0]
-					to_col = to_location[1]
+					for col_step in (-1, 1):
+						for distance in (1, 2):
+							to_location = (from_row + row_step * distance, from_col + col_step * distance)
 
-					# print("\nChecking move ({}, {}) to ({}, {})".format(from_row, from_col, to_row, to_col))
-					move_legality = self.check_move_legality(from_location, to_location)
+							move_legality = self.check_move_legality((from_row, from_col), to_location)
 
-					if move_legality:
-						# this is a legal move
-						# create a copy of this board
-						possible_game_state = copy.deepcopy(self)
+							if not move_legality:
+								continue
 
-						# make the move
-						possible_game_state.move_piece(from_row, from_col, to_row, to_col)
+							if isinstance(move_legality, bool):
+								legal_moves.append(((from_row, from_col), to_location, None))
+							else:
+								capture_moves.append(((from_row, from_col), to_location, move_legality))
 
-						# check to see if it was a capture
-						if not isinstance(move_legality, bool):
-							forced_capture_moves.append(possible_game_state)
-						
-						# append to our list
-						possible_next_moves.append(possible_game_state)		
+		if len(capture_moves) > 0:
+			# captures are forced
+			return capture_moves
 
-		if len(forced_capture_moves) > 0:
-			# there were capture moves
-			possible_next_moves = forced_capture_moves
+		return legal_moves
+
+	def get_possible_next_moves(self, player):
+		'''Given a board configuration and a player to move, return all possible moves that can be made in the form of new boards'''
+
+		possible_next_moves = []
+
+		for from_location, to_location, _ in self.get_legal_moves(player):
+			# create a copy of this board
+			possible_game_state = copy.deepcopy(self)
+
+			# make the move
+			possible_game_state.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+
+			# append to our list
+			possible_next_moves.append(possible_game_state)
 
 		np.random.shuffle(possible_next_moves)
 
@@ -443,4 +468,17 @@ class Board(object):
 
 	def __str__(self):
 		'''Overwrite the built-in string method. We use this printing boards to the console for debugging.'''
-		return np.array2string(self.board, formatter={'all': lambda x: "w" if x and x.indicator == 1 else ("b" if x and x.indicator == -1 else "-")})
\ No newline at end of file
+
+		rows = []
+		for row in range(NUM_ROWS):
+			symbols = []
+			for piece in self.board[row]:
+				if piece is None:
+					symbols.append("-")
+				elif piece.indicator == 1:
+					symbols.append("w")
+				else:
+					symbols.append("b")
+			rows.append("[" + " ".join(symbols) + "]")
+
+		return "[" + "\n ".join(rows) + "]"
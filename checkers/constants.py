@@ -2,11 +2,10 @@
 # constants.py
 #
 # this file contains constants used by different parts of the checkers game.
-# It also loads assets.
 
 import pygame
-import pygame.freetype
 import os
+import numpy as np
 
 # board constants in pixels
 WIDTH = 800
@@ -22,9 +21,114 @@ PIECE_RADIUS_SELECTED = PIECE_RADIUS * 1.1
 KING_ICON_SIZE = 400
 KING_ICON_SCALE = int(PIECE_RADIUS*1.3)
 
+# the 32 dark squares, numbered as in standard PDN (see notation.py); index 0 is PDN square 1
+NUM_SQUARES = 32
+
+# packed piece values; the sign is the piece indicator (1 = white, -1 = black) and kings are worth 2
+EMPTY = 0
+WHITE_MAN = 1
+WHITE_KING = 2
+BLACK_MAN = -1
+BLACK_KING = -2
+
+# square index (0-31) -> (row, col), and the reverse lookup
+SQUARE_LOCATIONS = []
+for _index in range(NUM_SQUARES):
+	_row = NUM_ROWS - 1 - (_index // 4)
+	_col = 2 * (3 - _index % 4) + (1 if _row % 2 == 0 else 0)
+	SQUARE_LOCATIONS.append((_row, _col))
+
+LOCATION_SQUARES = {location: index for index, location in enumerate(SQUARE_LOCATIONS)}
+
+# Zobrist keys for 64-bit position hashes; the seed is fixed so keys agree across processes and runs
+_zobrist_generator = np.random.default_rng(20221031)
+ZOBRIST_KEYS = _zobrist_generator.integers(0, 2**63, size=(5, NUM_SQUARES), dtype=np.uint64) # indexed by [piece value + 2, square]
+ZOBRIST_WHITE_TO_MOVE = int(_zobrist_generator.integers(0, 2**63, dtype=np.uint64))
+ZOBRIST_TABLE = [[int(key) for key in ZOBRIST_KEYS[value + 2]] for value in range(-2, 3)] # plain ints are much faster to XOR
+
+# bump this whenever a change alters search results, so cached analysis from older engines is ignored
+ENGINE_VERSION = 4
+
+# transposition table: entries live in a fixed-size list indexed by the low bits of the position key, so memory stays bounded
+TRANSPOSITION_TABLE_SIZE = 2**18
+TRANSPOSITION_TABLE_MASK = TRANSPOSITION_TABLE_SIZE - 1
+
+# what a stored score means: the exact value, or a lower or upper bound from an alpha-beta cutoff
+EXACT_BOUND = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# endgame solver (see solver.py): make_AI_move tries to prove a result once there are at most this many pieces left,
+# giving up after this many nodes; the solver's table holds this many entries, and lines longer than this are draws
+SOLVER_PIECE_THRESHOLD = 6
+SOLVER_NODE_LIMIT = 20000
+SOLVER_TABLE_SIZE = 2**18
+SOLVER_MAX_PLIES = 200
+
+# the share of a timed move (see CheckersGame.move_time) the solver may spend before the search gets the rest
+SOLVER_TIME_SHARE = 0.25
+
+# draw rules: a position repeated this many times is a draw, as is this many plies without a capture or a man moving
+REPETITION_LIMIT = 3
+DRAW_PLIES = 80
+
 # misc game constants
 FPS = 60
 
+# AI search settings for each difficulty level: (search depth, static evaluation limit)
+AI_SETTINGS = {
+	"Easy": (5, 5000),
+	"Medium": (6, 7500),
+	"Hard": (6, 10000),
+}
+
+# the deepest iterative deepening goes when a search is limited by nodes or time rather than depth
+MAX_SEARCH_DEPTH = 64
+
+# how many positions' move lists each game's MoveCache keeps (see move_cache.py)
+MOVE_CACHE_SIZE = 2**16
+
+# search traces (see search_trace.py): the largest a trace file may grow, and how many records are buffered between writes
+SEARCH_TRACE_MAX_BYTES = 256 * 2**20
+SEARCH_TRACE_BUFFER_RECORDS = 2**14
+
+# engine matches (see tournament.py): the SPRT's Elo differences under H0 and H1, and its false positive and false
+# negative rates
+SPRT_ELO0 = 0.0
+SPRT_ELO1 = 50.0
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+
+# how many leaf positions a self-play batch has room for before it grows (see selfplay.py)
+SELFPLAY_BATCH_CAPACITY = 2**16
+
+# Monte Carlo tree search (see mcts.py): seconds per move at each difficulty level, the UCT exploration constant, how
+# many plies a playout runs before the evaluation scores it, and how many nodes a tree has room for before it grows
+MCTS_SETTINGS = {
+	"Easy": 0.5,
+	"Medium": 1.0,
+	"Hard": 2.0,
+}
+MCTS_EXPLORATION = 1.0
+MCTS_PLAYOUT_PLIES = 60
+MCTS_INITIAL_NODES = 2**14
+
+# evaluation weight profiles (see evaluation.py). Every term except centroid is a piece-square term, so the search can
+# keep the evaluation up to date incrementally as moves are made and unmade.
+#   man, king      material value of each piece
+#   tempo          bonus per row a man has advanced
+#   back_rank      bonus for a man still guarding its own back row
+#   center         bonus for a man on one of the central squares
+#   king_center    bonus for a king on one of the central squares
+#   centroid       penalty per unit of distance between the two sides' centroids (the old aggressive mode)
+EVALUATION_PROFILES = {
+	"Material": {"man": 1.0, "king": 2.0, "tempo": 0.0, "back_rank": 0.0, "center": 0.0, "king_center": 0.0, "centroid": 0.0},
+	"Normal": {"man": 1.0, "king": 1.6, "tempo": 0.03, "back_rank": 0.12, "center": 0.08, "king_center": 0.1, "centroid": 0.0},
+	"Aggressive": {"man": 1.0, "king": 1.6, "tempo": 0.03, "back_rank": 0.12, "center": 0.08, "king_center": 0.1, "centroid": 1.0},
+	"Defensive": {"man": 1.0, "king": 1.6, "tempo": 0.0, "back_rank": 0.3, "center": 0.08, "king_center": 0.1, "centroid": 0.0},
+}
+DEFAULT_EVALUATION_PROFILE = "Normal"
+
 # colors in RGB
 WHITE = (255, 255, 255, .1)
 BLACK = (0, 0, 0)
@@ -48,19 +152,4 @@ HARD_COLOR = (255, 128, 128)
 
 CAPTION = "Welcome to Checkers"
 
-base_path = os.path.dirname(__file__)
-dark_background_path = os.path.join(base_path, "../assets/cherry-wood-background.jpeg")
-light_background_path = os.path.join(base_path, "../assets/light-wood-background.jpeg")
-DARK_BACKGROUND = pygame.image.load(dark_background_path)
-LIGHT_BACKGROUND = pygame.image.load(light_background_path)
-
-black_king_path = os.path.join(base_path, "../assets/black-king.png")
-white_king_path = os.path.join(base_path, "../assets/white-king.png")
-BLACK_KING_ICON_UNSCALED = pygame.image.load(black_king_path)
-WHITE_KING_ICON_UNSCALED = pygame.image.load(white_king_path)
-
-BLACK_KING_ICON = pygame.transform.scale(BLACK_KING_ICON_UNSCALED, (KING_ICON_SCALE, KING_ICON_SCALE))
-WHITE_KING_ICON = pygame.transform.scale(WHITE_KING_ICON_UNSCALED, (KING_ICON_SCALE, KING_ICON_SCALE))
-
-default_font = pygame.font.get_default_font()
-game_font = pygame.freetype.SysFont(default_font, 0)
\ No newline at end of file
+# images and the font are loaded on first use; see assets.py
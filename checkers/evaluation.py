@@ -0,0 +1,103 @@
+# Will Kearney
+# evaluation.py
+#
+# Piece-square table evaluation. Each profile in EVALUATION_PROFILES (see constants.py) is turned into one table holding
+# the value of every piece on every square: material plus the tempo, back rank and center terms. Black's entries are
+# white's mirrored across the board and negated, so the evaluation stays positive for white.
+#
+# Because the table value of a position is just a sum over its pieces, SearchBoard updates it as moves are made and
+# unmade, and a static evaluation costs the same no matter how many terms a profile has. It keeps the sum in integer
+# units of 1/TABLE_SCORE_UNITS, so however many moves are made and unmade it never drifts from a fresh sum.
+
+import numpy as np
+
+from .constants import *
+
+# the dark squares in the middle 4x4 of the board, where pieces control the most of it
+CENTER_LOCATIONS = {location for location in SQUARE_LOCATIONS if 2 <= location[0] <= 5 and 2 <= location[1] <= 5}
+
+# SearchBoard's running table score counts in units of 1/TABLE_SCORE_UNITS (profile weights are far coarser than that)
+TABLE_SCORE_UNITS = 10**6
+
+# square -> row and col, for the centroid term of evaluate_batch
+SQUARE_ROWS = np.array([location[0] for location in SQUARE_LOCATIONS], dtype=np.float64)
+SQUARE_COLS = np.array([location[1] for location in SQUARE_LOCATIONS], dtype=np.float64)
+
+def build_piece_square_table(weights):
+	'''Build a (5, 32) table of piece values from a dict of weights, indexed by [piece value + 2, square].'''
+
+	table = np.zeros((5, NUM_SQUARES), dtype=np.float64)
+
+	for square, (row, col) in enumerate(SQUARE_LOCATIONS):
+		center = (row, col) in CENTER_LOCATIONS
+
+		# white starts on row 0 and advances towards row 7; black is the mirror image
+		for indicator, rows_advanced, on_back_rank in ((1, row, row == 0), (-1, NUM_ROWS - 1 - row, row == NUM_ROWS - 1)):
+			man_value = weights["man"] + weights["tempo"] * rows_advanced
+			if on_back_rank:
+				man_value += weights["back_rank"]
+			if center:
+				man_value += weights["center"]
+
+			king_value = weights["king"]
+			if center:
+				king_value += weights["king_center"]
+
+			table[indicator + 2, square] = indicator * man_value
+			table[2 * indicator + 2, square] = indicator * king_value
+
+	return table
+
+class EvaluationProfile(object):
+	"""A named set of evaluation weights, with its piece-square table built."""
+	def __init__(self, name):
+		super(EvaluationProfile, self).__init__()
+
+		if name not in EVALUATION_PROFILES:
+			raise ValueError("Unknown evaluation profile {!r}".format(name))
+
+		self.name = name
+		self.weights = EVALUATION_PROFILES[name]
+
+		self.table = build_piece_square_table(self.weights)
+		# the table in integer units, as plain ints: much faster to index and add during search than numpy values, and
+		# exact to add and subtract
+		self.table_units = np.round(self.table * TABLE_SCORE_UNITS).astype(np.int64).tolist()
+
+		self.centroid_weight = self.weights["centroid"]
+
+def evaluate_batch(positions, profile, engine_players=None):
+	'''Evaluate an (N, 32) array of packed positions at once with a profile's table. Matches SearchBoard.static_evaluation
+	for each position, with engine_players (an array of N players, or None for white) giving the centroid term's side.'''
+
+	positions = np.asarray(positions, dtype=np.int8)
+
+	evaluations = profile.table[positions + 2, np.arange(NUM_SQUARES)].sum(axis=1)
+
+	white_pieces = positions > 0
+	black_pieces = positions < 0
+	num_white_pieces = white_pieces.sum(axis=1)
+	num_black_pieces = black_pieces.sum(axis=1)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		if profile.centroid_weight:
+			row_distance = (white_pieces @ SQUARE_ROWS) / num_white_pieces - (black_pieces @ SQUARE_ROWS) / num_black_pieces
+			col_distance = (white_pieces @ SQUARE_COLS) / num_white_pieces - (black_pieces @ SQUARE_COLS) / num_black_pieces
+			engine_players = 1 if engine_players is None else np.asarray(engine_players)
+			evaluations -= engine_players * profile.centroid_weight * np.sqrt(row_distance ** 2 + col_distance ** 2)
+
+	evaluations[num_white_pieces == 0] = -np.inf
+	evaluations[num_black_pieces == 0] = np.inf
+
+	return evaluations
+
+# profiles are built once per process
+_profiles = {}
+
+def get_evaluation_profile(name=DEFAULT_EVALUATION_PROFILE):
+	'''Return the EvaluationProfile called name.'''
+
+	if name not in _profiles:
+		_profiles[name] = EvaluationProfile(name)
+
+	return _profiles[name]
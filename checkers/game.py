@@ -6,22 +6,44 @@
 import numpy as np
 import itertools
 import copy
+import time
+import collections
+import threading
 
 from .board import Board
+from .search_board import SearchBoard
+from .kernel import get_backend, move_to_locations, locations_to_move
+from .notation import pack_board, unpack_board
+from .analysis_cache import get_cache_settings, get_history_digest
+from .evaluation import get_evaluation_profile
+from .assets import get_game_font
+from .solver import ProofNumberSolver
+from .mcts import search_mcts, get_executor
+from .shared_table import SharedTranspositionTable, attach_shared_table
+from .parallel_search import SearchResult, get_parallel_mode, get_thread_executor
+from .move_cache import MoveCache
+from .symmetry import mirror_move, MIRRORED_BOUNDS
 from .constants import *
 
 class CheckersGame(object):
 	"""Class for representing a checkers game"""
-	def __init__(self):
+	def __init__(self, backend="auto", search_only=False):
 		super(CheckersGame, self).__init__()
 
+		# a search_only game (see SearchHelper) gets no board, transposition table or move cache of its own, since it is
+		# always pointed at another game's before it searches
+		self.search_only = search_only
+
+		# the kernel backend used for move generation and evaluation during search ("python", "numba", or "auto")
+		self.kernel = get_backend(backend)
+		self.backend_warmup_time = self.kernel.warmup_time # one-time cost, paid by the first game in each process
+
 		self.difficulty_level = "Easy"
 
 		self.rows = 8
 		self.cols = 8
 
-		self.board = Board()
-		self.board.reset()
+		self.board = None if search_only else Board()
 
 		self.winner = None
 
@@ -29,8 +51,123 @@ class CheckersGame(object):
 		self.current_player = -1
 
 		self.forced_capture_error = False # this gets toggled on to display the warning pop-up
+
+		# evaluation weights for the AI (see EVALUATION_PROFILES); turning on aggressive_AI switches to the "Aggressive" profile
+		self.evaluation_profile = DEFAULT_EVALUATION_PROFILE
 		self.aggressive_AI = False
 
+		# optional NeuralEvaluator (see network.py), used instead of the evaluation profile when set
+		self.network = None
+
+		# optional search budget, used by search(); minimax_AB stops expanding nodes once it runs out
+		self.node_limit = None
+		self.search_deadline = None
+		self.nodes_searched = 0
+		self.search_aborted = False
+
+		# triangular principal variation table: pv_table[ply] is the best line minimax_AB has found from the node it is
+		# searching at ply, as packed moves. principal_variation is the line from the last search() iteration that finished,
+		# as (from_location, to_location) tuples starting with the best move
+		self.pv_table = []
+		self.principal_variation = []
+
+		# draw detection; position_history counts how often each position key has occurred since the last capture or man
+		# move (earlier positions can never come up again), recent_positions lists those keys in the order they came up,
+		# ending with the current position, and search_path holds the keys on the line minimax_AB is currently searching
+		self.is_draw = False
+		self.repetition_limit = REPETITION_LIMIT
+		self.draw_plies = DRAW_PLIES # set to None to turn off the no-progress rule
+		self.position_history = collections.Counter()
+		self.recent_positions = []
+		self.search_path = set()
+
+		# transposition table of (key, depth, score, bound, best move) entries, shared by every search this game makes.
+		# It is cleared whenever the evaluator changes, since scores from one evaluator mean nothing to another
+		self.transposition_table = None if search_only else [None] * TRANSPOSITION_TABLE_SIZE
+		self.transposition_table_settings = None
+
+		# generated move lists by position key, shared by every search this game makes (see move_cache.py)
+		self.move_cache = None if search_only else MoveCache(MOVE_CACHE_SIZE)
+
+		if not search_only:
+			self.reset_history()
+
+		# optional persistent cache of search results (see analysis_cache.py)
+		self.analysis_cache = None
+
+		# make_AI_move tries the endgame solver (see solver.py) once there are this few pieces left; None turns it off.
+		# solver_failures holds the keys of positions it couldn't solve in its budget, which it doesn't try again
+		self.solver_piece_threshold = SOLVER_PIECE_THRESHOLD
+		self.solver_node_limit = SOLVER_NODE_LIMIT
+		self.solver_failures = set()
+
+		# which engine picks the AI's moves: "alphabeta" (minimax_AB) or "mcts" (Monte Carlo tree search, see mcts.py).
+		# move_time, if set, gives either engine that many seconds per move instead of the difficulty level's setting
+		self.engine = "alphabeta"
+		self.move_time = None
+		self.mcts_workers = 1 # more than one searches root-parallel in worker processes
+		self.mcts_capture_biased = True # prefer playout moves that don't hand the opponent a capture
+
+		# more than one smp_workers searches alpha-beta with Lazy SMP, in helper processes (search_lazy_smp, with a
+		# transposition table in shared memory that is made the first time it's needed) or threads
+		# (search_lazy_smp_threads). smp_mode picks which: "processes", "threads", or "auto" for threads only when the
+		# GIL is disabled (see parallel_search.py). Helper searches stop once the main one finishes: shared_table is set
+		# in helper processes, and stop_event in helper threads
+		self.smp_workers = 1
+		self.smp_mode = "auto"
+		self.lazy_smp_table = None
+		self.shared_table = None
+		self.stop_event = None
+		self.search_helpers = [] # SearchHelpers for helper threads, made the first time they're needed
+
+	def set_position(self, board, player):
+		'''Replace the game state with a given board and player to move (1 = white, -1 = black).'''
+
+		self.board = board
+		self.current_player = player
+		self.winner = None
+
+		self.board.update_human_moves()
+		self.check_winner()
+
+		self.reset_history()
+
+	def reset_history(self):
+		'''Forget the position history (e.g. for a new game), starting it again from the current position.'''
+
+		self.position_history.clear()
+		self.recent_positions = []
+		self.is_draw = False
+		self.solver_failures = set()
+
+		self.record_position()
+
+	def get_position_key(self, board, player):
+		'''Returns the 64-bit key for a board and player to move.'''
+
+		if player == 1:
+			return board.hash ^ ZOBRIST_WHITE_TO_MOVE
+
+		return board.hash
+
+	def record_position(self):
+		'''Add the current position to the history, and check for a draw by repetition or by the no-progress rule.'''
+
+		# a capture or man move resets the clock, and nothing from before it can repeat
+		if self.board.halfmove_clock == 0:
+			self.position_history.clear()
+			self.recent_positions = []
+
+		key = self.get_position_key(self.board, self.current_player)
+		self.position_history[key] += 1
+		self.recent_positions.append(key)
+
+		if self.position_history[key] >= self.repetition_limit:
+			self.is_draw = True
+
+		if self.draw_plies and self.board.halfmove_clock >= self.draw_plies:
+			self.is_draw = True
+
 	def handle_mouse_click(self, x, y):
 		'''Handle a mouse click from the user given an x and y in window coordinates.'''
 
@@ -54,8 +191,8 @@ class CheckersGame(object):
 		# if we're here, it means the user is trying to move a piece
 
 		# get row and column of mouse click
-		to_row = int(y / TILE_SIZE)
-		to_col = int(x / TILE_SIZE)
+		to_row = int(y // TILE_SIZE)
+		to_col = int(x // TILE_SIZE)
 
 		from_row = self.board.selected_piece.row
 		from_col = self.board.selected_piece.col
@@ -78,6 +215,7 @@ class CheckersGame(object):
 			# make the move
 			self.board.move_piece(self.board.selected_piece.row, self.board.selected_piece.col, to_row, to_col)
 			self.current_player = self.current_player * -1
+			self.record_position()
 
 		# deselect the piece
 		self.board.selected_piece = None
@@ -164,12 +302,12 @@ class CheckersGame(object):
 		text_size = s.get_height() // 4
 
 		# get bounding rectangles of text
-		text_rect = game_font.get_rect(text, size=text_size)
+		text_rect = get_game_font().get_rect(text, size=text_size)
 
 		# set the center points
 		text_rect.center = (x_center, y_center)
 
-		game_font.render_to(window, text_rect, text, BLACK, size = text_size)
+		get_game_font().render_to(window, text_rect, text, BLACK, size = text_size)
 
 	def draw_difficulty_button(self, window, position):
 		'''Handles drawing the button to change difficulty level.'''
@@ -209,12 +347,12 @@ class CheckersGame(object):
 		difficulty_text_size = s.get_height() // 4
 
 		# get bounding rectangles of text
-		difficulty_text_rect = game_font.get_rect(difficulty_text, size=difficulty_text_size)
+		difficulty_text_rect = get_game_font().get_rect(difficulty_text, size=difficulty_text_size)
 
 		# set the center points
 		difficulty_text_rect.center = (x_center, y_center)
 
-		game_font.render_to(window, difficulty_text_rect, difficulty_text, BLACK, size = difficulty_text_size)
+		get_game_font().render_to(window, difficulty_text_rect, difficulty_text, BLACK, size = difficulty_text_size)
 
 	def draw_start_button(self, window, position):
 		'''Handles drawing the start button.'''
@@ -244,12 +382,12 @@ class CheckersGame(object):
 		start_text_size = s.get_height() // 3
 
 		# get bounding rectangles of text
-		start_text_rect = game_font.get_rect(start_text, size=start_text_size)
+		start_text_rect = get_game_font().get_rect(start_text, size=start_text_size)
 
 		# set the center points
 		start_text_rect.center = (x_center, y_center)
 
-		game_font.render_to(window, start_text_rect, start_text, BLACK, size = start_text_size)
+		get_game_font().render_to(window, start_text_rect, start_text, BLACK, size = start_text_size)
 
 	def draw_splash_screen(self, window, position):
 		'''Draws the splash screen, including the various buttons.'''
@@ -264,15 +402,15 @@ class CheckersGame(object):
 		title_text_size = 100
 
 		# get bounding rectangles of text
-		pretitle_text_rect = game_font.get_rect(pretitle_text, size = pretitle_text_size)
-		title_text_rect = game_font.get_rect(title_text, size = title_text_size)
+		pretitle_text_rect = get_game_font().get_rect(pretitle_text, size = pretitle_text_size)
+		title_text_rect = get_game_font().get_rect(title_text, size = title_text_size)
 
 		# set the center points
 		pretitle_text_rect.center = (TILE_SIZE * NUM_COLS / 2, TILE_SIZE * 2 - (TILE_SIZE / 2))
 		title_text_rect.center = (TILE_SIZE * NUM_COLS / 2, TILE_SIZE * 3 - (TILE_SIZE / 2))
 
-		game_font.render_to(window, pretitle_text_rect, pretitle_text, BLACK, size = pretitle_text_size)
-		game_font.render_to(window, title_text_rect, title_text, BLACK, size = title_text_size)
+		get_game_font().render_to(window, pretitle_text_rect, pretitle_text, BLACK, size = pretitle_text_size)
+		get_game_font().render_to(window, title_text_rect, title_text, BLACK, size = title_text_size)
 
 		self.draw_start_button(window, position)
 		self.draw_difficulty_button(window, position)
@@ -292,15 +430,15 @@ class CheckersGame(object):
 		button_text_size = 30
 
 		# get bounding rectangles of text
-		title_text_rect = game_font.get_rect(title_text, size = title_text_size)
-		button_text_rect = game_font.get_rect(button_text, size = button_text_size)
+		title_text_rect = get_game_font().get_rect(title_text, size = title_text_size)
+		button_text_rect = get_game_font().get_rect(button_text, size = button_text_size)
 
 		# set the center points
 		title_text_rect.center = (TILE_SIZE * NUM_COLS / 2, TILE_SIZE * 3 - (TILE_SIZE / 2))
 		button_text_rect.center = (TILE_SIZE * NUM_COLS / 2, TILE_SIZE * 6 - (TILE_SIZE / 2))
 
-		game_font.render_to(window, title_text_rect, title_text, BLACK, size = title_text_size)
-		game_font.render_to(window, button_text_rect, button_text, BLACK, size = button_text_size)
+		get_game_font().render_to(window, title_text_rect, title_text, BLACK, size = title_text_size)
+		get_game_font().render_to(window, button_text_rect, button_text, BLACK, size = button_text_size)
 
 	def draw_forced_capture_warning(self, window):
 		'''Draws a temporary warning stating that a forced capture is available and needs to happen.'''
@@ -320,12 +458,12 @@ class CheckersGame(object):
 		text_size = 30
 
 		# get bounding rectangles of text
-		text_rect = game_font.get_rect(text, size = text_size)
+		text_rect = get_game_font().get_rect(text, size = text_size)
 
 		# set the center points
 		text_rect.center = (TILE_SIZE * NUM_COLS / 2, TILE_SIZE * NUM_ROWS / 2)
 
-		game_font.render_to(window, text_rect, text, BLACK, size = text_size)
+		get_game_font().render_to(window, text_rect, text, BLACK, size = text_size)
 
 
 	def check_winner(self):
@@ -343,86 +481,709 @@ class CheckersGame(object):
 
 
 	def make_AI_move(self, player):
-		'''Wrapper function for the minimax that determines the next best AI move. Also handles changing other game attributes as needed and updating game state.'''
+		'''Wrapper function for the minimax that determines the next best AI move. Also handles changing other game attributes as needed and updating game state.
+		Returns the packed move played (None for a pass).'''
+
+		depth, static_eval_limit = AI_SETTINGS[self.difficulty_level]
+
+		# a timed move: MCTS always makes one, and alpha-beta does when move_time is set
+		move_time = self.move_time or (MCTS_SETTINGS[self.difficulty_level] if self.engine == "mcts" else None)
+		move_start = time.perf_counter()
+
+		search_board = self.get_search_board(player)
+
+		# reuse a cached result if one is at least as deep as the difficulty level searches, before any engine runs
+		move = None
+		cached_result = self.lookup_analysis(search_board, player, depth)
+		if cached_result:
+			move = cached_result[0]
+
+		# in a sparse endgame, play a proven win or draw if the solver can find one quickly. Whatever it spends comes out
+		# of a timed move's budget, so it only gets a share of one, and a position it has failed on isn't tried again
+		position_key = search_board.get_key(player)
+		if move is None and self.solver_piece_threshold and search_board.num_white_pieces + search_board.num_black_pieces <= self.solver_piece_threshold and position_key not in self.solver_failures:
+			solver = ProofNumberSolver(self.solver_node_limit, draw_plies=self.draw_plies)
+			result, moves, _ = solver.solve(search_board, player, self.position_history, move_time * SOLVER_TIME_SHARE if move_time else None)
+
+			if result in ("win", "draw") and moves:
+				move = moves[0]
+			elif result == "unknown":
+				self.solver_failures.add(position_key)
+
+		if move is None:
+			self.prepare_transposition_table(player)
+
+		if move is None and (move_time or self.smp_workers > 1):
+			if move_time:
+				# alpha-beta deepens until the time runs out
+				time_limit = max(move_time - (time.perf_counter() - move_start), move_time * (1 - SOLVER_TIME_SHARE))
+				_, best_move, _, _ = self.search(player, MAX_SEARCH_DEPTH, time_limit=time_limit)
+			else:
+				# Lazy SMP to the difficulty level's depth, taking the deepest search that finished
+				_, best_move, _, _ = self.search(player, depth)
+
+			if best_move is not None:
+				move = locations_to_move(search_board.squares, *best_move)
+
+		if move is None:
+			# use minimax to determine the best move...
+			alpha = -np.inf
+			beta = np.inf
+			evaluation, move = self.minimax_AB(search_board, depth, alpha, beta, player, 0, static_eval_limit)
+
+			if move is not None:
+				self.store_analysis(search_board, player, move, evaluation, depth)
+
+		self.play_move(move)
 
-		if self.difficulty_level == "Easy":
-			depth = 5
-			static_eval_limit = 5000
-		elif self.difficulty_level == "Medium":
-			depth = 6
-			static_eval_limit = 7500
-		elif self.difficulty_level == "Hard":
-			depth = 6
-			static_eval_limit = 10000
+		return move
 
-		# use minimax to determine the best move...
-		alpha = -np.inf
-		beta = np.inf
-		evaluation, board_state = self.minimax_AB(self.board, depth, alpha, beta, player, 0, static_eval_limit, self.aggressive_AI)
+	def play_move(self, move):
+		'''Play a packed move (or pass, if move is None) for the player to move, and update the rest of the game state.'''
 
-		self.board = copy.deepcopy(board_state)
+		if move is not None:
+			from_location, to_location = move_to_locations(move)
+			self.board.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
 
 		self.current_player = self.current_player * -1
+		self.record_position()
 
-		self.board.update_force_capture_list()
+		self.board.update_human_moves()
 
 		self.check_winner()
 
+	def solve(self, player, node_limit=None):
+		'''Try to prove the current position won, lost or drawn for player (see solver.py). Returns (result, moves, nodes
+		searched), where result is "win", "loss", "draw" or "unknown" and moves are (from_location, to_location) tuples.'''
+
+		solver = ProofNumberSolver(node_limit or self.solver_node_limit, draw_plies=self.draw_plies)
+		result, moves, nodes = solver.solve(self.get_search_board(player), player, self.position_history)
+
+		return result, [move_to_locations(move) for move in moves], nodes
+
+	def get_evaluator_name(self):
+		'''Returns the name of the network or evaluation profile the AI uses.'''
+
+		if self.network is not None:
+			return self.network.name
+
+		return self.get_evaluation_profile_name()
+
+	def get_evaluation_profile_name(self):
+		'''Returns the name of the evaluation profile the AI uses.'''
+
+		if self.aggressive_AI:
+			return "Aggressive"
+
+		return self.evaluation_profile
+
+	def get_search_board(self, player):
+		'''Returns a packed copy of the current board for minimax_AB to search, evaluated for player's engine.'''
+
+		profile = get_evaluation_profile(self.get_evaluation_profile_name())
+
+		return SearchBoard(pack_board(self.board), self.kernel, self.board.halfmove_clock, profile, player, self.network, self.move_cache)
+
+	def get_analysis_key(self, search_board, player):
+		'''Returns the (key, settings, flipped) an analysis cache entry for this position is stored under, with the
+		halfmove clock and the game's history since the last capture or man move in the settings.'''
+
+		static_eval_limit = AI_SETTINGS[self.difficulty_level][1]
+
+		position_key = search_board.get_key(player)
+		history_digest = get_history_digest(self.position_history, position_key)
+		settings = get_cache_settings(self.get_evaluator_name(), static_eval_limit, self.draw_plies, search_board.halfmove_clock, history_digest)
+
+		if history_digest is not None:
+			# the earlier positions' keys are for this color, so the color-reversed twin can't share the entry
+			return position_key, settings, False
+
+		table_key, flipped = search_board.get_table_key(player)
+
+		return table_key, settings, flipped
+
+	def lookup_analysis(self, search_board, player, depth):
+		'''Check the analysis cache for a search of this position at least depth plies deep. Returns (move, evaluation, depth) or None.'''
+
+		if self.analysis_cache is None:
+			return None
+
+		table_key, settings, flipped = self.get_analysis_key(search_board, player)
+
+		cached_result = self.analysis_cache.lookup(table_key, settings, depth)
+		if cached_result is None:
+			return None
+
+		if flipped:
+			cached_result = (mirror_move(cached_result[0]), -cached_result[1], cached_result[2])
+
+		# guard against hash collisions by making sure the cached move is legal here
+		if cached_result[0] not in search_board.get_legal_moves(player):
+			return None
+
+		return cached_result
+
+	def store_analysis(self, search_board, player, move, evaluation, depth):
+		'''Store a search result in the analysis cache, if there is one.'''
+
+		if self.analysis_cache is None:
+			return
+
+		table_key, settings, flipped = self.get_analysis_key(search_board, player)
+		if flipped:
+			move = mirror_move(move)
+			evaluation = -evaluation
+
+		self.analysis_cache.store(table_key, settings, move, evaluation, depth)
+
+	def search(self, player, depth, node_limit=None, time_limit=None, info_callback=None, start_depth=1):
+		'''Iteratively deepen minimax_AB from start_depth up to depth, stopping once the node or time budget runs out. Returns (evaluation, move, depth reached, nodes searched); move is a (from_location, to_location) tuple.'''
+
+		if self.engine == "mcts":
+			return self.search_mcts(player, node_limit, time_limit, info_callback)
+
+		if self.smp_workers > 1:
+			if get_parallel_mode(self.smp_mode) == "threads":
+				return self.search_lazy_smp_threads(player, depth, node_limit, time_limit, info_callback, start_depth)
+
+			return self.search_lazy_smp(player, depth, node_limit, time_limit, info_callback, start_depth)
+
+		return self.search_alphabeta(player, depth, node_limit, time_limit, info_callback, start_depth)
+
+	def search_alphabeta(self, player, depth, node_limit=None, time_limit=None, info_callback=None, start_depth=1):
+		'''The single process alpha-beta search behind search().'''
+
+		static_eval_limit = AI_SETTINGS[self.difficulty_level][1]
+
+		self.node_limit = node_limit
+		self.search_deadline = time.perf_counter() + time_limit if time_limit else None
+		self.nodes_searched = 0
+		self.search_aborted = False
+
+		best_evaluation = None
+		best_move = None
+		depth_reached = 0
+		self.principal_variation = []
+
+		search_board = self.get_search_board(player)
+		self.prepare_transposition_table(player)
+
+		cached_result = self.lookup_analysis(search_board, player, depth)
+		if cached_result:
+			move, evaluation, cached_depth = cached_result
+			self.principal_variation = [move_to_locations(move)]
+
+			if info_callback:
+				info_callback(cached_depth, evaluation, 0, move_to_locations(move))
+
+			return evaluation, move_to_locations(move), cached_depth, 0
+
+		for current_depth in range(start_depth, depth + 1):
+			evaluation, move = self.minimax_AB(search_board, current_depth, -np.inf, np.inf, player, 0, static_eval_limit)
+
+			if self.search_aborted:
+				# this iteration was cut short, so keep the result from the last one that finished
+				break
+
+			if move is None:
+				# there are no moves from this position
+				break
+
+			best_evaluation = evaluation
+			best_move = move_to_locations(move)
+			depth_reached = current_depth
+			principal_variation = self.extend_principal_variation(search_board, player, self.pv_table[0], current_depth)
+			self.principal_variation = [move_to_locations(pv_move) for pv_move in principal_variation]
+
+			self.store_analysis(search_board, player, move, evaluation, current_depth)
+
+			if info_callback:
+				info_callback(current_depth, evaluation, self.nodes_searched, best_move)
+
+		self.node_limit = None
+		self.search_deadline = None
+
+		return best_evaluation, best_move, depth_reached, self.nodes_searched
+
+	def search_lazy_smp(self, player, depth, node_limit=None, time_limit=None, info_callback=None, start_depth=1):
+		'''Lazy SMP: search the same root in smp_workers processes at once, this one and smp_workers - 1 helpers from the
+		process pool, all sharing one transposition table in shared memory (see shared_table.py). Each helper shuffles
+		its moves with its own seed, and odd helpers start and finish a ply deeper, so they fill the table with different
+		parts of the tree for each other. Returns the result of whichever search finished the deepest iteration, like
+		search(), with nodes searched summed over all of them. Only this process reports to info_callback.'''
+
+		if self.lazy_smp_table is None:
+			self.lazy_smp_table = SharedTranspositionTable()
+
+		table = self.lazy_smp_table
+		settings = self.get_transposition_table_settings(player)
+		if settings != table.settings:
+			table.clear()
+			table.settings = settings
+
+		table.clear_stop()
+
+		search_board = self.get_search_board(player)
+		executor = get_executor(self.smp_workers - 1, self.kernel.name)
+		seeds = np.random.randint(2**31, size=self.smp_workers - 1)
+
+		futures = []
+		for helper in range(1, self.smp_workers):
+			helper_depth = min(depth + helper % 2, MAX_SEARCH_DEPTH)
+			helper_start_depth = min(start_depth + helper % 2, helper_depth)
+			futures.append(executor.submit(run_search_helper, table.name, table.size, settings, search_board.squares, player, search_board.halfmove_clock, dict(self.position_history),
+				self.difficulty_level, self.get_evaluation_profile_name(), self.network, self.draw_plies, helper_depth, helper_start_depth, node_limit, time_limit, int(seeds[helper - 1]), self.kernel.name))
+
+		# the main search runs here, on the shared table in place of this game's own
+		own_table = (self.transposition_table, self.transposition_table_settings)
+		self.transposition_table, self.transposition_table_settings = table, settings
+		try:
+			evaluation, move, depth_reached, nodes = self.search_alphabeta(player, depth, node_limit, time_limit, info_callback, start_depth)
+		finally:
+			table.request_stop()
+			self.transposition_table, self.transposition_table_settings = own_table
+
+		principal_variation = self.principal_variation
+		for future in futures:
+			helper_evaluation, helper_move, helper_depth_reached, helper_nodes, helper_variation = future.result()
+			nodes += helper_nodes
+
+			if helper_move is not None and helper_depth_reached > depth_reached:
+				evaluation, move, depth_reached, principal_variation = helper_evaluation, helper_move, helper_depth_reached, helper_variation
+
+		self.principal_variation = principal_variation
+		self.nodes_searched = nodes
+
+		return evaluation, move, depth_reached, nodes
+
+	def search_lazy_smp_threads(self, player, depth, node_limit=None, time_limit=None, info_callback=None, start_depth=1):
+		'''Lazy SMP with threads instead of processes, for free-threaded builds (see parallel_search.py). The helpers are
+		SearchHelpers searching from a thread pool, on this game's own transposition table and move cache; every
+		iteration any search finishes is offered to one SearchResult, which keeps the deepest. Returns it like
+		search_lazy_smp().'''
+
+		self.prepare_transposition_table(player)
+
+		result = SearchResult()
+		stop_event = threading.Event()
+		squares = pack_board(self.board)
+		executor = get_thread_executor(self.smp_workers - 1)
+
+		while len(self.search_helpers) < self.smp_workers - 1:
+			self.search_helpers.append(SearchHelper(self.kernel))
+
+		futures = []
+		for helper, helper_game in enumerate(self.search_helpers[:self.smp_workers - 1], 1):
+			helper_game.prepare(self, squares, self.transposition_table, self.move_cache, stop_event)
+
+			helper_depth = min(depth + helper % 2, MAX_SEARCH_DEPTH)
+			helper_start_depth = min(start_depth + helper % 2, helper_depth)
+			futures.append(executor.submit(run_search_thread, helper_game, player, helper_depth, helper_start_depth, node_limit, time_limit, result))
+
+		try:
+			evaluation, move, depth_reached, nodes = self.search_alphabeta(player, depth, node_limit, time_limit, info_callback, start_depth)
+		finally:
+			stop_event.set()
+
+		# the main search wins ties, as it does with processes
+		result.offer(depth_reached, evaluation, move, self.principal_variation, replace_equal=True)
+		result.add_nodes(nodes)
+
+		for future in futures:
+			future.result()
+
+		evaluation, move, depth_reached, self.nodes_searched, self.principal_variation = result.get()
+
+		return evaluation, move, depth_reached, self.nodes_searched
+
+	def search_mcts(self, player, node_limit=None, time_limit=None, info_callback=None):
+		'''Run Monte Carlo tree search (see mcts.py) for node_limit iterations or time_limit seconds, or the difficulty
+		level's time if neither is given. Returns (evaluation, move, depth reached, iterations) like search(); the
+		evaluation is the expected result for white, on the same logistic scale playouts use for the evaluation profile.'''
+
+		if not node_limit and not time_limit:
+			time_limit = MCTS_SETTINGS[self.difficulty_level]
+
+		search_board = self.get_search_board(player)
+		move, score, iterations, depth_reached = search_mcts(search_board, player, node_limit, time_limit, self.mcts_workers, capture_biased=self.mcts_capture_biased)
+
+		self.nodes_searched = iterations
+		self.principal_variation = []
+
+		if move is None:
+			return None, None, depth_reached, iterations
+
+		self.principal_variation = [move_to_locations(move)]
+
+		white_score = score if player == 1 else 1.0 - score
+		with np.errstate(divide="ignore"):
+			evaluation = float(np.log(white_score) - np.log(1.0 - white_score))
+
+		if info_callback:
+			info_callback(depth_reached, evaluation, iterations, move_to_locations(move))
+
+		return evaluation, move_to_locations(move), depth_reached, iterations
+
+	def search_multipv(self, player, depth, num_pv=3, node_limit=None, time_limit=None, info_callback=None):
+		'''Iteratively deepen like search(), but keep exact scores for the best num_pv root moves. Returns a list of
+		(move, evaluation, principal variation) tuples, best first, from the deepest search that finished; moves are
+		(from_location, to_location) tuples and the principal variation is a list of them.'''
+
+		static_eval_limit = AI_SETTINGS[self.difficulty_level][1]
+
+		self.node_limit = node_limit
+		self.search_deadline = time.perf_counter() + time_limit if time_limit else None
+		self.nodes_searched = 0
+		self.search_aborted = False
+
+		search_board = self.get_search_board(player)
+		self.prepare_transposition_table(player)
+
+		root_key = search_board.get_key(player)
+		root_moves = search_board.get_legal_moves(player)
+		lines = []
+
+		for current_depth in range(1, depth + 1):
+			# best (evaluation, move) pairs so far, best first; only these have exact scores
+			best_results = []
+
+			self.search_path.add(root_key)
+
+			for move in root_moves:
+				# once num_pv moves are known, the others only need to prove they're no better than the worst of them
+				alpha = -np.inf
+				beta = np.inf
+				if len(best_results) >= num_pv:
+					if player == 1:
+						alpha = best_results[-1][0]
+					else:
+						beta = best_results[-1][0]
+
+				undo = search_board.make_move(move)
+				evaluation, _ = self.minimax_AB(search_board, current_depth - 1, alpha, beta, -player, 1, static_eval_limit)
+				search_board.unmake_move(move, undo)
+
+				if self.search_aborted:
+					break
+
+				# the score is exact whenever the move makes the list, so the line below it is its principal variation
+				if len(best_results) < num_pv or (player == 1 and evaluation > alpha) or (player == -1 and evaluation < beta):
+					best_results.append((evaluation, move, [move] + self.pv_table[1]))
+					best_results.sort(key=lambda result: -result[0] * player)
+					del best_results[num_pv:]
+
+			self.search_path.discard(root_key)
+
+			if self.search_aborted or len(best_results) == 0:
+				# this iteration was cut short, so keep the lines from the last one that finished
+				break
+
+			lines = []
+			for evaluation, move, principal_variation in best_results:
+				principal_variation = self.extend_principal_variation(search_board, player, principal_variation, current_depth)
+				lines.append((move_to_locations(move), evaluation, [move_to_locations(pv_move) for pv_move in principal_variation]))
+
+			if info_callback:
+				info_callback(current_depth, lines, self.nodes_searched)
+
+			# search the best moves first next time, which tightens the window for the rest sooner
+			best_moves = [move for _, move, _ in best_results]
+			root_moves = best_moves + [move for move in root_moves if move not in best_moves]
+
+		self.node_limit = None
+		self.search_deadline = None
+
+		return lines
+
+	def search_budget_exceeded(self):
+		'''Check whether the node or time budget set by search() has run out.'''
+
+		if self.node_limit is not None and self.nodes_searched >= self.node_limit:
+			return True
+
+		if self.search_deadline is not None and time.perf_counter() >= self.search_deadline:
+			return True
+
+		if self.shared_table is not None and self.shared_table.is_stop_requested():
+			return True
+
+		if self.stop_event is not None and self.stop_event.is_set():
+			return True
+
+		return False
+
 	def minimax_AB_wrapper(self, depth, alpha, beta, player):
 		'''Wrapper function for testing. Not actually used in production...'''
 
-		return self.minimax_AB(self.board, depth, alpha, beta, player)
+		static_eval_limit = AI_SETTINGS[self.difficulty_level][1]
+
+		self.prepare_transposition_table(player)
+
+		return self.minimax_AB(self.get_search_board(player), depth, alpha, beta, player, 0, static_eval_limit)
+
+	def minimax_AB(self, position, depth, alpha, beta, player, static_eval_count, static_eval_limit):
+		'''Returns value and best move (a packed move, see kernel.py) for a SearchBoard position. Moves are made and unmade
+		on position in place. The line behind the best move is left in pv_table[static_eval_count].'''
+
+		self.nodes_searched += 1
+
+		# static_eval_count is the ply; every node starts with an empty line, so lines end wherever the search stopped
+		ply = static_eval_count
+		while ply >= len(self.pv_table):
+			self.pv_table.append([])
+		self.pv_table[ply] = []
 
-	def minimax_AB(self, position, depth, alpha, beta, player, static_eval_count, static_eval_limit, aggressive):
-		'''Returns value and position (i.e. a Board object.'''
+		if self.search_budget_exceeded():
+			self.search_aborted = True
+			depth = 0
+
+		position_key = position.get_key(player)
+
+		# a repeated position (from the game so far or earlier on this line) or a no-progress position is a draw
+		if static_eval_count > 0:
+			if position_key in self.position_history or position_key in self.search_path:
+				return 0, None
+
+			if self.draw_plies and position.halfmove_clock >= self.draw_plies:
+				return 0, None
 
 		if depth == 0 or static_eval_count == static_eval_limit:
-			if player == 1:
-				return position.static_evaluation(aggressive), position
-			else:
-				return position.static_evaluation(aggressive=False), position
+			return position.static_evaluation(), None
 
 		if position.is_winner(1):
-			return np.inf, position
+			return np.inf, None
 
 		if position.is_winner(-1):
-			return -np.inf, position
+			return -np.inf, None
+
+		# a stored result from a search at least this deep can answer this node outright (except at the root, which
+		# needs a real best move), and otherwise its best move is tried first. The table is keyed on the canonical form,
+		# so an entry stored by the color-reversed twin of this position is mirrored back
+		table_key, flipped = position.get_table_key(player)
+		table_index = table_key & TRANSPOSITION_TABLE_MASK
+		entry = self.transposition_table[table_index]
+		table_move = None
+
+		if entry is not None and entry[0] == table_key:
+			table_move = entry[4]
+			if flipped and table_move is not None:
+				table_move = mirror_move(table_move)
+
+			if static_eval_count > 0 and entry[1] >= depth:
+				score, bound = entry[2], entry[3]
+				if flipped:
+					score, bound = -score, MIRRORED_BOUNDS[bound]
+
+				if bound == EXACT_BOUND or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+					return score, table_move
 
 		# get possible moves for this player
-		possible_next_moves = position.get_possible_next_moves(player)
+		possible_next_moves = position.get_legal_moves(player)
 
 		if len(possible_next_moves) <= 0:
-			if player == 1:
-				return position.static_evaluation(aggressive), position
-			else:
-				return position.static_evaluation(aggressive=False), position
+			return position.static_evaluation(), None
+
+		if table_move is not None and table_move in possible_next_moves:
+			possible_next_moves.remove(table_move)
+			possible_next_moves.insert(0, table_move)
+
+		original_alpha = alpha
+		original_beta = beta
+
+		self.search_path.add(position_key)
 
 		if player == 1:
 			# white player
 			max_evaluation = -np.inf
 			best_move = None
-			for child_board in possible_next_moves:
-				evaluation, _ = self.minimax_AB(child_board, depth - 1, alpha, beta, -1, static_eval_count + 1, static_eval_limit, aggressive)
+			for move in possible_next_moves:
+				undo = position.make_move(move)
+				evaluation, _ = self.minimax_AB(position, depth - 1, alpha, beta, -1, static_eval_count + 1, static_eval_limit)
+				position.unmake_move(move, undo)
 				max_evaluation = np.maximum(max_evaluation, evaluation)
 				alpha = np.maximum(alpha, max_evaluation)
 				if beta <= alpha:
-					best_move = position
+					best_move = move
+					self.pv_table[ply] = [move] + self.pv_table[ply + 1]
 					break
 				if max_evaluation == evaluation:
-					best_move = child_board
+					best_move = move
+					self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+			self.search_path.discard(position_key)
+			self.store_transposition(table_index, table_key, depth, max_evaluation, original_alpha, original_beta, best_move, flipped)
 			return max_evaluation, best_move
 
 		elif player == -1:
 			# black player
 			min_evaluation = np.inf
 			best_move = None
-			for child_board in possible_next_moves:
-				evaluation, _ = self.minimax_AB(child_board, depth - 1, alpha, beta, 1, static_eval_count + 1, static_eval_limit, aggressive)
+			for move in possible_next_moves:
+				undo = position.make_move(move)
+				evaluation, _ = self.minimax_AB(position, depth - 1, alpha, beta, 1, static_eval_count + 1, static_eval_limit)
+				position.unmake_move(move, undo)
 				min_evaluation = np.minimum(min_evaluation, evaluation)
 				beta = np.minimum(beta, min_evaluation)
 				if beta <= alpha:
-					best_move = position
+					best_move = move
+					self.pv_table[ply] = [move] + self.pv_table[ply + 1]
 					break
 				if min_evaluation == evaluation:
-					best_move = child_board
-			return min_evaluation, best_move
\ No newline at end of file
+					best_move = move
+					self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+			self.search_path.discard(position_key)
+			self.store_transposition(table_index, table_key, depth, min_evaluation, original_alpha, original_beta, best_move, flipped)
+			return min_evaluation, best_move
+
+	def store_transposition(self, table_index, table_key, depth, score, alpha, beta, best_move, flipped=False):
+		'''Store a search result in the transposition table, given the alpha-beta window it was searched with. flipped
+		says the table key is for the mirrored position (see SearchBoard.get_table_key).'''
+
+		if self.search_aborted:
+			# scores from a search that ran out of budget aren't trustworthy
+			return
+
+		if score <= alpha:
+			bound = UPPER_BOUND
+		elif score >= beta:
+			bound = LOWER_BOUND
+		else:
+			bound = EXACT_BOUND
+
+		if flipped:
+			score, bound = -score, MIRRORED_BOUNDS[bound]
+			if best_move is not None:
+				best_move = mirror_move(best_move)
+
+		self.transposition_table[table_index] = (table_key, depth, score, bound, best_move)
+
+	def extend_principal_variation(self, search_board, player, principal_variation, max_length):
+		'''A line from pv_table stops early where a transposition table hit answered a node. Continue it from there with
+		the best moves stored in the table, up to max_length moves. Returns the extended list of packed moves.'''
+
+		principal_variation = list(principal_variation)
+		made_moves = [(move, search_board.make_move(move)) for move in principal_variation]
+		seen_keys = set()
+		if len(principal_variation) % 2:
+			player = -player
+
+		while len(principal_variation) < max_length:
+			table_key, flipped = search_board.get_table_key(player)
+			entry = self.transposition_table[table_key & TRANSPOSITION_TABLE_MASK]
+
+			if table_key in seen_keys or entry is None or entry[0] != table_key or entry[4] is None:
+				break
+
+			move = mirror_move(entry[4]) if flipped else entry[4]
+
+			# guard against hash collisions
+			if move not in search_board.generate_moves(player).tolist():
+				break
+
+			seen_keys.add(table_key)
+			principal_variation.append(move)
+			made_moves.append((move, search_board.make_move(move)))
+			player = -player
+
+		for move, undo in reversed(made_moves):
+			search_board.unmake_move(move, undo)
+
+		return principal_variation
+
+	def get_transposition_table_settings(self, player):
+		'''Returns the settings that transposition table scores depend on, for a search by player.'''
+
+		# the engine's side only changes scores through the centroid term, so otherwise both sides share the table
+		engine_player = player if get_evaluation_profile(self.get_evaluation_profile_name()).centroid_weight and self.network is None else None
+
+		return (self.get_evaluator_name(), engine_player, AI_SETTINGS[self.difficulty_level][1], self.draw_plies)
+
+	def prepare_transposition_table(self, player):
+		'''Clear the transposition table if the evaluator has changed since it was filled. Call before each search.'''
+
+		settings = self.get_transposition_table_settings(player)
+
+		if settings != self.transposition_table_settings:
+			self.transposition_table = [None] * TRANSPOSITION_TABLE_SIZE
+			self.transposition_table_settings = settings
+
+class SearchHelper(CheckersGame):
+	"""Class for a helper thread's side of a thread-parallel Lazy SMP search (see search_lazy_smp_threads). It searches
+	with CheckersGame's own methods but, being search_only, has no Board, tables or caches of its own: it is made once
+	per helper thread and kept, and before each search prepare() points it at a packed position and at the tables of the
+	game it helps."""
+	def __init__(self, kernel):
+		super(SearchHelper, self).__init__(kernel.name, search_only=True)
+
+		# the packed position prepare() was given, and its halfmove clock
+		self.squares = None
+		self.halfmove_clock = 0
+
+	def prepare(self, game, squares, transposition_table, move_cache, stop_event):
+		'''Set up to search the packed position squares for game, sharing its transposition table and move cache, until
+		stop_event is set.'''
+
+		self.squares = squares
+		self.halfmove_clock = game.board.halfmove_clock
+
+		# only read during a search, so the game's own counter is shared rather than copied
+		self.position_history = game.position_history
+		self.repetition_limit = game.repetition_limit
+		self.draw_plies = game.draw_plies
+
+		self.difficulty_level = game.difficulty_level
+		self.evaluation_profile = game.evaluation_profile
+		self.aggressive_AI = game.aggressive_AI
+		self.network = game.network
+
+		self.transposition_table = transposition_table
+		self.transposition_table_settings = game.transposition_table_settings
+		self.move_cache = move_cache
+		self.stop_event = stop_event
+
+	def get_search_board(self, player):
+		'''Returns a SearchBoard for the prepared position, evaluated for player's engine.'''
+
+		profile = get_evaluation_profile(self.get_evaluation_profile_name())
+
+		return SearchBoard(self.squares.copy(), self.kernel, self.halfmove_clock, profile, player, self.network, self.move_cache)
+
+def make_helper_game(squares, player, halfmove_clock, position_history, difficulty_level, evaluation_profile, network, draw_plies, backend):
+	'''Returns a new CheckersGame for a Lazy SMP helper process to search with, set up like the game it helps.'''
+
+	board = unpack_board(squares)
+	board.halfmove_clock = halfmove_clock
+
+	game = CheckersGame(backend)
+	game.set_position(board, player)
+	game.position_history = collections.Counter(position_history)
+	game.difficulty_level = difficulty_level
+	game.evaluation_profile = evaluation_profile
+	game.network = network
+	game.draw_plies = draw_plies
+
+	return game
+
+def run_search_thread(game, player, depth, start_depth, node_limit, time_limit, result):
+	'''Worker function for CheckersGame.search_lazy_smp_threads: search with a prepared SearchHelper, offering each
+	iteration that finishes to result.'''
+
+	def offer_iteration(depth_reached, evaluation, nodes, move):
+		result.offer(depth_reached, evaluation, move, game.principal_variation)
+
+	_, _, _, nodes = game.search_alphabeta(player, depth, node_limit, time_limit, offer_iteration, start_depth)
+	result.add_nodes(nodes)
+
+def run_search_helper(table_name, table_size, table_settings, squares, player, halfmove_clock, position_history, difficulty_level, evaluation_profile, network, draw_plies, depth, start_depth, node_limit, time_limit, seed, backend):
+	'''Worker function for CheckersGame.search_lazy_smp: search a packed position in a helper process, on the shared
+	transposition table. Returns (evaluation, move, depth reached, nodes searched, principal variation).'''
+
+	np.random.seed(seed)
+
+	game = make_helper_game(squares, player, halfmove_clock, position_history, difficulty_level, evaluation_profile, network, draw_plies, backend)
+
+	game.shared_table = attach_shared_table(table_name, table_size)
+	game.transposition_table, game.transposition_table_settings = game.shared_table, table_settings
+
+	evaluation, move, depth_reached, nodes = game.search_alphabeta(player, depth, node_limit, time_limit, start_depth=start_depth)
+
+	return evaluation, move, depth_reached, nodes, game.principal_variation
@@ -0,0 +1,533 @@
+# Will Kearney
+# kernel.py
+#
+# Move generation and static evaluation on packed integer positions (see notation.py), used by the minimax search.
+#
+# The same kernel source is built into two backends: a pure Python one, and one compiled with Numba when it is installed.
+# Both play by the same rules as Board: single jumps, forced captures, crowning on the back row, and regicide.
+#
+# Running this file times both backends and checks their perft counts against Board (tests/test_kernel.py has the rest
+# of the checks):
+#   python -m checkers.kernel
+
+import time
+import copy
+import numpy as np
+
+try:
+	import numba
+except ImportError:
+	numba = None
+
+from .evaluation import get_evaluation_profile
+from .constants import *
+
+# diagonal directions as (row step, col step); white moves towards higher rows, black towards lower rows
+DIRECTIONS = ((1, -1), (1, 1), (-1, -1), (-1, 1))
+WHITE_DIRECTIONS = np.array([0, 1], dtype=np.int64)
+BLACK_DIRECTIONS = np.array([2, 3], dtype=np.int64)
+
+# square -> neighbouring square in each direction, and the square landed on when jumping in that direction (-1 if off the board)
+NEIGHBOURS = np.full((NUM_SQUARES, 4), -1, dtype=np.int64)
+JUMPS = np.full((NUM_SQUARES, 4), -1, dtype=np.int64)
+SQUARE_ROWS = np.zeros(NUM_SQUARES, dtype=np.int64)
+SQUARE_COLS = np.zeros(NUM_SQUARES, dtype=np.int64)
+
+for _square, (_row, _col) in enumerate(SQUARE_LOCATIONS):
+	SQUARE_ROWS[_square] = _row
+	SQUARE_COLS[_square] = _col
+
+	for _direction, (_row_step, _col_step) in enumerate(DIRECTIONS):
+		NEIGHBOURS[_square, _direction] = LOCATION_SQUARES.get((_row + _row_step, _col + _col_step), -1)
+		JUMPS[_square, _direction] = LOCATION_SQUARES.get((_row + 2 * _row_step, _col + 2 * _col_step), -1)
+
+# the most moves a side can have: 12 kings with 4 moves each
+MAX_MOVES = 48
+
+BACKEND_NAMES = ("python", "numba")
+
+def encode_move(from_square, to_square, captured_square=-1):
+	'''Pack a move into a single int: 5 bits for the from square, 5 for the to square, 6 for the captured square plus one.'''
+
+	return from_square | (to_square << 5) | ((captured_square + 1) << 10)
+
+def decode_move(move):
+	'''Unpack a move into (from_square, to_square, captured_square); captured_square is -1 for a non-capture.'''
+
+	move = int(move)
+	return move & 31, (move >> 5) & 31, (move >> 10) - 1
+
+def move_to_locations(move):
+	'''Convert a packed move into a (from_location, to_location) tuple of board (row, col) locations.'''
+
+	from_square, to_square, _ = decode_move(move)
+	return SQUARE_LOCATIONS[from_square], SQUARE_LOCATIONS[to_square]
+
+def locations_to_move(squares, from_location, to_location):
+	'''Convert a (from_location, to_location) move into a packed move for the given position.'''
+
+	from_square = LOCATION_SQUARES[from_location]
+	to_square = LOCATION_SQUARES[to_location]
+
+	captured_square = -1
+	if abs(to_location[0] - from_location[0]) == 2:
+		captured_square = LOCATION_SQUARES[((from_location[0] + to_location[0]) // 2, (from_location[1] + to_location[1]) // 2)]
+
+	return encode_move(from_square, to_square, captured_square)
+
+def build_kernel(jit, compiled=False):
+	'''Build the kernel functions, wrapping each with jit (e.g. numba.njit, or an identity function for pure Python).
+	compiled says whether jit really compiles them (it decides where playouts get their random numbers).'''
+
+	neighbours = NEIGHBOURS
+	jumps = JUMPS
+	white_directions = WHITE_DIRECTIONS
+	black_directions = BLACK_DIRECTIONS
+	square_rows = SQUARE_ROWS
+	square_cols = SQUARE_COLS
+
+	@jit
+	def generate_moves(squares, player):
+		'''Return an int32 array of packed legal moves for player. If any capture is available only captures are returned.'''
+
+		captures = np.empty(MAX_MOVES, dtype=np.int32)
+		simple_moves = np.empty(MAX_MOVES, dtype=np.int32)
+		num_captures = 0
+		num_simple_moves = 0
+
+		for square in range(32):
+			value = squares[square]
+			if value * player <= 0:
+				# empty, or the opponent's piece
+				continue
+
+			if value == 2 or value == -2:
+				num_directions = 4
+			else:
+				num_directions = 2
+
+			for index in range(num_directions):
+				if num_directions == 4:
+					direction = index
+				elif player == 1:
+					direction = white_directions[index]
+				else:
+					direction = black_directions[index]
+
+				neighbour = neighbours[square, direction]
+				if neighbour < 0:
+					continue
+
+				if squares[neighbour] == 0:
+					if num_captures == 0:
+						simple_moves[num_simple_moves] = square | (neighbour << 5)
+						num_simple_moves += 1
+				elif squares[neighbour] * player < 0:
+					landing = jumps[square, direction]
+					if landing >= 0 and squares[landing] == 0:
+						captures[num_captures] = square | (landing << 5) | ((neighbour + 1) << 10)
+						num_captures += 1
+
+		if num_captures > 0:
+			return captures[:num_captures]
+
+		return simple_moves[:num_simple_moves]
+
+	@jit
+	def make_move(squares, move):
+		'''Make a packed move in place. Returns an undo record: (moving value + 2) | (new value + 2) << 3 | (captured value + 2) << 6.'''
+
+		from_square = move & 31
+		to_square = (move >> 5) & 31
+		captured_square = (move >> 10) - 1
+
+		moving_value = int(squares[from_square])
+		new_value = moving_value
+		captured_value = 0
+
+		if captured_square >= 0:
+			captured_value = int(squares[captured_square])
+			squares[captured_square] = 0
+
+			# regicide; capturing a king crowns the capturing piece
+			if captured_value == 2 or captured_value == -2:
+				new_value = 2 * (1 if moving_value > 0 else -1)
+
+		# crowning on the far row
+		if moving_value == 1 and square_rows[to_square] == 7:
+			new_value = 2
+		elif moving_value == -1 and square_rows[to_square] == 0:
+			new_value = -2
+
+		squares[from_square] = 0
+		squares[to_square] = new_value
+
+		return (moving_value + 2) | ((new_value + 2) << 3) | ((captured_value + 2) << 6)
+
+	@jit
+	def unmake_move(squares, move, undo):
+		'''Undo a move made by make_move, given its undo record.'''
+
+		from_square = move & 31
+		to_square = (move >> 5) & 31
+		captured_square = (move >> 10) - 1
+
+		squares[to_square] = 0
+		squares[from_square] = (undo & 7) - 2
+
+		if captured_square >= 0:
+			squares[captured_square] = ((undo >> 6) & 7) - 2
+
+	@jit
+	def evaluate(squares, table, centroid_weight):
+		'''Full static evaluation from a piece-square table (see evaluation.py), less centroid_weight times the distance between
+		the two sides' centroids. Positive for white. SearchBoard keeps the same value up to date incrementally instead.'''
+
+		evaluation = 0.0
+		num_white_pieces = 0
+		num_black_pieces = 0
+		white_row_sum = 0.0
+		white_col_sum = 0.0
+		black_row_sum = 0.0
+		black_col_sum = 0.0
+
+		for square in range(32):
+			value = squares[square]
+			if value == 0:
+				continue
+
+			evaluation += table[value + 2, square]
+
+			if value > 0:
+				num_white_pieces += 1
+				white_row_sum += square_rows[square]
+				white_col_sum += square_cols[square]
+			else:
+				num_black_pieces += 1
+				black_row_sum += square_rows[square]
+				black_col_sum += square_cols[square]
+
+		if num_white_pieces == 0:
+			return -np.inf
+		elif num_black_pieces == 0:
+			return np.inf
+
+		if centroid_weight != 0.0:
+			row_distance = white_row_sum / num_white_pieces - black_row_sum / num_black_pieces
+			col_distance = white_col_sum / num_white_pieces - black_col_sum / num_black_pieces
+			evaluation -= centroid_weight * (row_distance ** 2 + col_distance ** 2) ** 0.5
+
+		return evaluation
+
+	# playouts draw their moves from a generator of their own, so seeding them never disturbs NumPy's global one (which
+	# the search's move shuffling and the tournament's seeding use). Compiled code has its own state inside Numba; pure
+	# Python gets a private Generator
+	if compiled:
+		@jit
+		def seed_playouts(seed):
+			'''Seed the random number generator used by playout.'''
+
+			np.random.seed(seed)
+
+		@jit
+		def random_index(count):
+			return np.random.randint(count)
+	else:
+		playout_generator = [np.random.default_rng(0)]
+
+		def seed_playouts(seed):
+			'''Seed the random number generator used by playout.'''
+
+			playout_generator[0] = np.random.default_rng(seed)
+
+		def random_index(count):
+			return int(playout_generator[0].integers(count))
+
+	@jit
+	def playout(squares, player, max_plies, table, capture_biased):
+		'''Play random moves in place until a side can't move or max_plies have passed. Returns the result for white: 1 for
+		a win, 0 for a loss, or the table evaluation squashed into (0, 1) if the game isn't over. When capture_biased is
+		set, a quiet move that doesn't hand the opponent a capture is preferred if a few random tries find one.'''
+
+		for ply in range(max_plies):
+			moves = generate_moves(squares, player)
+			num_moves = len(moves)
+			if num_moves == 0:
+				# a player who can't move loses
+				if player == 1:
+					return 0.0
+				return 1.0
+
+			move = moves[random_index(num_moves)]
+
+			# captures are forced, so only quiet moves have any choice to bias
+			if capture_biased and num_moves > 1 and (moves[0] >> 10) == 0:
+				for attempt in range(num_moves):
+					candidate = moves[random_index(num_moves)]
+					undo = make_move(squares, candidate)
+					replies = generate_moves(squares, -player)
+					unmake_move(squares, candidate, undo)
+
+					if len(replies) == 0 or (replies[0] >> 10) == 0:
+						move = candidate
+						break
+
+			make_move(squares, move)
+			player = -player
+
+		return 1.0 / (1.0 + np.exp(-evaluate(squares, table, 0.0)))
+
+	@jit
+	def count_pieces(squares, player):
+		'''Return the number of pieces player (1 = white, -1 = black) has on the board.'''
+
+		count = 0
+		for square in range(32):
+			if squares[square] * player > 0:
+				count += 1
+
+		return count
+
+	@jit
+	def collect_leaves(squares, player, depth, leaves, fixed_scores, count):
+		'''Write every position depth plies below squares (full width, in move generation order) into leaves from index
+		count on. A position where the player to move has no moves before depth is written too, with its result in
+		fixed_scores; the others get NaN there. Returns the new count, or -1 (with squares unchanged) if leaves ran out of
+		room.'''
+
+		moves = np.zeros((depth + 1, MAX_MOVES), dtype=np.int64)
+		num_moves = np.zeros(depth + 1, dtype=np.int64)
+		next_move = np.zeros(depth + 1, dtype=np.int64)
+		undos = np.zeros(depth + 1, dtype=np.int64)
+
+		# an explicit stack rather than recursion, so the whole walk compiles as one function
+		level = 0
+		current_player = player
+		while level >= 0:
+			is_leaf = level == depth
+
+			# on the first visit to a level, generate its moves
+			if not is_leaf and next_move[level] == 0:
+				level_moves = generate_moves(squares, current_player)
+				num_moves[level] = len(level_moves)
+				for index in range(len(level_moves)):
+					moves[level, index] = level_moves[index]
+
+				is_leaf = num_moves[level] == 0
+
+			if is_leaf:
+				if count >= len(leaves):
+					# take back every move down to the root, so squares is left as it was given
+					while level > 0:
+						level -= 1
+						unmake_move(squares, moves[level, next_move[level] - 1], undos[level])
+					return -1
+
+				leaves[count, :] = squares
+				if level == depth:
+					fixed_scores[count] = np.nan
+				elif current_player == 1:
+					fixed_scores[count] = -np.inf
+				else:
+					fixed_scores[count] = np.inf
+				count += 1
+
+			if is_leaf or next_move[level] == num_moves[level]:
+				# this level is done: take back the move that led here
+				next_move[level] = 0
+				level -= 1
+				if level >= 0:
+					unmake_move(squares, moves[level, next_move[level] - 1], undos[level])
+					current_player = -current_player
+				continue
+
+			move = moves[level, next_move[level]]
+			next_move[level] += 1
+			undos[level] = make_move(squares, move)
+			current_player = -current_player
+			level += 1
+
+		return count
+
+	@jit
+	def back_up_leaves(squares, player, depth, scores, start, child_scores):
+		'''Minimax scores (positive for white) for the leaves collect_leaves wrote from index start, walking the same tree
+		in the same order. Fills child_scores with the score of each of player's moves, and returns the index after
+		the last leaf used.'''
+
+		moves = np.zeros((depth + 1, MAX_MOVES), dtype=np.int64)
+		num_moves = np.zeros(depth + 1, dtype=np.int64)
+		next_move = np.zeros(depth + 1, dtype=np.int64)
+		undos = np.zeros(depth + 1, dtype=np.int64)
+		best = np.zeros(depth + 1, dtype=np.float64)
+
+		index = start
+		level = 0
+		current_player = player
+		while level >= 0:
+			is_leaf = level == depth
+
+			# on the first visit to a level, generate its moves and start its best score at the worst possible
+			if not is_leaf and next_move[level] == 0:
+				level_moves = generate_moves(squares, current_player)
+				num_moves[level] = len(level_moves)
+				for move_index in range(len(level_moves)):
+					moves[level, move_index] = level_moves[move_index]
+
+				is_leaf = num_moves[level] == 0
+				best[level] = -np.inf if current_player == 1 else np.inf
+
+			if is_leaf or next_move[level] == num_moves[level]:
+				if is_leaf:
+					value = scores[index]
+					index += 1
+				else:
+					value = best[level]
+
+				# this level is done: take back the move that led here, and pass its value up
+				next_move[level] = 0
+				level -= 1
+				if level >= 0:
+					unmake_move(squares, moves[level, next_move[level] - 1], undos[level])
+					current_player = -current_player
+
+					if current_player == 1:
+						best[level] = max(best[level], value)
+					else:
+						best[level] = min(best[level], value)
+
+					if level == 0:
+						child_scores[next_move[0] - 1] = value
+				continue
+
+			move = moves[level, next_move[level]]
+			next_move[level] += 1
+			undos[level] = make_move(squares, move)
+			current_player = -current_player
+			level += 1
+
+		return index
+
+	return generate_moves, make_move, unmake_move, evaluate, count_pieces, seed_playouts, playout, collect_leaves, back_up_leaves
+
+class KernelBackend(object):
+	"""A built set of kernel functions, plus how long it took to get them ready."""
+	def __init__(self, name):
+		super(KernelBackend, self).__init__()
+
+		if name == "numba" and numba is None:
+			raise ValueError("The numba backend needs the numba package to be installed")
+		if name not in BACKEND_NAMES:
+			raise ValueError("Unknown kernel backend {!r}".format(name))
+
+		self.name = name
+
+		start_time = time.perf_counter()
+
+		if name == "numba":
+			jit = numba.njit(nogil=True)
+		else:
+			jit = lambda function: function
+
+		(self.generate_moves, self.make_move, self.unmake_move, self.evaluate, self.count_pieces, self.seed_playouts, self.playout,
+			self.collect_leaves, self.back_up_leaves) = build_kernel(jit, name == "numba")
+
+		# calling each function once forces Numba to compile it, so the cost is paid here rather than in the first search
+		squares = np.zeros(NUM_SQUARES, dtype=np.int8)
+		squares[:12] = BLACK_MAN
+		squares[20:] = WHITE_MAN
+		move = self.generate_moves(squares, -1).tolist()[0] # the search passes moves as plain ints, so warm up with one too
+		undo = self.make_move(squares, move)
+		self.unmake_move(squares, move, undo)
+		self.evaluate(squares, get_evaluation_profile("Material").table, 1.0)
+		self.count_pieces(squares, 1)
+		self.seed_playouts(0)
+		self.playout(squares.copy(), -1, 4, get_evaluation_profile("Material").table, True)
+
+		leaves = np.zeros((64, NUM_SQUARES), dtype=np.int8)
+		fixed_scores = np.zeros(64, dtype=np.float64)
+		self.collect_leaves(squares, -1, 2, leaves, fixed_scores, 0)
+		self.back_up_leaves(squares, -1, 2, fixed_scores, 0, np.zeros(MAX_MOVES, dtype=np.float64))
+
+		self.warmup_time = time.perf_counter() - start_time
+
+	def perft(self, squares, player, depth):
+		'''Count the leaf positions reached after depth plies from a packed position.'''
+
+		if depth == 0:
+			return 1
+
+		moves = self.generate_moves(squares, player)
+		if depth == 1:
+			return len(moves)
+
+		nodes = 0
+		for move in moves:
+			undo = self.make_move(squares, move)
+			nodes += self.perft(squares, -player, depth - 1)
+			self.unmake_move(squares, move, undo)
+
+		return nodes
+
+# backends are built once per process and shared by every game
+_backends = {}
+
+def get_backend(name="auto"):
+	'''Return the kernel backend called name ("python" or "numba"). "auto" picks numba when it is installed.'''
+
+	if name == "auto":
+		name = "numba" if numba is not None else "python"
+
+	if name not in _backends:
+		_backends[name] = KernelBackend(name)
+
+	return _backends[name]
+
+def board_perft(board, player, depth):
+	'''Reference perft using Board.get_legal_moves and deep copies, for checking the kernel backends.'''
+
+	if depth == 0:
+		return 1
+
+	legal_moves = board.get_legal_moves(player)
+	if depth == 1:
+		return len(legal_moves)
+
+	nodes = 0
+	for from_location, to_location, _ in legal_moves:
+		child = copy.deepcopy(board)
+		child.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+		nodes += board_perft(child, -player, depth - 1)
+
+	return nodes
+
+def check_backends(depth=6):
+	'''Time every available backend's warm-up and perft from the start position, checking the counts against Board. The
+	rest of the checks on random positions are in tests/test_kernel.py.'''
+
+	from .board import Board
+	from .notation import pack_board
+
+	names = ["python"] + (["numba"] if numba is not None else [])
+	backends = [get_backend(name) for name in names]
+
+	for backend in backends:
+		print("{} backend warm-up: {:.3f}s".format(backend.name, backend.warmup_time))
+
+	board = Board()
+	for current_depth in range(1, depth + 1):
+		expected = board_perft(board, -1, current_depth) if current_depth <= 4 else None
+
+		for backend in backends:
+			start_time = time.perf_counter()
+			nodes = backend.perft(pack_board(board), -1, current_depth)
+			elapsed = time.perf_counter() - start_time
+
+			print("perft({}) {}: {} nodes in {:.3f}s".format(current_depth, backend.name, nodes, elapsed))
+			if expected is not None and nodes != expected:
+				raise AssertionError("{} backend perft({}) = {}, expected {}".format(backend.name, current_depth, nodes, expected))
+
+	print("All backends agree with Board on perft.")
+
+if __name__ == '__main__':
+	check_backends()
@@ -0,0 +1,254 @@
+# Will Kearney
+# mcts.py
+#
+# A second engine next to minimax_AB: UCT Monte Carlo tree search. Instead of searching every move to a fixed depth it
+# grows a tree one node per iteration towards the moves that have scored best so far, scoring each new node with a
+# random playout (see playout in kernel.py). Playouts that run out of plies are scored by the evaluation profile.
+#
+# The tree is a set of flat NumPy arrays indexed by node rather than a graph of node objects: each node stores its
+# parent, the move that reached it, the slice of the arrays holding its children, its visit count, and the total score
+# of those visits for the player who made the move. Children are allocated in one contiguous block when a node is
+# expanded, so picking a child is one vectorised UCT computation over that block.
+#
+# For more than one worker the search is root-parallel: each worker process grows its own tree from the same position
+# with a different seed, and the root move statistics are summed before choosing the most visited move.
+#
+# Like the transposition table, the tree ignores how positions were reached, so it doesn't see repetition draws.
+
+import concurrent.futures
+import time
+import numpy as np
+
+from .kernel import get_backend
+from .search_board import SearchBoard
+from .evaluation import get_evaluation_profile
+from .constants import *
+
+class MonteCarloTree(object):
+	"""Class for a UCT search tree stored in flat arrays. Node 0 is the root, the position search_board starts in."""
+	def __init__(self, search_board, player, exploration=MCTS_EXPLORATION, playout_plies=MCTS_PLAYOUT_PLIES, capture_biased=True, seed=None, capacity=MCTS_INITIAL_NODES):
+		super(MonteCarloTree, self).__init__()
+
+		self.search_board = search_board
+		self.kernel = search_board.kernel
+		self.table = search_board.profile.table
+		self.player = player
+
+		self.exploration = exploration
+		self.playout_plies = playout_plies
+		self.capture_biased = capture_biased
+
+		# selection uses a NumPy generator; playouts use the kernel's own generator, seeded from it
+		self.rng = np.random.default_rng(seed)
+		self.kernel.seed_playouts(int(self.rng.integers(2**31)))
+
+		self.parent = np.full(capacity, -1, dtype=np.int32)
+		self.move = np.zeros(capacity, dtype=np.int32)
+		self.mover = np.zeros(capacity, dtype=np.int8) # the player who made move
+		self.first_child = np.full(capacity, -1, dtype=np.int32) # -1 until the node is expanded
+		self.num_children = np.zeros(capacity, dtype=np.int32)
+		self.visits = np.zeros(capacity, dtype=np.float64)
+		self.value = np.zeros(capacity, dtype=np.float64) # total score for mover, 1 for a win and 0 for a loss
+
+		self.mover[0] = -player
+		self.num_nodes = 1
+
+		self.iterations = 0
+		self.max_depth = 0
+
+	def grow(self, needed_nodes):
+		'''Make room for at least needed_nodes nodes, doubling the arrays as often as it takes.'''
+
+		capacity = len(self.parent)
+		while capacity < needed_nodes:
+			capacity *= 2
+
+		for name, fill_value in (("parent", -1), ("move", 0), ("mover", 0), ("first_child", -1), ("num_children", 0), ("visits", 0), ("value", 0)):
+			old_array = getattr(self, name)
+			new_array = np.full(capacity, fill_value, dtype=old_array.dtype)
+			new_array[:len(old_array)] = old_array
+			setattr(self, name, new_array)
+
+	def expand(self, node, player):
+		'''Add a child for each of player's legal moves from node, which the search board must currently be at.'''
+
+		moves = self.search_board.generate_moves(player)
+		num_moves = len(moves)
+
+		start = self.num_nodes
+		stop = start + num_moves
+		if stop > len(self.parent):
+			self.grow(stop)
+
+		self.parent[start:stop] = node
+		self.move[start:stop] = moves
+		self.mover[start:stop] = player
+
+		self.first_child[node] = start
+		self.num_children[node] = num_moves
+		self.num_nodes = stop
+
+	def select_child(self, node):
+		'''Returns the child of node with the highest UCT score, or a random unvisited child if it has any.'''
+
+		start = self.first_child[node]
+		stop = start + self.num_children[node]
+		child_visits = self.visits[start:stop]
+
+		unvisited = np.flatnonzero(child_visits == 0)
+		if len(unvisited):
+			return start + int(unvisited[self.rng.integers(len(unvisited))])
+
+		scores = self.value[start:stop] / child_visits + self.exploration * np.sqrt(np.log(self.visits[node]) / child_visits)
+
+		return start + int(np.argmax(scores))
+
+	def run_iteration(self):
+		'''Select a leaf, expand it, play out from one of its children and back the result up the path.'''
+
+		search_board = self.search_board
+
+		node = 0
+		player = self.player
+		path = [0]
+		made_moves = []
+
+		# selection: follow UCT down to a node that hasn't been expanded, or has no moves
+		while self.first_child[node] >= 0 and self.num_children[node] > 0:
+			node = self.select_child(node)
+			move = int(self.move[node])
+			made_moves.append((move, search_board.make_move(move)))
+			path.append(node)
+			player = -player
+
+		# expansion
+		if self.first_child[node] < 0:
+			self.expand(node, player)
+
+			if self.num_children[node] > 0:
+				node = self.select_child(node)
+				move = int(self.move[node])
+				made_moves.append((move, search_board.make_move(move)))
+				path.append(node)
+				player = -player
+
+		# simulation: the result is for white, 1 for a win and 0 for a loss
+		if self.first_child[node] >= 0 and self.num_children[node] == 0:
+			# the player to move here has no moves, and loses
+			result = 0.0 if player == 1 else 1.0
+		else:
+			result = self.kernel.playout(search_board.squares.copy(), player, self.playout_plies, self.table, self.capture_biased)
+
+		for move, undo in reversed(made_moves):
+			search_board.unmake_move(move, undo)
+
+		# backpropagation: every node on the path was reached by a move, whose mover gets the result from their side
+		path = np.array(path, dtype=np.int32)
+		self.visits[path] += 1
+		self.value[path] += np.where(self.mover[path] == 1, result, 1.0 - result)
+
+		self.iterations += 1
+		self.max_depth = max(self.max_depth, len(path) - 1)
+
+	def search(self, iterations=None, deadline=None):
+		'''Run iterations until iterations have been run or time.perf_counter() passes deadline. With neither, run one.'''
+
+		target = self.iterations + iterations if iterations is not None else None
+
+		while True:
+			self.run_iteration()
+
+			if target is not None and self.iterations >= target:
+				break
+			if deadline is not None and time.perf_counter() >= deadline:
+				break
+			if target is None and deadline is None:
+				break
+
+	def get_root_statistics(self):
+		'''Returns (moves, visits, values) arrays for the root's children; values are totals for the player to move.'''
+
+		start = self.first_child[0]
+		if start < 0:
+			return np.zeros(0, dtype=np.int32), np.zeros(0), np.zeros(0)
+
+		stop = start + self.num_children[0]
+
+		return self.move[start:stop].copy(), self.visits[start:stop].copy(), self.value[start:stop].copy()
+
+def run_tree(squares, player, halfmove_clock, profile_name, iterations, time_limit, seed, backend, exploration, playout_plies, capture_biased):
+	'''Grow one tree from a packed position (in a worker process). Returns (root statistics, iterations, max depth).'''
+
+	deadline = time.perf_counter() + time_limit if time_limit else None
+
+	search_board = SearchBoard(squares, get_backend(backend), halfmove_clock, get_evaluation_profile(profile_name), player)
+	tree = MonteCarloTree(search_board, player, exploration, playout_plies, capture_biased, seed)
+	tree.search(iterations, deadline)
+
+	return tree.get_root_statistics(), tree.iterations, tree.max_depth
+
+def merge_root_statistics(results):
+	'''Sum the root statistics of several trees by move. Returns (moves, visits, values) arrays.'''
+
+	totals = {}
+	for moves, visits, values in results:
+		for move, move_visits, move_value in zip(moves.tolist(), visits.tolist(), values.tolist()):
+			total = totals.setdefault(move, [0.0, 0.0])
+			total[0] += move_visits
+			total[1] += move_value
+
+	moves = list(totals)
+
+	return np.array(moves, dtype=np.int32), np.array([totals[move][0] for move in moves]), np.array([totals[move][1] for move in moves])
+
+# worker processes for root-parallel search, kept between moves so each only warms up its backend once
+_executor = None
+_executor_settings = None
+
+def get_executor(workers, backend):
+	'''Returns a process pool of workers processes with backend warmed up, replacing the last one if the settings differ.'''
+
+	global _executor, _executor_settings
+
+	if _executor_settings != (workers, backend):
+		if _executor is not None:
+			_executor.shutdown()
+
+		_executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=get_backend, initargs=(backend,))
+		_executor_settings = (workers, backend)
+
+	return _executor
+
+def search_mcts(search_board, player, iterations=None, time_limit=None, workers=1, seed=None, exploration=MCTS_EXPLORATION, playout_plies=MCTS_PLAYOUT_PLIES, capture_biased=True):
+	'''Run UCT from a SearchBoard position for iterations (in total) or time_limit seconds. Returns (move, score,
+	iterations, max depth): move is the most visited packed move (None if there are no moves), and score is the
+	expected result of that move for player, from 0 for a loss to 1 for a win.'''
+
+	if workers > 1:
+		rng = np.random.default_rng(seed)
+		worker_iterations = -(-iterations // workers) if iterations else None
+
+		executor = get_executor(workers, search_board.kernel.name)
+		futures = [executor.submit(run_tree, search_board.squares, player, search_board.halfmove_clock, search_board.profile.name, worker_iterations, time_limit, int(rng.integers(2**31)), search_board.kernel.name, exploration, playout_plies, capture_biased) for _ in range(workers)]
+		results = [future.result() for future in futures]
+
+		moves, visits, values = merge_root_statistics([statistics for statistics, _, _ in results])
+		total_iterations = sum(result[1] for result in results)
+		max_depth = max(result[2] for result in results)
+	else:
+		deadline = time.perf_counter() + time_limit if time_limit else None
+
+		tree = MonteCarloTree(search_board, player, exploration, playout_plies, capture_biased, seed)
+		tree.search(iterations, deadline)
+
+		moves, visits, values = tree.get_root_statistics()
+		total_iterations = tree.iterations
+		max_depth = tree.max_depth
+
+	if len(moves) == 0:
+		# a player with no moves has lost
+		return None, 0.0, total_iterations, max_depth
+
+	best = int(np.argmax(visits))
+
+	return int(moves[best]), values[best] / visits[best], total_iterations, max_depth
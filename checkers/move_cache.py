@@ -0,0 +1,73 @@
+# Will Kearney
+# move_cache.py
+#
+# Defines the MoveCache class, a bounded least recently used cache of generated move lists.
+#
+# Iterative deepening searches the same positions again at every depth, transpositions reach them by several routes,
+# and the solver and principal variation code walk over them once more. SearchBoard asks the cache before generating
+# moves, keyed by the position key (which includes the side to move), and only the packed move array is stored, so an
+# entry costs a few hundred bytes at most. Keys are derived from the position alone, so an entry can never go stale;
+# like the transposition table, the cache trusts its 64-bit keys not to collide.
+#
+# Helper threads of a thread-parallel search share their game's cache (see CheckersGame.search_lazy_smp_threads), so
+# lookups and inserts take a lock; moves are generated outside it.
+
+import collections
+import threading
+
+from .constants import *
+
+class MoveCache(object):
+	"""Class for a size-bounded, least recently used cache of packed move arrays keyed by position key."""
+	def __init__(self, max_entries=MOVE_CACHE_SIZE):
+		super(MoveCache, self).__init__()
+
+		self.max_entries = max_entries
+		self.entries = collections.OrderedDict()
+		self.lock = threading.Lock()
+
+		self.hits = 0
+		self.misses = 0
+
+	def get_moves(self, key, kernel, squares, player):
+		'''Returns the packed moves for player in squares, whose position key is key, generating them on a miss.'''
+
+		with self.lock:
+			moves = self.entries.get(key)
+
+			if moves is not None:
+				self.hits += 1
+				self.entries.move_to_end(key)
+				return moves
+
+			self.misses += 1
+
+		moves = kernel.generate_moves(squares, player)
+		moves.flags.writeable = False # shared by every caller that hits this entry
+
+		with self.lock:
+			self.entries[key] = moves
+			if len(self.entries) > self.max_entries:
+				self.entries.popitem(last=False)
+
+		return moves
+
+	def get_hit_rate(self):
+		'''Returns the fraction of lookups that hit, or 0 before any lookups.'''
+
+		lookups = self.hits + self.misses
+		if lookups == 0:
+			return 0.0
+
+		return self.hits / lookups
+
+	def clear(self):
+		'''Empty the cache and reset the hit and miss counts.'''
+
+		with self.lock:
+			self.entries.clear()
+		self.hits = 0
+		self.misses = 0
+
+	def __str__(self):
+		return "{} entries, {} hits, {} misses ({:.1%} hit rate)".format(len(self.entries), self.hits, self.misses, self.get_hit_rate())
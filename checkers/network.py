@@ -0,0 +1,320 @@
+# Will Kearney
+# network.py
+#
+# An optional learned evaluator: a small two-layer network run with NumPy on the CPU.
+#
+# The input is one feature per (piece type, square), 128 in all. The first layer's output (the accumulator) is the sum
+# of the weight rows of the pieces on the board, so SearchBoard keeps it up to date by adding and subtracting one row
+# per piece that moves, is crowned or is captured, instead of recomputing it per position. Evaluating a position is
+# then a clipped ReLU and one dot product. Like static_evaluation, the output is positive for white.
+#
+# The accumulator is kept in fixed point: the first layer is quantized to integers (at the int16 scale it is saved
+# with), so every update is an exact integer sum and a long search can't drift the way adding and subtracting float32
+# rows would. It is only scaled back to floats when a position is evaluated.
+#
+# Weights are stored in a compressed .npz file; the first layer can be stored as int16 with a scale factor.
+#
+#   python -m checkers.network train weights.npz --positions 20000   distil the hand-written evaluation plus search
+#   python -m checkers.network bench weights.npz --games 40          evaluations per second and a match against it
+
+import argparse
+import hashlib
+import time
+import numpy as np
+
+from .evaluation import get_evaluation_profile
+from .constants import *
+
+# packed piece value + 2 -> piece type feature block (-1 for empty)
+PIECE_FEATURES = (0, 1, -1, 2, 3)
+NUM_FEATURES = 4 * NUM_SQUARES
+
+# [piece value + 2][square] -> input feature index
+FEATURE_INDEX = [[PIECE_FEATURES[value + 2] * NUM_SQUARES + square if value != EMPTY else -1 for square in range(NUM_SQUARES)] for value in range(-2, 3)]
+FEATURE_INDEX_ARRAY = np.array(FEATURE_INDEX, dtype=np.int64)
+
+DEFAULT_HIDDEN_SIZE = 32
+
+# the first layer's weights are quantized to integers of at most this size
+INPUT_QUANTIZATION_LIMIT = 32767
+
+# training labels are clipped to this, so won positions (+-inf) don't swamp the loss
+MAX_LABEL = 10.0
+
+class NeuralEvaluator(object):
+	"""Class for a two-layer evaluation network with an incrementally updatable first layer."""
+	def __init__(self, input_weights, input_bias, output_weights, output_bias):
+		super(NeuralEvaluator, self).__init__()
+
+		self.input_weights = np.asarray(input_weights, dtype=np.float32) # (NUM_FEATURES, hidden size)
+		self.input_bias = np.asarray(input_bias, dtype=np.float32)
+		self.output_weights = np.asarray(output_weights, dtype=np.float32)
+		self.output_bias = float(output_bias)
+
+		# the first layer in fixed point, for exact accumulator updates
+		self.input_scale = max(float(np.abs(self.input_weights).max()), 1e-6) / INPUT_QUANTIZATION_LIMIT
+		self.quantized_input_weights = np.round(self.input_weights / self.input_scale).astype(np.int64)
+		self.quantized_input_bias = np.round(self.input_bias / self.input_scale).astype(np.int64)
+
+		# identifies these parameters in analysis cache keys, so every one of them goes into the hash
+		parameters = (self.input_weights, self.input_bias, self.output_weights, np.float64([self.output_bias, self.input_scale]))
+		self.name = "network-" + hashlib.sha1(b"".join(parameter.tobytes() for parameter in parameters)).hexdigest()[:12]
+
+	def get_hidden_size(self):
+		return len(self.input_bias)
+
+	def get_features(self, squares):
+		'''Returns the active input feature indices for a packed position.'''
+
+		return [FEATURE_INDEX[value + 2][square] for square, value in enumerate(np.asarray(squares).tolist()) if value != EMPTY]
+
+	def get_accumulator(self, squares):
+		'''Compute the fixed point first layer output for a packed position from scratch.'''
+
+		return self.quantized_input_bias + self.quantized_input_weights[self.get_features(squares)].sum(axis=0)
+
+	def evaluate_accumulator(self, accumulator):
+		'''Evaluate a position from its fixed point accumulator.'''
+
+		return float(np.dot(np.clip(accumulator * self.input_scale, 0.0, 1.0), self.output_weights)) + self.output_bias
+
+	def evaluate(self, squares):
+		'''Evaluate a packed position from scratch. Positive for white.'''
+
+		return self.evaluate_accumulator(self.get_accumulator(squares))
+
+	def evaluate_batch(self, positions):
+		'''Evaluate an (N, 32) array of packed positions at once, with one matrix product for the first layer.'''
+
+		accumulators = (get_feature_matrix(positions) @ self.quantized_input_weights + self.quantized_input_bias) * self.input_scale
+
+		return np.clip(accumulators, 0.0, 1.0) @ self.output_weights + self.output_bias
+
+	def save(self, path, quantize=True):
+		'''Save the weights to a compressed .npz file. With quantize, the first layer is stored as int16.'''
+
+		if quantize:
+			input_scale = self.input_scale
+			input_weights = self.quantized_input_weights.astype(np.int16)
+		else:
+			input_scale = 1.0
+			input_weights = self.input_weights
+
+		np.savez_compressed(path, input_weights=input_weights, input_scale=np.float32(input_scale), input_bias=self.input_bias, output_weights=self.output_weights, output_bias=np.float32(self.output_bias))
+
+def get_feature_matrix(positions):
+	'''Returns the one-hot (N, NUM_FEATURES) float32 inputs for an (N, 32) array of packed positions.'''
+
+	positions = np.asarray(positions, dtype=np.int8)
+
+	feature_indices = FEATURE_INDEX_ARRAY[positions + 2, np.arange(NUM_SQUARES)]
+	rows, squares = np.nonzero(feature_indices >= 0)
+
+	inputs = np.zeros((len(positions), NUM_FEATURES), dtype=np.float32)
+	inputs[rows, feature_indices[rows, squares]] = 1.0
+
+	return inputs
+
+def load_network(path):
+	'''Load a NeuralEvaluator from a file written by NeuralEvaluator.save.'''
+
+	with np.load(path) as weights:
+		input_weights = weights["input_weights"].astype(np.float32) * float(weights["input_scale"])
+
+		if input_weights.shape[0] != NUM_FEATURES:
+			raise ValueError("{} has {} input features, expected {}".format(path, input_weights.shape[0], NUM_FEATURES))
+
+		return NeuralEvaluator(input_weights, weights["input_bias"], weights["output_weights"], weights["output_bias"])
+
+# networks are loaded once per process
+_networks = {}
+
+def get_network(path):
+	'''Return the NeuralEvaluator stored at path, loading it the first time.'''
+
+	if path not in _networks:
+		_networks[path] = load_network(path)
+
+	return _networks[path]
+
+def generate_training_positions(num_positions, kernel, seed=0, max_plies=120):
+	'''Sample positions from random games. Returns an (N, 32) int8 array of packed positions and an array of players to move.'''
+
+	generator = np.random.default_rng(seed)
+
+	positions = []
+	players = []
+	while len(positions) < num_positions:
+		squares = np.zeros(NUM_SQUARES, dtype=np.int8)
+		squares[:12] = BLACK_MAN
+		squares[20:] = WHITE_MAN
+		player = -1
+
+		for _ in range(max_plies):
+			moves = kernel.generate_moves(squares, player)
+			if len(moves) == 0 or len(positions) >= num_positions:
+				break
+
+			# keep about a third of the positions, so each game contributes a spread of them
+			if generator.random() < 0.3:
+				positions.append(squares.copy())
+				players.append(player)
+
+			kernel.make_move(squares, int(moves[generator.integers(len(moves))]))
+			player = -player
+
+	return np.array(positions, dtype=np.int8), np.array(players, dtype=np.int8)
+
+def label_positions(positions, players, depth, backend="auto", profile_name=DEFAULT_EVALUATION_PROFILE):
+	'''Score each position with a shallow search using the hand-written evaluation.'''
+
+	from .game import CheckersGame
+	from .search_board import SearchBoard
+
+	game = CheckersGame(backend=backend)
+	profile = get_evaluation_profile(profile_name)
+
+	labels = np.zeros(len(positions), dtype=np.float32)
+	for index, (squares, player) in enumerate(zip(positions, players)):
+		search_board = SearchBoard(squares, game.kernel, profile=profile)
+		evaluation, _ = game.minimax_AB(search_board, depth, -np.inf, np.inf, int(player), 0, np.inf)
+		labels[index] = np.clip(evaluation, -MAX_LABEL, MAX_LABEL)
+
+	return labels
+
+def train_network(positions, labels, hidden_size=DEFAULT_HIDDEN_SIZE, epochs=30, batch_size=256, learning_rate=0.003, seed=0):
+	'''Fit a NeuralEvaluator to labelled positions with mini-batch Adam on the mean squared error.'''
+
+	generator = np.random.default_rng(seed)
+
+	# one-hot inputs, built once
+	inputs = get_feature_matrix(positions)
+
+	# start with hidden units half on, so the clipped ReLU has a gradient everywhere
+	parameters = [
+		generator.normal(0.0, 0.1, size=(NUM_FEATURES, hidden_size)).astype(np.float32),
+		np.full(hidden_size, 0.5, dtype=np.float32),
+		generator.normal(0.0, 0.1, size=hidden_size).astype(np.float32),
+		np.zeros(1, dtype=np.float32),
+	]
+	first_moments = [np.zeros_like(parameter) for parameter in parameters]
+	second_moments = [np.zeros_like(parameter) for parameter in parameters]
+	step = 0
+
+	for epoch in range(epochs):
+		order = generator.permutation(len(positions))
+		total_loss = 0.0
+
+		for start in range(0, len(order), batch_size):
+			batch = order[start:start + batch_size]
+			batch_inputs = inputs[batch]
+			batch_labels = labels[batch]
+
+			input_weights, input_bias, output_weights, output_bias = parameters
+
+			hidden = batch_inputs @ input_weights + input_bias
+			activations = np.clip(hidden, 0.0, 1.0)
+			outputs = activations @ output_weights + output_bias[0]
+
+			errors = outputs - batch_labels
+			total_loss += float(np.sum(errors ** 2))
+
+			output_gradient = 2 * errors / len(batch)
+			hidden_gradient = np.outer(output_gradient, output_weights) * ((hidden > 0) & (hidden < 1))
+			gradients = [batch_inputs.T @ hidden_gradient, hidden_gradient.sum(axis=0), activations.T @ output_gradient, np.array([output_gradient.sum()], dtype=np.float32)]
+
+			step += 1
+			for parameter, gradient, first_moment, second_moment in zip(parameters, gradients, first_moments, second_moments):
+				first_moment *= 0.9
+				first_moment += 0.1 * gradient
+				second_moment *= 0.999
+				second_moment += 0.001 * gradient ** 2
+
+				corrected_first = first_moment / (1 - 0.9 ** step)
+				corrected_second = second_moment / (1 - 0.999 ** step)
+				parameter -= (learning_rate * corrected_first / (np.sqrt(corrected_second) + 1e-8)).astype(np.float32)
+
+		print("epoch {}: mse {:.4f}".format(epoch + 1, total_loss / len(positions)))
+
+	return NeuralEvaluator(parameters[0], parameters[1], parameters[2], parameters[3][0])
+
+def benchmark_evaluations(network, backend="auto", num_positions=2000, seed=0):
+	'''Measure evaluations per second (with a make/unmake per evaluation, as in search) for each evaluator.'''
+
+	from .kernel import get_backend
+	from .search_board import SearchBoard
+
+	kernel = get_backend(backend)
+	positions, players = generate_training_positions(num_positions, kernel, seed)
+	profile = get_evaluation_profile()
+
+	evaluators = [
+		("full table evaluation", None, lambda search_board: kernel.evaluate(search_board.squares, profile.table, profile.centroid_weight)),
+		("incremental table evaluation", None, lambda search_board: search_board.static_evaluation()),
+		("incremental network evaluation", network, lambda search_board: search_board.static_evaluation()),
+	]
+
+	for name, evaluator_network, evaluate in evaluators:
+		evaluations = 0
+		start_time = time.perf_counter()
+
+		for squares, player in zip(positions, players):
+			search_board = SearchBoard(squares, kernel, profile=profile, network=evaluator_network)
+			for move in kernel.generate_moves(search_board.squares, int(player)).tolist():
+				undo = search_board.make_move(move)
+				evaluate(search_board)
+				search_board.unmake_move(move, undo)
+				evaluations += 1
+
+		elapsed = time.perf_counter() - start_time
+		print("{:<32} {:>10.0f} evaluations/s".format(name, evaluations / elapsed))
+
+def main():
+	parser = argparse.ArgumentParser(description="Train or benchmark the neural network evaluator.")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	train_parser = subparsers.add_parser("train", help="distil the hand-written evaluation and a shallow search into a network")
+	train_parser.add_argument("weights", help="output .npz file")
+	train_parser.add_argument("--positions", type=int, default=20000, help="number of training positions")
+	train_parser.add_argument("--depth", type=int, default=4, help="search depth used to label positions")
+	train_parser.add_argument("--hidden", type=int, default=DEFAULT_HIDDEN_SIZE, help="hidden layer size")
+	train_parser.add_argument("--epochs", type=int, default=30)
+	train_parser.add_argument("--float32", action="store_true", help="store the first layer as float32 instead of int16")
+	train_parser.add_argument("--seed", type=int, default=0)
+	train_parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto")
+
+	bench_parser = subparsers.add_parser("bench", help="compare evaluation speed and playing strength with the hand-written evaluation")
+	bench_parser.add_argument("weights", help=".npz file written by train")
+	bench_parser.add_argument("--level", default="Easy", help="difficulty level for the match")
+	bench_parser.add_argument("--games", type=int, default=40, help="match games (0 to skip the match)")
+	bench_parser.add_argument("--workers", type=int, default=None)
+	bench_parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto")
+
+	args = parser.parse_args()
+
+	if args.command == "train":
+		from .kernel import get_backend
+
+		positions, players = generate_training_positions(args.positions, get_backend(args.backend), args.seed)
+		labels = label_positions(positions, players, args.depth, args.backend)
+
+		network = train_network(positions, labels, args.hidden, args.epochs, seed=args.seed)
+		network.save(args.weights, quantize=not args.float32)
+		print("saved {} to {}".format(network.name, args.weights))
+
+	elif args.command == "bench":
+		from .tournament import EngineConfig, MatchStatistics, run_match
+
+		benchmark_evaluations(get_network(args.weights), args.backend)
+
+		if args.games > 0:
+			statistics = MatchStatistics()
+			network_engine = EngineConfig(args.level.capitalize(), network_path=args.weights)
+			table_engine = EngineConfig(args.level.capitalize())
+
+			print("{} vs {}".format(network_engine, table_engine))
+			run_match(network_engine, table_engine, (args.games + 1) // 2, statistics, args.workers, backend=args.backend, report=lambda line: None)
+			print(statistics)
+
+if __name__ == '__main__':
+	main()
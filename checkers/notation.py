@@ -0,0 +1,270 @@
+# Will Kearney
+# notation.py
+#
+# Defines codecs for reading and writing positions: FEN strings, PDN move lists, a packed array form, and a 64-bit position key.
+#
+# The 32 dark squares are numbered 1-32 as in standard PDN diagrams, which are drawn from white's side with black at the top.
+# Square 1 is on black's back row (row 7, col 6), and numbers run right to left across each row in window coordinates.
+# Black holds squares 1-12 at the start of the game and moves first.
+
+import re
+import numpy as np
+
+from .board import Board
+from .piece import Piece
+from .constants import *
+
+FEN_PATTERN = re.compile(r'^\s*([BW])\s*:\s*([BW])([^:]*):\s*([BW])([^:]*?)\s*\.?\s*$', re.IGNORECASE)
+PDN_MOVE_PATTERN = re.compile(r'^(\d+)([-x])(\d+)$')
+PDN_RESULTS = {"1-0", "0-1", "1/2-1/2", "*", "2-0", "0-2", "1-1"}
+
+def square_to_location(square):
+	'''Given a PDN square number (1-32), return the (row, col) location on the board.'''
+
+	if square < 1 or square > NUM_SQUARES:
+		raise ValueError("Square must be between 1 and 32, got {}".format(square))
+
+	return SQUARE_LOCATIONS[square - 1]
+
+def location_to_square(row, col):
+	'''Given a (row, col) location, return the PDN square number (1-32).'''
+
+	if (row, col) not in LOCATION_SQUARES:
+		raise ValueError("Location ({}, {}) is not a playable square".format(row, col))
+
+	return LOCATION_SQUARES[(row, col)] + 1
+
+def player_to_symbol(player):
+	'''Convert a piece indicator (1 = white, -1 = black) to the FEN color letter.'''
+
+	return "W" if player == 1 else "B"
+
+def symbol_to_player(symbol):
+	'''Convert a FEN color letter to a piece indicator (1 = white, -1 = black).'''
+
+	return 1 if symbol.upper() == "W" else -1
+
+def _parse_fen_squares(text):
+	'''Parse a comma separated FEN piece list (e.g. "K3,10,21-24") into a list of (square, king) tuples.'''
+
+	squares = []
+	for token in text.split(","):
+		token = token.strip()
+		if not token:
+			continue
+
+		king = token[0].upper() == "K"
+		if king:
+			token = token[1:]
+
+		if "-" in token:
+			# a range of squares, like 1-12
+			first, last = token.split("-")
+			if int(first) > int(last):
+				raise ValueError("Square range {!r} runs backwards".format(token))
+			squares.extend((square, king) for square in range(int(first), int(last) + 1))
+		else:
+			squares.append((int(token), king))
+
+	return squares
+
+def _parse_fen(fen):
+	'''Parse a FEN string into a list of (square, player, king) pieces and the player to move, rejecting squares out of
+	range and squares listed more than once (including for both colors).'''
+
+	match = FEN_PATTERN.match(fen)
+	if not match:
+		raise ValueError("Invalid FEN string: {!r}".format(fen))
+
+	pieces = []
+	occupied = set()
+	for symbol, squares_text in ((match.group(2), match.group(3)), (match.group(4), match.group(5))):
+		indicator = symbol_to_player(symbol)
+
+		for square, king in _parse_fen_squares(squares_text):
+			if square < 1 or square > NUM_SQUARES:
+				raise ValueError("Square must be between 1 and 32, got {}".format(square))
+			if square in occupied:
+				raise ValueError("Square {} is listed more than once in FEN string {!r}".format(square, fen))
+
+			occupied.add(square)
+			pieces.append((square, indicator, king))
+
+	return pieces, symbol_to_player(match.group(1))
+
+def board_from_fen(fen):
+	'''Build a Board directly from a FEN string like "B:W21-32:B1-12". Returns (board, player), where player is the side to move.'''
+
+	pieces, player = _parse_fen(fen)
+
+	board = Board(setup=False)
+	for square, indicator, king in pieces:
+		row, col = square_to_location(square)
+		piece = Piece(indicator=indicator, row=row, col=col)
+		piece.king = king
+		board.board[row, col] = piece
+
+	board.compute_hash()
+
+	return board, player
+
+def board_to_fen(board, player):
+	'''Serialize a Board and the side to move (1 = white, -1 = black) into a FEN string.'''
+
+	white_squares = []
+	black_squares = []
+	for index, (row, col) in enumerate(SQUARE_LOCATIONS):
+		piece = board.board[row, col]
+		if piece is None:
+			continue
+
+		token = ("K" if piece.king else "") + str(index + 1)
+		if piece.indicator == 1:
+			white_squares.append(token)
+		else:
+			black_squares.append(token)
+
+	return "{}:W{}:B{}".format(player_to_symbol(player), ",".join(white_squares), ",".join(black_squares))
+
+def pack_board(board):
+	'''Pack a Board into a 32 element int8 array, one entry per dark square (0 = empty, +-1 = man, +-2 = king).'''
+
+	packed = np.zeros(NUM_SQUARES, dtype=np.int8)
+	for index, (row, col) in enumerate(SQUARE_LOCATIONS):
+		piece = board.board[row, col]
+		if piece is not None:
+			packed[index] = piece.indicator * (2 if piece.king else 1)
+
+	return packed
+
+def unpack_board(packed):
+	'''Build a Board from a packed 32 element array (see pack_board).'''
+
+	board = Board(setup=False)
+	for index, value in enumerate(packed.tolist()):
+		if value == EMPTY:
+			continue
+
+		row, col = SQUARE_LOCATIONS[index]
+		piece = Piece(indicator=1 if value > 0 else -1, row=row, col=col)
+		piece.king = abs(value) == 2
+		board.board[row, col] = piece
+
+	board.compute_hash()
+
+	return board
+
+def packed_from_fen(fen):
+	'''Parse a FEN string straight into the packed form without building Piece objects. Returns (packed, player).'''
+
+	pieces, player = _parse_fen(fen)
+
+	packed = np.zeros(NUM_SQUARES, dtype=np.int8)
+	for square, indicator, king in pieces:
+		packed[square - 1] = indicator * (2 if king else 1)
+
+	return packed, player
+
+def packed_to_fen(packed, player):
+	'''Serialize a packed position and the side to move into a FEN string.'''
+
+	white_squares = []
+	black_squares = []
+	for index, value in enumerate(packed.tolist()):
+		if value == EMPTY:
+			continue
+
+		token = ("K" if abs(value) == 2 else "") + str(index + 1)
+		if value > 0:
+			white_squares.append(token)
+		else:
+			black_squares.append(token)
+
+	return "{}:W{}:B{}".format(player_to_symbol(player), ",".join(white_squares), ",".join(black_squares))
+
+def position_key(packed, player):
+	'''Return the 64-bit Zobrist key for a packed position and side to move.'''
+
+	key = ZOBRIST_WHITE_TO_MOVE if player == 1 else 0
+	for index, value in enumerate(packed.tolist()):
+		if value != EMPTY:
+			key ^= ZOBRIST_TABLE[value + 2][index]
+
+	return key
+
+def board_key(board, player):
+	'''Return the 64-bit Zobrist key for a Board and side to move. This is O(1), since boards keep their hash up to date.'''
+
+	return board.hash ^ (ZOBRIST_WHITE_TO_MOVE if player == 1 else 0)
+
+def parse_pdn_moves(text):
+	'''Parse a PDN move list (e.g. "1. 11-15 23-19 2. 8-11 22x15") into a list of ((from_row, from_col), (to_row, to_col)) tuples. Move numbers, comments and results are skipped.'''
+
+	text = re.sub(r'\{[^}]*\}', ' ', text) # strip comments
+
+	moves = []
+	for token in text.split():
+		if token in PDN_RESULTS or re.match(r'^\d+\.+$', token):
+			continue
+
+		# a move number can be glued to the move, like "1.11-15"
+		token = re.sub(r'^\d+\.+', '', token)
+
+		match = PDN_MOVE_PATTERN.match(token)
+		if not match:
+			raise ValueError("Invalid PDN move: {!r}".format(token))
+
+		from_location = square_to_location(int(match.group(1)))
+		to_location = square_to_location(int(match.group(3)))
+		moves.append((from_location, to_location))
+
+	return moves
+
+def move_to_pdn(from_location, to_location):
+	'''Format a single move in PDN notation, e.g. "11-15" or "15x22".'''
+
+	separator = "x" if abs(to_location[0] - from_location[0]) == 2 else "-"
+	return "{}{}{}".format(location_to_square(*from_location), separator, location_to_square(*to_location))
+
+def moves_to_pdn(moves, result=None):
+	'''Serialize a list of ((from_row, from_col), (to_row, to_col)) moves into a numbered PDN move list. Black moves first.'''
+
+	tokens = []
+	for ply, (from_location, to_location) in enumerate(moves):
+		if ply % 2 == 0:
+			tokens.append("{}.".format(ply // 2 + 1))
+
+		tokens.append(move_to_pdn(from_location, to_location))
+
+	if result:
+		tokens.append(result)
+
+	return " ".join(tokens)
+
+def replay_pdn_moves(text, fen=None):
+	'''Play a PDN move list from the starting position (or a FEN string). Returns (board, player). Raises ValueError at
+	the first move that isn't legal for the player to move, including a non-capture when a capture is forced.'''
+
+	if fen:
+		board, player = board_from_fen(fen)
+	else:
+		board, player = Board(), -1
+
+	for from_location, to_location in parse_pdn_moves(text):
+		legal_moves = [(legal_from, legal_to) for legal_from, legal_to, _ in board.get_legal_moves(player)]
+
+		if (from_location, to_location) not in legal_moves:
+			move_text = move_to_pdn(from_location, to_location)
+
+			if not board.board[from_location] or board.board[from_location].indicator != player:
+				raise ValueError("Illegal PDN move {}: no piece to move".format(move_text))
+			if any(abs(legal_to[0] - legal_from[0]) == 2 for legal_from, legal_to in legal_moves):
+				raise ValueError("Illegal PDN move {}: a capture is forced".format(move_text))
+
+			raise ValueError("Illegal PDN move {}".format(move_text))
+
+		board.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+
+		player = player * -1
+
+	return board, player
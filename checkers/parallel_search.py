@@ -0,0 +1,138 @@
+# Will Kearney
+# parallel_search.py
+#
+# Support for the thread-parallel form of Lazy SMP (see CheckersGame.search_lazy_smp_threads), and a benchmark that
+# compares it with the process-parallel form.
+#
+# With the GIL, threads take turns running Python code, so the process form (helpers in a process pool, sharing a
+# transposition table in shared memory) is the only one that scales. On a free-threaded build (python3.13t and later)
+# threads run at the same time, and they can share the game's own transposition table list, its move cache and the
+# read-only tables (Zobrist keys, evaluation profiles, the kernel) directly, with nothing to pickle or attach. Each
+# helper thread has a SearchHelper, made once and kept with the game, which holds only its own search state (its
+# SearchBoard, search path and PV table). Shared state stays safe: transposition table entries are immutable tuples
+# swapped in whole, the move cache and the best result so far (a SearchResult) only change under their locks, and the
+# position history is only read while searching.
+#
+# get_parallel_mode picks threads when the GIL is disabled and processes otherwise.
+#
+#   python -m checkers.parallel_search --workers 1 2 4 --movetime 2
+
+import argparse
+import concurrent.futures
+import sys
+import threading
+
+from .constants import *
+
+class SearchResult(object):
+	"""Class for the best result found by a group of searches of the same root, updated atomically."""
+	def __init__(self):
+		super(SearchResult, self).__init__()
+
+		self.lock = threading.Lock()
+
+		self.evaluation = None
+		self.move = None
+		self.depth = 0
+		self.principal_variation = []
+		self.nodes_searched = 0
+
+	def offer(self, depth, evaluation, move, principal_variation, replace_equal=False):
+		'''Keep a completed iteration's result if it is deeper than the best so far (or as deep, with replace_equal).
+		Returns whether it was kept.'''
+
+		with self.lock:
+			if move is None or depth < self.depth or (depth == self.depth and not replace_equal):
+				return False
+
+			self.evaluation = evaluation
+			self.move = move
+			self.depth = depth
+			self.principal_variation = list(principal_variation)
+
+			return True
+
+	def add_nodes(self, nodes):
+		with self.lock:
+			self.nodes_searched += nodes
+
+	def get(self):
+		'''Returns (evaluation, move, depth reached, nodes searched, principal variation), all from the same moment.'''
+
+		with self.lock:
+			return self.evaluation, self.move, self.depth, self.nodes_searched, self.principal_variation
+
+def is_gil_enabled():
+	'''Check whether this interpreter has the GIL (always true before Python 3.13).'''
+
+	return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+def get_parallel_mode(mode="auto"):
+	'''Resolve a parallel search mode: "threads" or "processes" as given, or for "auto", threads only without the GIL.'''
+
+	if mode == "auto":
+		return "processes" if is_gil_enabled() else "threads"
+
+	return mode
+
+# the thread pool for helper searches, kept between searches like the process pool in mcts.py
+_executor = None
+_executor_workers = None
+
+def get_thread_executor(workers):
+	'''Returns a thread pool of workers threads, replacing the last one if the size differs.'''
+
+	global _executor, _executor_workers
+
+	if _executor_workers != workers:
+		if _executor is not None:
+			_executor.shutdown()
+
+		_executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+		_executor_workers = workers
+
+	return _executor
+
+def run_benchmark(worker_counts, modes, time_limit, difficulty_level="Hard", backend="auto", report=print):
+	'''Search the opening position for time_limit seconds with each mode and number of workers, reporting the depth
+	reached and nodes searched. Returns a list of (mode, workers, depth reached, nodes searched) tuples.'''
+
+	from .game import CheckersGame
+
+	report("GIL {}".format("enabled" if is_gil_enabled() else "disabled"))
+
+	results = []
+	for mode in modes:
+		for workers in worker_counts:
+			games = []
+			for _ in range(2):
+				game = CheckersGame(backend=backend)
+				game.difficulty_level = difficulty_level
+				game.smp_workers = workers
+				game.smp_mode = mode
+				games.append(game)
+
+			# a short search in another game first, so starting the pool isn't timed
+			games[0].search(games[0].current_player, 2)
+
+			game = games[1]
+			_, _, depth_reached, nodes = game.search(game.current_player, MAX_SEARCH_DEPTH, time_limit=time_limit)
+
+			report("{:<10} {:>3} workers: depth {:>3}, {:>9} nodes, {:>9.0f} nodes/s".format(mode, workers, depth_reached, nodes, nodes / time_limit))
+			results.append((mode, workers, depth_reached, nodes))
+
+	return results
+
+def main():
+	parser = argparse.ArgumentParser(description="Compare thread- and process-parallel Lazy SMP search.")
+	parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="numbers of searches to run at once")
+	parser.add_argument("--modes", nargs="+", choices=["threads", "processes"], default=["processes", "threads"])
+	parser.add_argument("--movetime", type=float, default=2.0, help="seconds per search")
+	parser.add_argument("--level", default="Hard", choices=sorted(AI_SETTINGS), help="difficulty level (sets the static evaluation limit)")
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation and evaluation backend")
+	args = parser.parse_args()
+
+	run_benchmark(args.workers, args.modes, args.movetime, args.level, args.backend)
+
+if __name__ == '__main__':
+	main()
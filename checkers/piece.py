@@ -8,6 +8,7 @@ import numpy as np
 import itertools
 import copy
 
+from .assets import get_asset
 from .constants import *
 
 class Piece(object):
@@ -34,6 +35,14 @@ class Piece(object):
 
 		self.selected = False # flag to determine if a piece is selected
 
+	def get_value(self):
+		'''Returns the packed value of this piece: its indicator, doubled for a king.'''
+
+		if self.king:
+			return self.indicator * 2
+
+		return self.indicator
+
 	def check_select(self, x, y):
 		'''Given an x and a y, check if this piece get's selected.'''
 
@@ -64,6 +73,6 @@ class Piece(object):
 			pygame.draw.circle(window, self.color, (x_center, y_center), PIECE_RADIUS, 0)
 
 		if self.king and self.indicator == 1:
-			window.blit(WHITE_KING_ICON, (x_king, y_king))
+			window.blit(get_asset("white_king"), (x_king, y_king))
 		elif self.king and self.indicator == -1:
-			window.blit(BLACK_KING_ICON, (x_king, y_king))
\ No newline at end of file
+			window.blit(get_asset("black_king"), (x_king, y_king))
\ No newline at end of file
@@ -0,0 +1,223 @@
+# Will Kearney
+# profiling.py
+#
+# Opt-in profiling for the AI search and rendering hot paths. Turn it on with the CHECKERS_PROFILE environment variable
+# or "python main.py --profile DIR"; either way, reports are written to the given directory.
+#
+# When profiling is on, hot methods and the kernel's generate_moves entry point are wrapped with cheap timers,
+# make_AI_move runs under cProfile and tracemalloc, and the draw calls run under a separate cProfile. After every AI
+# move these files are written:
+#
+#   move-NNNN.pstats            cProfile stats for the AI move (pstats, snakeviz, gprof2dot, flameprof...)
+#   move-NNNN-rendering.pstats  cProfile stats for all drawing since the previous move
+#   move-NNNN.folded            timer totals as folded stacks in microseconds (flamegraph.pl, speedscope, inferno...)
+#   move-NNNN-timers.txt        calls and total time per timer, and the game's move cache hit rate
+#   move-NNNN-memory.txt        the largest allocation changes during the AI move (tracemalloc)
+#
+# When profiling is off nothing is wrapped, so there is no overhead at all.
+
+import os
+import time
+import cProfile
+import tracemalloc
+import functools
+import collections
+
+from . import kernel
+from .board import Board
+from .game import CheckersGame
+from .search_board import SearchBoard
+
+# (class, method name, timer name) for every method that gets a timer
+TIMED_METHODS = [
+	(SearchBoard, "get_legal_moves", "move_generation"),
+	(SearchBoard, "make_move", "make_unmake"),
+	(SearchBoard, "unmake_move", "make_unmake"),
+	(SearchBoard, "static_evaluation", "evaluation"),
+	(Board, "check_move_legality", "move_legality"),
+	(Board, "update_human_moves", "human_moves"),
+	(Board, "update_legal_moves", "legal_move_tiles"),
+]
+
+# (function name, timer name) for kernel entry points, which are attributes of each KernelBackend rather than methods.
+# Only calls from Python are timed: inside a Numba kernel, calls between kernel functions never come back to Python
+KERNEL_TIMED_FUNCTIONS = [
+	("generate_moves", "kernel_generate_moves"),
+]
+
+# draw methods, which are also run under the rendering profiler
+RENDERING_METHODS = [
+	(Board, "draw_board", "draw_board"),
+	(CheckersGame, "draw_splash_screen", "draw_splash_screen"),
+	(CheckersGame, "draw_game_over_screen", "draw_game_over_screen"),
+	(CheckersGame, "draw_forced_capture_warning", "draw_forced_capture_warning"),
+]
+
+NUM_MEMORY_STATS = 25
+
+# the active profiler, if profiling has been turned on
+_profiler = None
+
+class Profiler(object):
+	"""Class for collecting timers, cProfile stats and memory snapshots, and writing a report after each AI move."""
+	def __init__(self, output_dir):
+		super(Profiler, self).__init__()
+
+		self.output_dir = output_dir
+		os.makedirs(output_dir, exist_ok=True)
+
+		self.move_number = 0
+
+		# timer totals keyed by stack path, e.g. "ai_move;move_generation"
+		self.stack = []
+		self.timer_totals = collections.defaultdict(float) # self time, in seconds
+		self.timer_calls = collections.Counter()
+
+		self.rendering_profile = cProfile.Profile()
+		self.rendering_depth = 0
+
+	def timed(self, function, name):
+		'''Wrap function so its time is added to the timer called name.'''
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			frame = [name, 0.0] # timer name, time spent in nested timers
+			self.stack.append(frame)
+			start_time = time.perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				elapsed = time.perf_counter() - start_time
+				path = ";".join(stack_frame[0] for stack_frame in self.stack)
+				self.stack.pop()
+
+				self.timer_totals[path] += elapsed - frame[1]
+				self.timer_calls[path] += 1
+
+				if self.stack:
+					self.stack[-1][1] += elapsed
+
+		return wrapper
+
+	def rendered(self, function):
+		'''Wrap a draw method so it runs under the rendering profiler.'''
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			# draw methods call each other, so only the outermost one switches the profiler on
+			self.rendering_depth += 1
+			if self.rendering_depth == 1:
+				self.rendering_profile.enable()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				if self.rendering_depth == 1:
+					self.rendering_profile.disable()
+				self.rendering_depth -= 1
+
+		return wrapper
+
+	def profiled_move(self, function):
+		'''Wrap make_AI_move so each call is profiled and followed by a report.'''
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			self.move_number += 1
+
+			profile = cProfile.Profile()
+			snapshot_before = tracemalloc.take_snapshot()
+
+			profile.enable()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				profile.disable()
+				snapshot_after = tracemalloc.take_snapshot()
+				self.write_report(profile, snapshot_before, snapshot_after, args[0].move_cache)
+
+		return wrapper
+
+	def install(self):
+		'''Wrap the timed, rendering and AI move methods.'''
+
+		tracemalloc.start()
+
+		for cls, method_name, timer_name in TIMED_METHODS:
+			setattr(cls, method_name, self.timed(getattr(cls, method_name), timer_name))
+
+		for cls, method_name, timer_name in RENDERING_METHODS:
+			setattr(cls, method_name, self.rendered(self.timed(getattr(cls, method_name), timer_name)))
+
+		# backends built so far, and any built later
+		for backend in kernel._backends.values():
+			self.time_kernel(backend)
+
+		backend_init = kernel.KernelBackend.__init__
+
+		@functools.wraps(backend_init)
+		def timed_backend_init(backend, *args, **kwargs):
+			backend_init(backend, *args, **kwargs)
+			self.time_kernel(backend)
+
+		kernel.KernelBackend.__init__ = timed_backend_init
+
+		CheckersGame.make_AI_move = self.profiled_move(self.timed(CheckersGame.make_AI_move, "ai_move"))
+
+	def time_kernel(self, backend):
+		'''Wrap a kernel backend's entry points with timers.'''
+
+		for function_name, timer_name in KERNEL_TIMED_FUNCTIONS:
+			setattr(backend, function_name, self.timed(getattr(backend, function_name), timer_name))
+
+	def write_report(self, profile, snapshot_before, snapshot_after, move_cache=None):
+		'''Write the report files for the current move, then reset the timers and rendering profile.'''
+
+		prefix = os.path.join(self.output_dir, "move-{:04d}".format(self.move_number))
+
+		profile.dump_stats(prefix + ".pstats")
+
+		# a Profile that was never enabled has no stats to dump
+		self.rendering_profile.create_stats()
+		if self.rendering_profile.stats:
+			self.rendering_profile.dump_stats(prefix + "-rendering.pstats")
+
+		with open(prefix + ".folded", "w") as folded_file:
+			for path, total in sorted(self.timer_totals.items()):
+				folded_file.write("{} {}\n".format(path, int(total * 1e6)))
+
+		with open(prefix + "-timers.txt", "w") as timers_file:
+			timers_file.write("{:<50} {:>10} {:>12} {:>12}\n".format("timer", "calls", "self (ms)", "per call (us)"))
+			for path, total in sorted(self.timer_totals.items(), key=lambda item: -item[1]):
+				calls = self.timer_calls[path]
+				timers_file.write("{:<50} {:>10} {:>12.3f} {:>12.2f}\n".format(path, calls, total * 1e3, total * 1e6 / calls))
+
+			if move_cache is not None:
+				timers_file.write("\nmove cache: {}\n".format(move_cache))
+
+		with open(prefix + "-memory.txt", "w") as memory_file:
+			for statistic in snapshot_after.compare_to(snapshot_before, "lineno")[:NUM_MEMORY_STATS]:
+				memory_file.write("{}\n".format(statistic))
+
+		self.timer_totals.clear()
+		self.timer_calls.clear()
+		self.rendering_profile = cProfile.Profile()
+
+def enable_profiling(output_dir):
+	'''Turn profiling on, writing reports to output_dir. Does nothing if profiling is already on.'''
+
+	global _profiler
+
+	if _profiler is None:
+		_profiler = Profiler(output_dir)
+		_profiler.install()
+
+	return _profiler
+
+def enable_profiling_from_environment():
+	'''Turn profiling on if the CHECKERS_PROFILE environment variable names an output directory.'''
+
+	output_dir = os.environ.get("CHECKERS_PROFILE")
+	if output_dir:
+		return enable_profiling(output_dir)
+
+	return None
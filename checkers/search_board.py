@@ -0,0 +1,227 @@
+# Will Kearney
+# search_board.py
+#
+# Defines the SearchBoard class, the position minimax_AB searches. Unlike a Board it holds no Piece objects; moves are
+# made and unmade in place on a packed array through a kernel backend (see kernel.py), so the search never copies boards.
+# The hash and the evaluation (see evaluation.py, or network.py when a network is given) are both updated incrementally
+# as moves are made and unmade, as is the hash of the color-reversed twin used for canonical keys (see symmetry.py).
+
+import numpy as np
+
+from .evaluation import get_evaluation_profile, TABLE_SCORE_UNITS
+from .network import FEATURE_INDEX
+from .symmetry import MIRRORED_ZOBRIST_TABLE
+from .constants import *
+
+# square -> row and col, as plain ints for the incremental centroid sums
+SQUARE_ROW_LIST = [location[0] for location in SQUARE_LOCATIONS]
+SQUARE_COL_LIST = [location[1] for location in SQUARE_LOCATIONS]
+
+class SearchBoard(object):
+	"""Class for representing a packed position during search, with an incrementally updated hash and evaluation."""
+	def __init__(self, squares, kernel, halfmove_clock=0, profile=None, engine_player=1, network=None, move_cache=None):
+		super(SearchBoard, self).__init__()
+
+		self.kernel = kernel
+		self.move_cache = move_cache # an optional MoveCache (see move_cache.py), shared with other searches of the same game
+		self.squares = np.array(squares, dtype=np.int8) # copy, since the search changes it in place
+
+		self.num_white_pieces = int(np.count_nonzero(self.squares > 0))
+		self.num_black_pieces = int(np.count_nonzero(self.squares < 0))
+
+		# the evaluation profile, and the player whose engine it is; the centroid term pulls that player towards the opponent
+		self.profile = profile or get_evaluation_profile()
+		self.table = self.profile.table_units
+		self.centroid_weight = self.profile.centroid_weight
+		self.engine_player = engine_player
+
+		# piece-square table total (in integer units, see evaluation.py), and the row and col sums of each side's pieces
+		# for the centroid term
+		self.table_score = 0
+		self.white_row_sum = 0
+		self.white_col_sum = 0
+		self.black_row_sum = 0
+		self.black_col_sum = 0
+
+		# an optional NeuralEvaluator, which replaces the table evaluation; its first layer output is updated incrementally
+		# too, in fixed point so it stays exact (see network.py)
+		self.network = network
+		if network is not None:
+			self.network_weights = network.quantized_input_weights
+			self.accumulator = network.quantized_input_bias.copy()
+
+		# plies since the last capture or man move, with the values it had before each move so unmake_move can restore them
+		self.halfmove_clock = halfmove_clock
+		self.halfmove_clock_history = []
+
+		# canonical keys only make sense for an evaluation that scores a position and its twin the same (see symmetry.py)
+		self.symmetric = network is None and self.centroid_weight == 0
+
+		self.hash = 0
+		self.mirrored_hash = 0
+		for square, value in enumerate(self.squares.tolist()):
+			if value != EMPTY:
+				self.hash ^= ZOBRIST_TABLE[value + 2][square]
+				self.mirrored_hash ^= MIRRORED_ZOBRIST_TABLE[value + 2][square]
+				self.add_piece(value, square)
+
+	def add_piece(self, value, square):
+		'''Add a piece to the evaluation terms.'''
+
+		self.table_score += self.table[value + 2][square]
+
+		if self.network is not None:
+			self.accumulator += self.network_weights[FEATURE_INDEX[value + 2][square]]
+
+		if value > 0:
+			self.white_row_sum += SQUARE_ROW_LIST[square]
+			self.white_col_sum += SQUARE_COL_LIST[square]
+		else:
+			self.black_row_sum += SQUARE_ROW_LIST[square]
+			self.black_col_sum += SQUARE_COL_LIST[square]
+
+	def remove_piece(self, value, square):
+		'''Remove a piece from the evaluation terms.'''
+
+		self.table_score -= self.table[value + 2][square]
+
+		if self.network is not None:
+			self.accumulator -= self.network_weights[FEATURE_INDEX[value + 2][square]]
+
+		if value > 0:
+			self.white_row_sum -= SQUARE_ROW_LIST[square]
+			self.white_col_sum -= SQUARE_COL_LIST[square]
+		else:
+			self.black_row_sum -= SQUARE_ROW_LIST[square]
+			self.black_col_sum -= SQUARE_COL_LIST[square]
+
+	def get_key(self, player):
+		'''Returns the 64-bit key for this position with player to move (matches CheckersGame.get_position_key).'''
+
+		if player == 1:
+			return self.hash ^ ZOBRIST_WHITE_TO_MOVE
+
+		return self.hash
+
+	def get_table_key(self, player):
+		'''Returns (key, flipped) for the transposition table and analysis cache: the canonical key (see symmetry.py) and
+		whether the canonical form is the mirror of this position, or just get_key and False if the evaluation isn't
+		symmetric. When flipped is True, moves and scores must be mirrored on the way in and out.'''
+
+		if not self.symmetric:
+			return self.get_key(player), False
+
+		if player == 1:
+			return self.hash ^ ZOBRIST_WHITE_TO_MOVE, False
+
+		return self.mirrored_hash ^ ZOBRIST_WHITE_TO_MOVE, True
+
+	def generate_moves(self, player):
+		'''Returns the legal moves for player as an array of packed moves, from the move cache if there is one.'''
+
+		if self.move_cache is None:
+			return self.kernel.generate_moves(self.squares, player)
+
+		return self.move_cache.get_moves(self.get_key(player), self.kernel, self.squares, player)
+
+	def get_legal_moves(self, player):
+		'''Returns the legal moves for player as a shuffled list of packed moves (see kernel.encode_move).'''
+
+		moves = self.generate_moves(player).tolist()
+		np.random.shuffle(moves)
+
+		return moves
+
+	def make_move(self, move):
+		'''Make a packed move in place, returning the undo record needed by unmake_move.'''
+
+		undo = self.kernel.make_move(self.squares, move)
+
+		from_square = move & 31
+		to_square = (move >> 5) & 31
+		captured_square = (move >> 10) - 1
+		moving_value = (undo & 7) - 2
+		new_value = ((undo >> 3) & 7) - 2
+
+		self.hash ^= ZOBRIST_TABLE[moving_value + 2][from_square] ^ ZOBRIST_TABLE[new_value + 2][to_square]
+		self.mirrored_hash ^= MIRRORED_ZOBRIST_TABLE[moving_value + 2][from_square] ^ MIRRORED_ZOBRIST_TABLE[new_value + 2][to_square]
+		self.remove_piece(moving_value, from_square)
+		self.add_piece(new_value, to_square)
+
+		self.halfmove_clock_history.append(self.halfmove_clock)
+
+		if captured_square >= 0:
+			captured_value = ((undo >> 6) & 7) - 2
+			self.hash ^= ZOBRIST_TABLE[captured_value + 2][captured_square]
+			self.mirrored_hash ^= MIRRORED_ZOBRIST_TABLE[captured_value + 2][captured_square]
+			self.remove_piece(captured_value, captured_square)
+
+			if captured_value > 0:
+				self.num_white_pieces -= 1
+			else:
+				self.num_black_pieces -= 1
+
+			self.halfmove_clock = 0
+		elif moving_value == WHITE_MAN or moving_value == BLACK_MAN:
+			self.halfmove_clock = 0
+		else:
+			self.halfmove_clock += 1
+
+		return undo
+
+	def unmake_move(self, move, undo):
+		'''Take back a move made by make_move.'''
+
+		self.kernel.unmake_move(self.squares, move, undo)
+
+		from_square = move & 31
+		to_square = (move >> 5) & 31
+		captured_square = (move >> 10) - 1
+		moving_value = (undo & 7) - 2
+		new_value = ((undo >> 3) & 7) - 2
+
+		self.hash ^= ZOBRIST_TABLE[moving_value + 2][from_square] ^ ZOBRIST_TABLE[new_value + 2][to_square]
+		self.mirrored_hash ^= MIRRORED_ZOBRIST_TABLE[moving_value + 2][from_square] ^ MIRRORED_ZOBRIST_TABLE[new_value + 2][to_square]
+		self.remove_piece(new_value, to_square)
+		self.add_piece(moving_value, from_square)
+
+		if captured_square >= 0:
+			captured_value = ((undo >> 6) & 7) - 2
+			self.hash ^= ZOBRIST_TABLE[captured_value + 2][captured_square]
+			self.mirrored_hash ^= MIRRORED_ZOBRIST_TABLE[captured_value + 2][captured_square]
+			self.add_piece(captured_value, captured_square)
+
+			if captured_value > 0:
+				self.num_white_pieces += 1
+			else:
+				self.num_black_pieces += 1
+
+		self.halfmove_clock = self.halfmove_clock_history.pop()
+
+	def static_evaluation(self):
+		'''Static evaluation of the position from the incrementally updated terms; matches kernel evaluate. Positive for white.'''
+
+		if self.num_white_pieces == 0:
+			return -np.inf
+		elif self.num_black_pieces == 0:
+			return np.inf
+
+		if self.network is not None:
+			return self.network.evaluate_accumulator(self.accumulator)
+
+		evaluation = self.table_score / TABLE_SCORE_UNITS
+
+		if self.centroid_weight:
+			row_distance = self.white_row_sum / self.num_white_pieces - self.black_row_sum / self.num_black_pieces
+			col_distance = self.white_col_sum / self.num_white_pieces - self.black_col_sum / self.num_black_pieces
+			evaluation -= self.engine_player * self.centroid_weight * (row_distance ** 2 + col_distance ** 2) ** 0.5
+
+		return evaluation
+
+	def is_winner(self, piece_indicator):
+		'''Given a piece indicator (1 = white, -1 = black), determine if the player has won.'''
+
+		if piece_indicator == 1:
+			return self.num_black_pieces == 0
+
+		return self.num_white_pieces == 0
@@ -0,0 +1,182 @@
+# Will Kearney
+# search_trace.py
+#
+# Opt-in tracing of the tree minimax_AB explores, for working out offline why the AI played a move. A SearchTrace
+# attached to a game writes one fixed-width binary record per node searched to a file:
+#
+#   key         the node's 64-bit position key (see SearchBoard.get_key)
+#   ply         its distance from the root
+#   alpha, beta the window it was searched with
+#   score       the score it returned
+#   move_index  where the best move came in the order its moves were searched (0 = first), or -1 if no move was
+#               searched (a leaf, a draw, or a transposition table hit)
+#   cutoff      whether the score fell outside the window, i.e. a move refuted the node early
+#
+# Records are written as nodes return, so children come before their parent. They are buffered in a NumPy array and
+# written a block at a time, and once the file reaches its size cap further nodes are counted but dropped.
+# load_trace reads a file back as a structured array:
+#
+#   records = load_trace("trace.bin")
+#   first_move_cutoffs = (records["move_index"][records["cutoff"]] == 0).mean()
+#
+# Tracing works like profiling.py: attach() wraps minimax_AB on the one game being traced, so untraced games run the
+# plain method with no overhead at all. Only the process the game lives in is traced, not Lazy SMP helpers.
+#
+#   python main.py --trace trace.bin
+#   python -m checkers.search_trace trace.bin
+
+import argparse
+import numpy as np
+
+from .constants import *
+
+TRACE_MAGIC = b"CKTRACE1"
+
+TRACE_RECORD_DTYPE = np.dtype([
+	("key", "<u8"),
+	("ply", "u1"),
+	("alpha", "<f4"),
+	("beta", "<f4"),
+	("score", "<f4"),
+	("move_index", "i1"),
+	("cutoff", "?"),
+])
+
+class SearchTrace(object):
+	"""Class for streaming a record of every node minimax_AB searches to a binary file."""
+	def __init__(self, path, max_bytes=SEARCH_TRACE_MAX_BYTES, buffer_records=SEARCH_TRACE_BUFFER_RECORDS):
+		super(SearchTrace, self).__init__()
+
+		self.path = path
+		self.trace_file = open(path, "wb")
+		self.trace_file.write(TRACE_MAGIC)
+
+		self.max_records = max(0, (max_bytes - len(TRACE_MAGIC)) // TRACE_RECORD_DTYPE.itemsize)
+		self.buffer = np.zeros(buffer_records, dtype=TRACE_RECORD_DTYPE)
+		self.buffered = 0
+
+		self.records_written = 0
+		self.records_dropped = 0
+
+		# the traced game, and a stack with the scores returned so far by the children of each node being searched
+		self.game = None
+		self.child_scores = []
+
+	def attach(self, game):
+		'''Start tracing every minimax_AB call game makes.'''
+
+		self.game = game
+		search = game.minimax_AB
+
+		def traced_minimax_AB(position, depth, alpha, beta, player, static_eval_count, static_eval_limit):
+			key = position.get_key(player)
+
+			children = []
+			self.child_scores.append(children)
+			try:
+				score, move = search(position, depth, alpha, beta, player, static_eval_count, static_eval_limit)
+			finally:
+				self.child_scores.pop()
+
+			if self.child_scores:
+				self.child_scores[-1].append(score)
+
+			# the best move is the last child that returned the node's score (minimax_AB keeps the last of equal moves)
+			move_index = -1
+			cutoff = False
+			if move is not None and children:
+				move_index = len(children) - 1 - children[::-1].index(score)
+				cutoff = score >= beta if player == 1 else score <= alpha
+
+			self.record(key, static_eval_count, alpha, beta, score, move_index, cutoff)
+
+			return score, move
+
+		# recursive calls go through the instance attribute too, so every node is traced
+		game.minimax_AB = traced_minimax_AB
+
+	def detach(self):
+		'''Stop tracing, putting the game's own minimax_AB back.'''
+
+		if self.game is not None:
+			del self.game.minimax_AB
+			self.game = None
+
+	def record(self, key, ply, alpha, beta, score, move_index, cutoff):
+		'''Add one node's record, unless the file has reached its size cap.'''
+
+		if self.records_written + self.buffered >= self.max_records:
+			self.records_dropped += 1
+			return
+
+		self.buffer[self.buffered] = (key, ply, alpha, beta, score, move_index, cutoff)
+		self.buffered += 1
+
+		if self.buffered == len(self.buffer):
+			self.flush()
+
+	def flush(self):
+		'''Write the buffered records to the file.'''
+
+		self.trace_file.write(self.buffer[:self.buffered].tobytes())
+		self.trace_file.flush()
+
+		self.records_written += self.buffered
+		self.buffered = 0
+
+	def close(self):
+		'''Stop tracing and finish the file.'''
+
+		self.detach()
+
+		if not self.trace_file.closed:
+			self.flush()
+			self.trace_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def load_trace(path):
+	'''Read a trace file written by SearchTrace as a structured array with TRACE_RECORD_DTYPE fields.'''
+
+	with open(path, "rb") as trace_file:
+		if trace_file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+			raise ValueError("{} is not a search trace".format(path))
+
+		records = np.fromfile(trace_file, dtype=TRACE_RECORD_DTYPE)
+
+	return records
+
+def summarize_trace(records):
+	'''Returns a dict of pruning and move ordering statistics for a loaded trace.'''
+
+	searched = records["move_index"] >= 0
+	cutoffs = records["cutoff"] & searched
+	cutoff_indices = records["move_index"][cutoffs]
+
+	return {
+		"nodes": len(records),
+		"interior nodes": int(searched.sum()),
+		"cutoffs": int(cutoffs.sum()),
+		"cutoff rate": float(cutoffs.sum() / max(1, searched.sum())),
+		"first move cutoff rate": float((cutoff_indices == 0).mean()) if len(cutoff_indices) else 0.0,
+		"mean cutoff move index": float(cutoff_indices.mean()) if len(cutoff_indices) else 0.0,
+		"nodes per ply": np.bincount(records["ply"]).tolist(),
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="Summarize a search trace written with main.py --trace.")
+	parser.add_argument("trace", help="trace file")
+	args = parser.parse_args()
+
+	for name, value in summarize_trace(load_trace(args.trace)).items():
+		if isinstance(value, float):
+			value = "{:.3f}".format(value)
+
+		print("{:<24} {}".format(name, value))
+
+if __name__ == '__main__':
+	main()
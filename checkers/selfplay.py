@@ -0,0 +1,226 @@
+# Will Kearney
+# selfplay.py
+#
+# Lockstep batched self-play for generating training data. Instead of each game searching and evaluating one position at
+# a time, a batch of games advances together: every game writes the leaves of its search tree (full width, to a fixed
+# depth, see collect_leaves in kernel.py) into one shared NumPy array, the whole array is evaluated in a single call
+# (evaluate_batch for a profile, NeuralEvaluator.evaluate_batch for a network), and each game backs up its own slice of
+# the scores (back_up_leaves) and plays its move with CheckersGame.play_move. Per-call overhead in the evaluator is paid
+# once per batch rather than once per position, so positions per second rise with the batch size.
+#
+# The first few plies of each game are random, so games in a batch diverge. Every position a game reaches is recorded
+# with its searched score and, once the game ends, the result.
+#
+#   python -m checkers.selfplay selfplay.npz --games 512 --batch-size 256 --depth 2
+#   python -m checkers.selfplay selfplay.npz --games 64 --batch-size 1      (one game at a time, for comparison)
+
+import argparse
+import time
+import numpy as np
+
+from .game import CheckersGame
+from .evaluation import get_evaluation_profile, evaluate_batch
+from .network import get_network
+from .kernel import get_backend, MAX_MOVES
+from .notation import pack_board
+from .constants import *
+
+class SelfPlayGame(object):
+	"""Class for one game in a self-play batch, with the positions it has recorded."""
+	def __init__(self, game, seed):
+		super(SelfPlayGame, self).__init__()
+
+		self.game = game
+		self.generator = np.random.default_rng(seed)
+		self.plies = 0
+
+		# the packed position being searched, its moves, and where its leaves start in the current batch
+		self.squares = None
+		self.moves = None
+		self.leaf_start = 0
+
+		# (packed position, player to move, searched score) for every position reached
+		self.records = []
+
+	def is_over(self, max_plies):
+		'''Check whether the game has been won, drawn, or run past max_plies.'''
+
+		return self.game.winner is not None or self.game.is_draw or self.plies >= max_plies
+
+	def get_result(self):
+		'''Returns the result for white: 1 for a win, -1 for a loss, or 0 for a draw.'''
+
+		return self.game.winner or 0
+
+class PositionBatch(object):
+	"""Class for collecting leaf positions from many games into one array for evaluation."""
+	def __init__(self, capacity=SELFPLAY_BATCH_CAPACITY):
+		super(PositionBatch, self).__init__()
+
+		self.leaves = np.zeros((capacity, NUM_SQUARES), dtype=np.int8)
+		self.fixed_scores = np.zeros(capacity, dtype=np.float64) # NaN where the evaluator should score the position
+		self.engine_players = np.zeros(capacity, dtype=np.int8)
+		self.count = 0
+
+	def add_tree(self, kernel, squares, player, depth):
+		'''Add the leaves of a full-width search of depth plies from a packed position, growing the arrays as needed.
+		Returns the index of the first leaf.'''
+
+		start = self.count
+
+		while True:
+			count = kernel.collect_leaves(squares, player, depth, self.leaves, self.fixed_scores, start)
+			if count >= 0:
+				break
+
+			# out of room: double the arrays and collect this tree again
+			self.leaves = np.concatenate([self.leaves, np.zeros_like(self.leaves)])
+			self.fixed_scores = np.concatenate([self.fixed_scores, np.zeros_like(self.fixed_scores)])
+			self.engine_players = np.concatenate([self.engine_players, np.zeros_like(self.engine_players)])
+
+		self.engine_players[start:count] = player
+		self.count = count
+
+		return start
+
+	def evaluate(self, profile, network=None):
+		'''Evaluate every position in the batch at once. Returns an array of scores, positive for white.'''
+
+		positions = self.leaves[:self.count]
+
+		if network is not None:
+			scores = network.evaluate_batch(positions)
+
+			# the network doesn't know that a side with no pieces has lost
+			scores[~(positions > 0).any(axis=1)] = -np.inf
+			scores[~(positions < 0).any(axis=1)] = np.inf
+		else:
+			scores = evaluate_batch(positions, profile, self.engine_players[:self.count])
+
+		fixed_scores = self.fixed_scores[:self.count]
+
+		return np.where(np.isnan(fixed_scores), scores, fixed_scores)
+
+def play_batch(num_games, depth, profile, network=None, random_plies=6, max_plies=200, backend="auto", seed=0):
+	'''Play num_games self-play games in lockstep. Returns (list of SelfPlayGame, positions evaluated).'''
+
+	games = []
+	for index in range(num_games):
+		game = CheckersGame(backend=backend)
+		game.solver_piece_threshold = None
+		games.append(SelfPlayGame(game, seed + index))
+
+	batch = PositionBatch()
+	child_scores = np.zeros(MAX_MOVES, dtype=np.float64)
+	positions_evaluated = 0
+
+	while True:
+		active_games = []
+		for selfplay_game in games:
+			if selfplay_game.is_over(max_plies):
+				continue
+
+			game = selfplay_game.game
+			selfplay_game.squares = pack_board(game.board)
+			selfplay_game.moves = game.kernel.generate_moves(selfplay_game.squares, game.current_player).tolist()
+
+			if not selfplay_game.moves:
+				# a player who can't move loses
+				game.winner = -game.current_player
+				continue
+
+			active_games.append(selfplay_game)
+
+		if not active_games:
+			break
+
+		# every game adds the leaves of its search to the shared batch...
+		batch.count = 0
+		for selfplay_game in active_games:
+			selfplay_game.leaf_start = batch.add_tree(selfplay_game.game.kernel, selfplay_game.squares, selfplay_game.game.current_player, depth)
+
+		# ...which is evaluated in one call...
+		scores = batch.evaluate(profile, network)
+		positions_evaluated += batch.count
+
+		# ...and each game backs up its own leaves and plays its move
+		for selfplay_game in active_games:
+			game = selfplay_game.game
+			player = game.current_player
+			num_moves = len(selfplay_game.moves)
+
+			game.kernel.back_up_leaves(selfplay_game.squares, player, depth, scores, selfplay_game.leaf_start, child_scores)
+			move_scores = child_scores[:num_moves] * player
+
+			# the best move, with ties broken at random; the first few plies are random outright
+			best_moves = np.flatnonzero(move_scores == move_scores.max())
+			if selfplay_game.plies < random_plies:
+				best_moves = np.arange(num_moves)
+
+			selfplay_game.records.append((selfplay_game.squares, player, move_scores.max() * player))
+
+			game.play_move(selfplay_game.moves[best_moves[selfplay_game.generator.integers(len(best_moves))]])
+			selfplay_game.plies += 1
+
+	return games, positions_evaluated
+
+def play_selfplay_games(num_games, batch_size, depth, profile_name=DEFAULT_EVALUATION_PROFILE, network_path=None, random_plies=6, max_plies=200, backend="auto", seed=0, report=print):
+	'''Play num_games games, batch_size at a time. Returns a dict of arrays: positions, players, scores (from the
+	search, positive for white) and results (the result of each position's game, for white).'''
+
+	profile = get_evaluation_profile(profile_name)
+	network = get_network(network_path) if network_path else None
+
+	positions = []
+	players = []
+	scores = []
+	results = []
+
+	# warm the backend up first, so compiling it doesn't count against positions per second
+	get_backend(backend)
+
+	start_time = time.perf_counter()
+	positions_evaluated = 0
+
+	for start in range(0, num_games, batch_size):
+		games, batch_positions = play_batch(min(batch_size, num_games - start), depth, profile, network, random_plies, max_plies, backend, seed + start)
+		positions_evaluated += batch_positions
+
+		for selfplay_game in games:
+			for squares, player, score in selfplay_game.records:
+				positions.append(squares)
+				players.append(player)
+				scores.append(score)
+				results.append(selfplay_game.get_result())
+
+		elapsed = time.perf_counter() - start_time
+		report("{} games, {} positions recorded, {:.0f} positions evaluated/s".format(start + len(games), len(positions), positions_evaluated / elapsed))
+
+	return {
+		"positions": np.array(positions, dtype=np.int8).reshape(-1, NUM_SQUARES),
+		"players": np.array(players, dtype=np.int8),
+		"scores": np.array(scores, dtype=np.float32),
+		"results": np.array(results, dtype=np.int8),
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="Generate training data from batched self-play.")
+	parser.add_argument("output", help="output .npz file")
+	parser.add_argument("--games", type=int, default=256, help="number of games")
+	parser.add_argument("--batch-size", type=int, default=256, help="games played in lockstep")
+	parser.add_argument("--depth", type=int, default=2, help="full-width search depth per move")
+	parser.add_argument("--profile", default=DEFAULT_EVALUATION_PROFILE, choices=sorted(EVALUATION_PROFILES), help="evaluation profile")
+	parser.add_argument("--network", default=None, help="evaluate with a network weights file instead (see network.py)")
+	parser.add_argument("--random-plies", type=int, default=6, help="random plies at the start of each game")
+	parser.add_argument("--max-plies", type=int, default=200, help="plies after which a game is adjudicated a draw")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation backend")
+	args = parser.parse_args()
+
+	data = play_selfplay_games(args.games, args.batch_size, args.depth, args.profile, args.network, args.random_plies, args.max_plies, args.backend, args.seed)
+
+	np.savez_compressed(args.output, **data)
+	print("saved {} positions to {}".format(len(data["positions"]), args.output))
+
+if __name__ == '__main__':
+	main()
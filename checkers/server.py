@@ -0,0 +1,524 @@
+# Will Kearney
+# server.py
+#
+# An asyncio engine server that hosts many checkers games at once, over TCP or stdin/stdout.
+#
+# Each line is one command, and every reply starts with the game id it refers to:
+#
+#   new <game>                                      -> ok <game>
+#   position <game> startpos|fen <FEN> [moves ...]  -> ok <game>
+#   move <game> <move>                              -> ok <game>
+#   level <game> easy|medium|hard                   -> ok <game>
+#   aggressive <game> on|off                        -> ok <game>
+#   fen <game>                                      -> fen <game> <FEN>
+#   go <game> [depth N] [movetime MS] [nodes N]     -> info <game> depth D score S nodes N pv MOVE... (once per depth)
+#                                                      bestmove <game> MOVE|none
+#   stop <game>                                     -> (the search ends at once and sends bestmove)
+#   quit                                            -> closes the connection
+#
+# Moves are written in PDN notation (e.g. 11-15 or 8x11). Errors are reported as "error <game> <reason>". Every go ends
+# with exactly one bestmove or error line.
+#
+# The server keeps only a FEN string, the draw clock, the position keys since the last capture or man move and a few
+# settings per game, and only for the most recently used games: once there are more than max_hot_games, the least
+# recently used idle ones are written to a SnapshotStore as compact snapshots (see snapshot.py) and read back the next
+# time a command names them. So memory depends on how many games are active, not how many are hosted.
+#
+# Each go is one task in a bounded process pool, which deepens iteratively by itself on one transposition table. It
+# sends an info tuple through a manager queue as each depth finishes, and polls a SharedFlag (see shared_table.py) at
+# every node, which the server sets on stop or once the search has run for search_timeout seconds. A search keeps its
+# pool slot until its worker has really finished, so the slots always match the work in the pool.
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from .game import CheckersGame
+from .kernel import get_backend
+from .notation import board_from_fen, board_to_fen, parse_pdn_moves, move_to_pdn, pack_board, unpack_board
+from .snapshot import SnapshotStore, pack_snapshot, unpack_snapshot
+from .shared_table import SharedFlag
+from .constants import *
+
+START_FEN = "B:W21-32:B1-12"
+
+DEFAULT_PORT = 8765
+MAX_GAMES_PER_CONNECTION = 1000
+MAX_HOT_GAMES = 1024
+
+# how often a running search's info queue is checked, in seconds
+INFO_POLL_INTERVAL = 0.01
+
+def format_move(move):
+	'''Format a (from_location, to_location) move in PDN notation, or "none" if there is no move.'''
+
+	if move is None:
+		return "none"
+
+	return move_to_pdn(*move)
+
+def get_position_key(board, player):
+	'''Returns the 64-bit key for a board and player to move, as CheckersGame.get_position_key does.'''
+
+	if player == 1:
+		return board.hash ^ ZOBRIST_WHITE_TO_MOVE
+
+	return board.hash
+
+def search_position(fen, halfmove_clock, history, depth, difficulty_level, aggressive, node_limit, time_limit, stop_flag_name, info_queue, backend):
+	'''Iteratively deepen a search of a FEN position, with the draw clock and the keys of the positions before it.
+	Puts (depth, evaluation, nodes searched, principal variation) on info_queue as each depth finishes, and stops at the
+	next node once the stop flag is set. Returns the best move. This runs inside a worker process.'''
+
+	board, player = board_from_fen(fen)
+	board.halfmove_clock = halfmove_clock
+
+	game = CheckersGame(backend=backend)
+	game.difficulty_level = difficulty_level
+	game.aggressive_AI = aggressive
+	game.set_position(board, player)
+	game.position_history.update(history)
+
+	def send_info(current_depth, evaluation, nodes, move):
+		info_queue.put((current_depth, evaluation, nodes, game.principal_variation or [move]))
+
+	game.stop_event = SharedFlag(stop_flag_name)
+	try:
+		_, move, _, _ = game.search(player, depth, node_limit=node_limit, time_limit=time_limit, info_callback=send_info)
+	finally:
+		game.stop_event.close()
+
+	return move
+
+def apply_move(board, player, move_text):
+	'''Apply a PDN move for player to a Board in place, checking that it is legal (including forced captures).'''
+
+	moves = parse_pdn_moves(move_text)
+	if len(moves) != 1:
+		raise ValueError("expected a single move")
+
+	from_location, to_location = moves[0]
+	legal_moves = [(legal_from, legal_to) for legal_from, legal_to, _ in board.get_legal_moves(player)]
+	if (from_location, to_location) not in legal_moves:
+		raise ValueError("illegal move {}".format(move_text))
+
+	board.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+
+class GameState(object):
+	"""The small amount of state the server keeps for each hosted game."""
+	__slots__ = ("fen", "halfmove_clock", "history", "difficulty_level", "aggressive", "search_task", "stop_flag")
+
+	def __init__(self):
+		super(GameState, self).__init__()
+
+		self.fen = START_FEN
+		self.halfmove_clock = 0
+		self.history = () # keys of the positions since the last capture or man move, not counting the current one
+		self.difficulty_level = "Easy"
+		self.aggressive = False
+		self.search_task = None
+		self.stop_flag = None # a SharedFlag while a search is running
+
+	def set_fen(self, fen):
+		'''Start again from a FEN position, with no history.'''
+
+		self.fen = fen
+		self.halfmove_clock = 0
+		self.history = ()
+
+	def play_move(self, move_text):
+		'''Play a PDN move, raising ValueError if it isn't legal.'''
+
+		board, player = board_from_fen(self.fen)
+		board.halfmove_clock = self.halfmove_clock
+		history = self.history + (get_position_key(board, player),)
+
+		apply_move(board, player, move_text)
+
+		# nothing from before a capture or man move can repeat
+		if board.halfmove_clock == 0:
+			history = ()
+
+		self.fen = board_to_fen(board, player * -1)
+		self.halfmove_clock = board.halfmove_clock
+		self.history = history
+
+	def is_busy(self):
+		return self.search_task is not None and not self.search_task.done()
+
+	def get_snapshot(self):
+		'''Returns compact snapshot bytes for this game (see snapshot.py).'''
+
+		board, player = board_from_fen(self.fen)
+
+		return pack_snapshot(pack_board(board), player, self.history, self.difficulty_level, self.aggressive, self.halfmove_clock)
+
+	def restore_snapshot(self, snapshot):
+		'''Load the state from snapshot bytes made by get_snapshot.'''
+
+		squares, player, history, self.difficulty_level, self.aggressive, self.halfmove_clock = unpack_snapshot(snapshot)
+
+		self.fen = board_to_fen(unpack_board(squares), player)
+		self.history = tuple(history)
+
+class EngineServer(object):
+	"""Class for serving many games over a line protocol, with searches run in a shared process pool."""
+	def __init__(self, workers=None, max_pending=None, search_timeout=60.0, backend="auto", max_hot_games=MAX_HOT_GAMES, store_path=None):
+		super(EngineServer, self).__init__()
+
+		self.workers = workers or os.cpu_count() or 1
+		self.backend = backend
+
+		# workers build the kernel backend as they start, so Numba's compile time isn't charged to the first search
+		self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=get_backend, initargs=(backend,))
+
+		# only this many search tasks can be queued or running at once; asyncio semaphores wake waiters in FIFO order,
+		# which gives every game a fair turn at the pool
+		self.max_pending = max_pending or self.workers * 4
+		self.pool_slots = asyncio.Semaphore(self.workers)
+		self.pending_searches = 0
+
+		# a search that runs longer than this is stopped, as if the client had sent stop
+		self.search_timeout = search_timeout
+
+		# searches send their info lines back through queues from this manager
+		self.manager = multiprocessing.Manager()
+
+		# the most recently used games by (connection id, game id), least recent first; the rest wait in game_store
+		self.max_hot_games = max_hot_games
+		self.hot_games = collections.OrderedDict()
+		self.game_store = SnapshotStore(store_path)
+		self.next_connection_id = 0
+
+	async def serve_tcp(self, host, port):
+		'''Listen for TCP connections until cancelled.'''
+
+		server = await asyncio.start_server(self.handle_connection, host, port)
+		async with server:
+			await server.serve_forever()
+
+	async def serve_stdio(self):
+		'''Serve a single session over stdin/stdout.'''
+
+		loop = asyncio.get_running_loop()
+
+		reader = asyncio.StreamReader()
+		await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+		await self.handle_connection(reader, StdoutWriter())
+
+	async def handle_connection(self, reader, writer):
+		'''Read commands from one client until it disconnects. Games are private to the connection.'''
+
+		connection_id = self.next_connection_id
+		self.next_connection_id += 1
+		game_ids = set()
+
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+
+				tokens = line.decode("utf-8", "replace").split()
+				if not tokens:
+					continue
+
+				if tokens[0] == "quit":
+					break
+
+				await self.handle_command(tokens, connection_id, game_ids, writer)
+		finally:
+			for game_id in game_ids:
+				game = self.hot_games.pop((connection_id, game_id), None)
+				if game is not None and game.search_task:
+					game.search_task.cancel()
+
+				self.game_store.discard(self.get_store_key(connection_id, game_id))
+
+			writer.close()
+
+	def get_store_key(self, connection_id, game_id):
+		return "{} {}".format(connection_id, game_id)
+
+	def add_game(self, connection_id, game_id, game):
+		'''Make a game hot, then send the least recently used idle games to the store if there are too many.'''
+
+		self.hot_games[(connection_id, game_id)] = game
+		self.hot_games.move_to_end((connection_id, game_id))
+
+		if len(self.hot_games) <= self.max_hot_games:
+			return
+
+		for key in list(self.hot_games):
+			if len(self.hot_games) <= self.max_hot_games:
+				break
+
+			idle_game = self.hot_games[key]
+			if idle_game.is_busy() or idle_game is game:
+				# a game being searched has to stay in memory
+				continue
+
+			del self.hot_games[key]
+			self.game_store.put(self.get_store_key(*key), idle_game.get_snapshot())
+
+	def get_game(self, connection_id, game_id):
+		'''Returns a game's state, restoring it from the store if it was evicted, and marks it as recently used.'''
+
+		game = self.hot_games.get((connection_id, game_id))
+
+		if game is None:
+			snapshot = self.game_store.take(self.get_store_key(connection_id, game_id))
+			if snapshot is None:
+				return None
+
+			game = GameState()
+			game.restore_snapshot(snapshot)
+
+		self.add_game(connection_id, game_id, game)
+
+		return game
+
+	async def send(self, writer, line):
+		'''Write a reply line; drain() applies backpressure when the client reads slowly.'''
+
+		writer.write((line + "\n").encode("utf-8"))
+		await writer.drain()
+
+	async def handle_command(self, tokens, connection_id, game_ids, writer):
+		'''Handle a single command line.'''
+
+		command = tokens[0]
+
+		if len(tokens) < 2:
+			await self.send(writer, "error - missing game id")
+			return
+
+		game_id = tokens[1]
+		arguments = tokens[2:]
+
+		if command == "new":
+			if game_id not in game_ids and len(game_ids) >= MAX_GAMES_PER_CONNECTION:
+				await self.send(writer, "error {} too many games".format(game_id))
+				return
+
+			old_game = self.hot_games.get((connection_id, game_id))
+			if old_game is not None and old_game.search_task:
+				old_game.search_task.cancel()
+
+			game_ids.add(game_id)
+			self.game_store.discard(self.get_store_key(connection_id, game_id))
+			self.add_game(connection_id, game_id, GameState())
+			await self.send(writer, "ok {}".format(game_id))
+			return
+
+		game = self.get_game(connection_id, game_id) if game_id in game_ids else None
+		if game is None:
+			await self.send(writer, "error {} unknown game".format(game_id))
+			return
+
+		if command == "stop":
+			if game.stop_flag is not None:
+				game.stop_flag.set()
+			return
+
+		if command == "fen":
+			await self.send(writer, "fen {} {}".format(game_id, game.fen))
+			return
+
+		if game.search_task and not game.search_task.done():
+			await self.send(writer, "error {} search in progress".format(game_id))
+			return
+
+		try:
+			if command == "position":
+				position = self.parse_position(arguments)
+				game.fen, game.halfmove_clock, game.history = position.fen, position.halfmove_clock, position.history
+			elif command == "move":
+				if len(arguments) != 1:
+					raise ValueError("expected a single move")
+				game.play_move(arguments[0])
+			elif command == "level":
+				if arguments[0].capitalize() not in AI_SETTINGS:
+					raise ValueError("unknown level {}".format(arguments[0]))
+				game.difficulty_level = arguments[0].capitalize()
+			elif command == "aggressive":
+				game.aggressive = arguments[0] == "on"
+			elif command == "go":
+				self.start_search(game_id, game, arguments, writer)
+				return
+			else:
+				raise ValueError("unknown command {}".format(command))
+		except (ValueError, IndexError) as error:
+			await self.send(writer, "error {} {}".format(game_id, error))
+			return
+
+		await self.send(writer, "ok {}".format(game_id))
+
+	def parse_position(self, arguments):
+		'''Parse the arguments of a position command into a new GameState.'''
+
+		if "moves" in arguments:
+			split = arguments.index("moves")
+			arguments, moves = arguments[:split], arguments[split + 1:]
+		else:
+			moves = []
+
+		if arguments[0] == "startpos":
+			fen = START_FEN
+		elif arguments[0] == "fen":
+			fen = board_to_fen(*board_from_fen(" ".join(arguments[1:])))
+		else:
+			raise ValueError("expected startpos or fen")
+
+		position = GameState()
+		position.set_fen(fen)
+
+		for move_text in moves:
+			position.play_move(move_text)
+
+		return position
+
+	def start_search(self, game_id, game, arguments, writer):
+		'''Parse the go arguments and start the search as a background task.'''
+
+		settings = dict(zip(arguments[0::2], arguments[1::2]))
+
+		depth = int(settings.get("depth", 0))
+		node_limit = int(settings["nodes"]) if "nodes" in settings else None
+		time_limit = int(settings["movetime"]) / 1000 if "movetime" in settings else None
+
+		if not depth:
+			# with a budget, keep deepening until it runs out; otherwise use the difficulty level's depth
+			depth = MAX_SEARCH_DEPTH if (node_limit or time_limit) else AI_SETTINGS[game.difficulty_level][0]
+
+		game.stop_flag = SharedFlag()
+		game.search_task = asyncio.ensure_future(self.run_search(game_id, game, depth, node_limit, time_limit, writer))
+
+	async def run_search(self, game_id, game, depth, node_limit, time_limit, writer):
+		'''Run a go as one pool task, streaming its info lines as depths finish. Always ends with a bestmove or error line.'''
+
+		loop = asyncio.get_running_loop()
+		deadline = time.perf_counter() + time_limit if time_limit else None
+		stop_flag = game.stop_flag
+
+		try:
+			if self.pending_searches >= self.max_pending:
+				await self.send(writer, "error {} busy".format(game_id))
+				return
+
+			self.pending_searches += 1
+			try:
+				async with self.pool_slots:
+					best_move = None
+
+					# the time spent waiting for a slot counts against movetime
+					remaining_time = deadline - time.perf_counter() if deadline else None
+					if remaining_time is None or remaining_time > 0:
+						info_queue = self.manager.Queue()
+						future = loop.run_in_executor(self.pool, search_position, game.fen, game.halfmove_clock, game.history, depth, game.difficulty_level, game.aggressive, node_limit, remaining_time, stop_flag.name, info_queue, self.backend)
+
+						try:
+							best_move = await self.wait_for_search(game_id, future, stop_flag, info_queue, writer)
+						except asyncio.CancelledError:
+							# the connection closed: stop the worker, but keep the slot (and the flag) until it has
+							# really finished
+							stop_flag.set()
+							await asyncio.wait([future])
+							raise
+			finally:
+				self.pending_searches -= 1
+
+			await self.send(writer, "bestmove {} {}".format(game_id, format_move(best_move)))
+		except asyncio.CancelledError:
+			# the connection closed; a worker that was started has already been stopped and waited for above
+			stop_flag.set()
+			raise
+		except Exception as error:
+			await self.send(writer, "error {} search failed: {}".format(game_id, repr(error)))
+		finally:
+			game.stop_flag = None
+			stop_flag.close()
+
+	async def wait_for_search(self, game_id, future, stop_flag, info_queue, writer):
+		'''Send info lines from a running search until its worker finishes, stopping it if it runs past search_timeout.
+		Returns the best move, or raises whatever the worker raised.'''
+
+		timeout_time = time.perf_counter() + self.search_timeout
+
+		while True:
+			# check first, so every info line the worker sent before it finished is still sent below
+			done = future.done()
+
+			while True:
+				try:
+					current_depth, evaluation, nodes, principal_variation = info_queue.get_nowait()
+				except queue.Empty:
+					break
+
+				pv_text = " ".join(format_move(pv_move) for pv_move in principal_variation)
+				await self.send(writer, "info {} depth {} score {} nodes {} pv {}".format(game_id, current_depth, evaluation, nodes, pv_text))
+
+			if done:
+				return future.result()
+
+			if time.perf_counter() >= timeout_time:
+				stop_flag.set()
+
+			await asyncio.sleep(INFO_POLL_INTERVAL)
+
+	def close(self):
+		'''Shut down the worker pool and the queue manager, and close the game store.'''
+
+		self.pool.shutdown(cancel_futures=True)
+		self.manager.shutdown()
+		self.game_store.close()
+
+class StdoutWriter(object):
+	"""Minimal stand-in for asyncio.StreamWriter that writes to stdout, used by the stdin/stdout mode."""
+
+	def write(self, data):
+		sys.stdout.buffer.write(data)
+
+	async def drain(self):
+		sys.stdout.flush()
+
+	def close(self):
+		sys.stdout.flush()
+
+def main():
+	parser = argparse.ArgumentParser(description="Serve checkers games over a simple line protocol.")
+	parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+	parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+	parser.add_argument("--stdio", action="store_true", help="serve a single session over stdin/stdout instead of TCP")
+	parser.add_argument("--workers", type=int, default=None, help="number of search processes (default: one per core)")
+	parser.add_argument("--max-pending", type=int, default=None, help="maximum queued searches before clients are told the server is busy")
+	parser.add_argument("--search-timeout", type=float, default=60.0, help="seconds before a search is stopped")
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation and evaluation backend")
+	parser.add_argument("--hot-games", type=int, default=MAX_HOT_GAMES, help="games kept in memory before idle ones are moved to the game store")
+	parser.add_argument("--game-store", default=None, help="SQLite file for idle games (default: a temporary file)")
+	args = parser.parse_args()
+
+	async def run():
+		server = EngineServer(workers=args.workers, max_pending=args.max_pending, search_timeout=args.search_timeout, backend=args.backend, max_hot_games=args.hot_games, store_path=args.game_store)
+		try:
+			if args.stdio:
+				await server.serve_stdio()
+			else:
+				await server.serve_tcp(args.host, args.port)
+		finally:
+			server.close()
+
+	try:
+		asyncio.run(run())
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,148 @@
+# Will Kearney
+# shared_table.py
+#
+# Defines the SharedTranspositionTable class, a transposition table in multiprocessing.shared_memory that the processes
+# of a Lazy SMP search (see CheckersGame.search_lazy_smp) all read and write at once.
+#
+# Each entry is three 64-bit words: a check word, the score's bits, and an info word packing the depth, bound and best
+# move. There are no locks, so a reader can see an entry half way through another process's write; the check word is
+# the key XORed with the other two words, so a torn entry (or one for another position) fails the check and reads as a
+# miss. Entries come back as the same (key, depth, score, bound, best move) tuples the list table in CheckersGame
+# holds, so minimax_AB searches either one the same way.
+#
+# The first word of the block is a stop flag: the main search raises it when it finishes, and helpers searching from
+# the same table give up at their next node. SharedFlag is the same kind of flag on its own, for stopping a search in
+# another process (see server.py); CheckersGame polls either through its stop_event.
+
+import struct
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+
+from .constants import *
+
+ENTRY_WORDS = 3
+HEADER_WORDS = 1
+
+# info word layout: depth in the low byte, then the bound, then the best move plus one (0 for no move)
+INFO_BOUND_SHIFT = 8
+INFO_MOVE_SHIFT = 10
+
+# worker process globals: tables attached so far, by shared memory name
+_attached_tables = {}
+
+class SharedTranspositionTable(object):
+	"""Class for a lockless transposition table in shared memory, indexed like the list table in CheckersGame."""
+	def __init__(self, size=TRANSPOSITION_TABLE_SIZE, name=None):
+		super(SharedTranspositionTable, self).__init__()
+
+		self.size = size
+		self.is_owner = name is None
+		nbytes = (HEADER_WORDS + size * ENTRY_WORDS) * 8
+
+		if self.is_owner:
+			self.shared_memory = shared_memory.SharedMemory(create=True, size=nbytes)
+			self.shared_memory.buf[:nbytes] = bytes(nbytes)
+
+			# the block outlives any one search, so it goes away with this object (or at exit)
+			weakref.finalize(self, self.shared_memory.unlink)
+		else:
+			self.shared_memory = shared_memory.SharedMemory(name=name)
+
+		self.name = self.shared_memory.name
+		self.header = np.ndarray(HEADER_WORDS, dtype=np.uint64, buffer=self.shared_memory.buf)
+		self.words = np.ndarray((size, ENTRY_WORDS), dtype=np.uint64, buffer=self.shared_memory.buf, offset=HEADER_WORDS * 8)
+
+		# the (evaluator, engine player, static evaluation limit, draw plies) settings the entries were stored with;
+		# only kept in the process that owns the table
+		self.settings = None
+
+	def __len__(self):
+		return self.size
+
+	def __getitem__(self, index):
+		'''Returns the (key, depth, score, bound, best move) entry at index, or None if it is empty or fails its check.'''
+
+		check, score_bits, info = self.words[index].tolist()
+
+		if info == 0:
+			return None
+
+		depth = info & 0xFF
+		bound = (info >> INFO_BOUND_SHIFT) & 0x3
+		move = (info >> INFO_MOVE_SHIFT) - 1
+		score = struct.unpack("<d", struct.pack("<Q", score_bits))[0]
+
+		return (check ^ score_bits ^ info, depth, score, bound, move if move >= 0 else None)
+
+	def __setitem__(self, index, entry):
+		'''Store a (key, depth, score, bound, best move) entry at index.'''
+
+		key, depth, score, bound, move = entry
+
+		score_bits = struct.unpack("<Q", struct.pack("<d", score))[0]
+		info = depth | bound << INFO_BOUND_SHIFT | (move + 1 if move is not None else 0) << INFO_MOVE_SHIFT
+
+		self.words[index] = (key ^ score_bits ^ info, score_bits, info)
+
+	def clear(self):
+		'''Empty every entry.'''
+
+		self.words[:] = 0
+
+	def request_stop(self):
+		'''Tell every search using this table to stop.'''
+
+		self.header[0] = 1
+
+	def clear_stop(self):
+		self.header[0] = 0
+
+	def is_stop_requested(self):
+		return self.header[0] != 0
+
+class SharedFlag(object):
+	"""Class for a flag in shared memory that one process sets and others poll, like a threading.Event."""
+	def __init__(self, name=None):
+		super(SharedFlag, self).__init__()
+
+		self.is_owner = name is None
+
+		if self.is_owner:
+			self.shared_memory = shared_memory.SharedMemory(create=True, size=8)
+			self.shared_memory.buf[:8] = bytes(8)
+		else:
+			self.shared_memory = shared_memory.SharedMemory(name=name)
+
+		self.name = self.shared_memory.name
+		self.value = np.ndarray(1, dtype=np.uint64, buffer=self.shared_memory.buf)
+
+	def set(self):
+		self.value[0] = 1
+
+	def clear(self):
+		self.value[0] = 0
+
+	def is_set(self):
+		return self.value[0] != 0
+
+	def close(self):
+		'''Detach from the flag, removing it if this process made it.'''
+
+		# the view has to go before the block can be closed
+		del self.value
+		self.shared_memory.close()
+
+		if self.is_owner:
+			self.shared_memory.unlink()
+
+def attach_shared_table(name, size):
+	'''Returns the shared table with this name, attaching to it the first time a process asks for it.'''
+
+	table = _attached_tables.get(name)
+
+	if table is None:
+		table = SharedTranspositionTable(size, name)
+		_attached_tables[name] = table
+
+	return table
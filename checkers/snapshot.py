@@ -0,0 +1,237 @@
+# Will Kearney
+# snapshot.py
+#
+# Compact snapshots of a game's state, so idle games can wait on disk instead of in memory (see server.py).
+#
+# A snapshot is a 16 byte header followed by the history:
+#
+#   version              1 byte
+#   white, black, kings  three 32-bit masks of the dark squares (bit i is square index i, see notation.py)
+#   flags                1 byte: white to move, aggressive, and the difficulty level (its index in AI_SETTINGS)
+#   halfmove clock       1 byte
+#   history length       1 byte
+#   history              7 bits per move since the last capture or man move, packed little-endian
+#
+# Positions from before a capture or man move can never come up again, so that is all the history draw detection needs
+# (CheckersGame only keeps that much too). Every move since then is a king stepping to a neighbouring square, so rather
+# than the 8-byte position keys, a snapshot stores each move as its from square and direction, and unpack_snapshot gets
+# the keys back by taking the moves back one at a time from the current position. At most SNAPSHOT_MAX_HISTORY moves
+# are kept (the no-progress rule ends a game before there are more), so a snapshot is never more than 86 bytes, and
+# usually just the 16 byte header.
+#
+# SnapshotStore keeps snapshots in an SQLite file, keyed by a game id string.
+
+import os
+import struct
+import sqlite3
+import tempfile
+import numpy as np
+
+from .notation import pack_board, unpack_board, position_key
+from .constants import *
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<B3IBBB")
+SNAPSHOT_MAX_HISTORY = DRAW_PLIES
+
+FLAG_WHITE_TO_MOVE = 1
+FLAG_AGGRESSIVE = 2
+FLAG_LEVEL_SHIFT = 2
+
+DIFFICULTY_LEVELS = list(AI_SETTINGS)
+
+# a history move is its from square plus the direction of its to square
+MOVE_BITS = 7
+MOVE_DIRECTION_SHIFT = 5
+DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+# [square][direction] -> the neighbouring square that way, or -1 off the board
+NEIGHBOR_SQUARES = [[LOCATION_SQUARES.get((row + row_step, col + col_step), -1) for row_step, col_step in DIRECTIONS] for row, col in SQUARE_LOCATIONS]
+
+def find_history_move(squares, player, key):
+	'''Find the king step by player that leads to squares from the position with this key (player to move). Returns
+	(from square, direction), or None if there isn't one.'''
+
+	current_key = position_key(squares, player)
+
+	for to_square, value in enumerate(squares.tolist()):
+		if value != 2 * player:
+			continue
+
+		for direction in range(len(DIRECTIONS)):
+			# to_square is the from square's neighbour in direction exactly when the from square is to_square's
+			# neighbour in the opposite one (3 - direction)
+			from_square = NEIGHBOR_SQUARES[to_square][3 - direction]
+			if from_square < 0 or squares[from_square] != EMPTY:
+				continue
+
+			if current_key ^ ZOBRIST_TABLE[value + 2][to_square] ^ ZOBRIST_TABLE[value + 2][from_square] == key:
+				return from_square, direction
+
+	return None
+
+def pack_history(squares, player, history):
+	'''Encode the history keys (oldest first, not counting the current position) as the king moves between them,
+	keeping the last SNAPSHOT_MAX_HISTORY. Returns (number of moves, packed bytes).'''
+
+	history = list(history)[-SNAPSHOT_MAX_HISTORY:]
+	squares = np.array(squares, dtype=np.int8)
+
+	codes = []
+	mover = -player
+	for key in reversed(history):
+		move = find_history_move(squares, mover, key)
+		if move is None:
+			raise ValueError("history isn't a line of king moves leading to this position")
+
+		from_square, direction = move
+		to_square = NEIGHBOR_SQUARES[from_square][direction]
+		squares[from_square], squares[to_square] = squares[to_square], EMPTY
+
+		codes.append(from_square | direction << MOVE_DIRECTION_SHIFT)
+		mover = -mover
+
+	codes.reverse()
+	packed = sum(code << (MOVE_BITS * index) for index, code in enumerate(codes))
+
+	return len(codes), packed.to_bytes((MOVE_BITS * len(codes) + 7) // 8, "little")
+
+def unpack_history(squares, player, num_moves, data):
+	'''Decode history moves back into position keys, oldest first, by taking them back from the current position.'''
+
+	packed = int.from_bytes(data, "little")
+	codes = [(packed >> (MOVE_BITS * index)) & ((1 << MOVE_BITS) - 1) for index in range(num_moves)]
+
+	squares = np.array(squares, dtype=np.int8)
+
+	history = []
+	mover = -player
+	for code in reversed(codes):
+		from_square = code & ((1 << MOVE_DIRECTION_SHIFT) - 1)
+		to_square = NEIGHBOR_SQUARES[from_square][code >> MOVE_DIRECTION_SHIFT]
+		squares[from_square], squares[to_square] = squares[to_square], EMPTY
+
+		history.append(position_key(squares, mover))
+		mover = -mover
+
+	history.reverse()
+
+	return history
+
+def pack_snapshot(squares, player, history, difficulty_level, aggressive, halfmove_clock):
+	'''Pack a game's state into snapshot bytes. squares is a packed position (see pack_board) and history holds the
+	keys of the earlier positions since the last capture or man move, in the order they came up.'''
+
+	white = black = kings = 0
+	for square, value in enumerate(np.asarray(squares).tolist()):
+		if value > 0:
+			white |= 1 << square
+		elif value < 0:
+			black |= 1 << square
+
+		if abs(value) == 2:
+			kings |= 1 << square
+
+	flags = DIFFICULTY_LEVELS.index(difficulty_level) << FLAG_LEVEL_SHIFT
+	if player == 1:
+		flags |= FLAG_WHITE_TO_MOVE
+	if aggressive:
+		flags |= FLAG_AGGRESSIVE
+
+	num_moves, history_data = pack_history(squares, player, history)
+	header = SNAPSHOT_HEADER.pack(SNAPSHOT_VERSION, white, black, kings, flags, min(halfmove_clock, 255), num_moves)
+
+	return header + history_data
+
+def unpack_snapshot(data):
+	'''Unpack snapshot bytes. Returns (squares, player, history, difficulty level, aggressive, halfmove clock), with
+	history as position keys, oldest first.'''
+
+	version, white, black, kings, flags, halfmove_clock, num_moves = SNAPSHOT_HEADER.unpack_from(data)
+	if version != SNAPSHOT_VERSION:
+		raise ValueError("unknown snapshot version {}".format(version))
+
+	squares = np.zeros(NUM_SQUARES, dtype=np.int8)
+	for square in range(NUM_SQUARES):
+		bit = 1 << square
+		if white & bit or black & bit:
+			squares[square] = (1 if white & bit else -1) * (2 if kings & bit else 1)
+
+	player = 1 if flags & FLAG_WHITE_TO_MOVE else -1
+	history = unpack_history(squares, player, num_moves, data[SNAPSHOT_HEADER.size:])
+	difficulty_level = DIFFICULTY_LEVELS[flags >> FLAG_LEVEL_SHIFT]
+
+	return squares, player, history, difficulty_level, bool(flags & FLAG_AGGRESSIVE), halfmove_clock
+
+def snapshot_game(game):
+	'''Returns snapshot bytes for a CheckersGame.'''
+
+	return pack_snapshot(pack_board(game.board), game.current_player, game.recent_positions[:-1], game.difficulty_level, game.aggressive_AI, game.board.halfmove_clock)
+
+def restore_game(data, game):
+	'''Put the state from snapshot bytes into a CheckersGame (e.g. a new one).'''
+
+	squares, player, history, difficulty_level, aggressive, halfmove_clock = unpack_snapshot(data)
+
+	board = unpack_board(squares)
+	board.halfmove_clock = halfmove_clock
+
+	game.set_position(board, player)
+	game.difficulty_level = difficulty_level
+	game.aggressive_AI = aggressive
+
+	# set_position recorded the current position, so adding the earlier ones brings back any draw by repetition
+	game.position_history.update(history)
+	game.recent_positions[:0] = history
+	if max(game.position_history.values()) >= game.repetition_limit:
+		game.is_draw = True
+
+class SnapshotStore(object):
+	"""Class for keeping game snapshots in an SQLite file. Without a path, a temporary file is used and removed on close."""
+	def __init__(self, path=None):
+		super(SnapshotStore, self).__init__()
+
+		self.is_temporary = path is None
+		if self.is_temporary:
+			descriptor, path = tempfile.mkstemp(prefix="checkers-games-", suffix=".sqlite")
+			os.close(descriptor)
+
+		self.path = path
+		self.connection = sqlite3.connect(path, isolation_level=None)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS snapshots (game_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL)")
+
+	def put(self, game_id, snapshot):
+		'''Store a snapshot, replacing any earlier one for the same game.'''
+
+		self.connection.execute("INSERT OR REPLACE INTO snapshots (game_id, snapshot) VALUES (?, ?)", (game_id, snapshot))
+
+	def take(self, game_id):
+		'''Remove and return a game's snapshot, or None if there isn't one.'''
+
+		row = self.connection.execute("SELECT snapshot FROM snapshots WHERE game_id = ?", (game_id,)).fetchone()
+		if row is None:
+			return None
+
+		self.discard(game_id)
+
+		return bytes(row[0])
+
+	def discard(self, game_id):
+		'''Forget a game's snapshot, if there is one.'''
+
+		self.connection.execute("DELETE FROM snapshots WHERE game_id = ?", (game_id,))
+
+	def __len__(self):
+		return self.connection.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+	def close(self):
+		'''Close the database, removing it if it was temporary.'''
+
+		self.connection.close()
+
+		if self.is_temporary:
+			for suffix in ("", "-wal", "-shm"):
+				if os.path.exists(self.path + suffix):
+					os.remove(self.path + suffix)
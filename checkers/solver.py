@@ -0,0 +1,253 @@
+# Will Kearney
+# solver.py
+#
+# A depth-first proof-number (DF-PN) solver for endgames and puzzle positions. Unlike minimax_AB it has no depth limit
+# and no evaluation: it tries to prove that the player to move wins, loses or draws, and returns the moves that show it.
+#
+# DF-PN only answers yes/no questions, so a position is solved with up to two searches: "does the player to move win?"
+# and, if not, "does the opponent win?". If both are disproved the position is a draw. A player with no legal moves
+# loses, and repeated positions and positions past the no-progress limit are draws.
+#
+# Proof and disproof numbers live in a fixed-size table indexed by the low bits of the position key, so memory stays
+# bounded however long the search runs. Like the transposition table, it ignores how a position was reached, so a
+# proof that relies on a repetition draw is occasionally wrong.
+#
+# Usage: python -m checkers.solver "W:WK10,K19:B14" --nodes 1000000
+
+import argparse
+import time
+import numpy as np
+
+from .kernel import get_backend, move_to_locations
+from .search_board import SearchBoard
+from .notation import packed_from_fen, move_to_pdn
+from .constants import *
+
+# proof and disproof numbers this large mean "can't be proved"
+PROOF_INFINITY = 10**9
+
+# how far past the second best child the best child is searched before switching (see mid)
+SOLVER_EPSILON = 0.25
+
+class ProofNumberSolver(object):
+	"""Class for a DF-PN solver with a memory-bounded table of proof and disproof numbers."""
+	def __init__(self, node_limit=SOLVER_NODE_LIMIT, table_size=SOLVER_TABLE_SIZE, draw_plies=DRAW_PLIES, max_plies=SOLVER_MAX_PLIES):
+		super(ProofNumberSolver, self).__init__()
+
+		self.node_limit = node_limit
+		self.table_size = table_size
+		self.table_mask = table_size - 1
+		self.draw_plies = draw_plies
+		self.max_plies = max_plies # lines longer than this count as draws
+
+		self.table = [None] * table_size
+		self.nodes_searched = 0
+		self.aborted = False
+		self.deadline = None # set by solve() when it is given a time limit
+
+		# the player the current search is trying to prove a win for, and the keys of the positions on the current line
+		self.attacker = None
+		self.path = set()
+
+	def solve(self, search_board, player, position_history=(), time_limit=None):
+		'''Solve a position with player to move. Returns (result, moves, nodes searched): result is "win", "loss" or
+		"draw" for player, or "unknown" if the node limit or time_limit (in seconds) ran out, and moves are the packed
+		moves that show the result. Positions in position_history (e.g. from the game so far) count as draws if they come
+		up again.'''
+
+		self.nodes_searched = 0
+		self.aborted = False
+		self.deadline = time.perf_counter() + time_limit if time_limit else None
+
+		wins = self.prove(search_board, player, player, position_history)
+		if wins is None:
+			return "unknown", [], self.nodes_searched
+		if wins:
+			return "win", self.get_proof_moves(search_board, player, True), self.nodes_searched
+
+		# player can't force a win; see whether player can at least avoid losing
+		holds = self.prove(search_board, player, -player, position_history)
+		if holds is None:
+			return "unknown", [], self.nodes_searched
+		if holds:
+			# past the first move the line isn't meaningful, since the opponent's moves in it are arbitrary
+			return "draw", self.get_proof_moves(search_board, player, True)[:1], self.nodes_searched
+
+		return "loss", self.get_proof_moves(search_board, player, False), self.nodes_searched
+
+	def prove(self, search_board, player, attacker, position_history=()):
+		'''Search for a win for attacker. Returns True if player (to move) gets the outcome they want (attacker wins if
+		player is the attacker, or doesn't win if player is the defender), False if not, or None if the node limit ran out.'''
+
+		self.table = [None] * self.table_size
+		self.attacker = attacker
+		self.path = set(position_history)
+
+		phi, delta = self.mid(search_board, player, PROOF_INFINITY, PROOF_INFINITY, 0)
+
+		if self.aborted:
+			return None
+
+		return phi == 0
+
+	def get_draw_numbers(self, player):
+		'''Proof and disproof numbers of a drawn position with player to move: a draw is a win for the defender.'''
+
+		if player == self.attacker:
+			return PROOF_INFINITY, 0
+
+		return 0, PROOF_INFINITY
+
+	def lookup(self, key):
+		'''Returns (phi, delta) stored for a position key, or (1, 1) for a position that hasn't been searched.'''
+
+		entry = self.table[key & self.table_mask]
+		if entry is not None and entry[0] == key:
+			return entry[1], entry[2]
+
+		return 1, 1
+
+	def store(self, key, phi, delta):
+		self.table[key & self.table_mask] = (key, phi, delta)
+
+	def get_children(self, search_board, player):
+		'''Returns a list of (move, child key, fixed numbers) for every legal move; fixed numbers are set for children
+		that are draws because of how they were reached, and are None otherwise.'''
+
+		children = []
+
+		for move in search_board.generate_moves(player).tolist():
+			undo = search_board.make_move(move)
+
+			child_key = search_board.get_key(-player)
+			fixed_numbers = None
+			if child_key in self.path or (self.draw_plies and search_board.halfmove_clock >= self.draw_plies):
+				fixed_numbers = self.get_draw_numbers(-player)
+
+			search_board.unmake_move(move, undo)
+
+			children.append((move, child_key, fixed_numbers))
+
+		return children
+
+	def mid(self, search_board, player, phi_threshold, delta_threshold, ply):
+		'''Expand a node until its numbers reach the thresholds. Numbers are for player (to move): phi is the proof
+		number of "player gets the outcome they want", delta its disproof number.'''
+
+		self.nodes_searched += 1
+		if self.node_limit is not None and self.nodes_searched >= self.node_limit:
+			self.aborted = True
+		if self.deadline is not None and time.perf_counter() >= self.deadline:
+			self.aborted = True
+
+		key = search_board.get_key(player)
+		children = self.get_children(search_board, player)
+
+		if len(children) == 0:
+			# a player who can't move loses, whichever side they're on
+			self.store(key, PROOF_INFINITY, 0)
+			return PROOF_INFINITY, 0
+
+		if ply >= self.max_plies:
+			# stored like any other result, so the parent sees it change and moves on
+			phi, delta = self.get_draw_numbers(player)
+			self.store(key, phi, delta)
+			return phi, delta
+
+		self.path.add(key)
+
+		while True:
+			# phi is the smallest child delta, delta the sum of the child phis
+			phi = PROOF_INFINITY
+			delta = 0
+			second_delta = PROOF_INFINITY
+			best_child = None
+			best_child_phi = 0
+
+			for child in children:
+				child_phi, child_delta = child[2] or self.lookup(child[1])
+				delta = min(delta + child_phi, PROOF_INFINITY)
+
+				if child_delta < phi:
+					second_delta = phi
+					phi = child_delta
+					best_child = child
+					best_child_phi = child_phi
+				elif child_delta < second_delta:
+					second_delta = child_delta
+
+			if phi >= phi_threshold or delta >= delta_threshold or self.aborted:
+				break
+
+			# search the most promising child until it stops being the most promising. Letting it run a little past the
+			# second best child (the "1 + epsilon trick") saves a lot of switching back and forth between the two
+			child_phi_threshold = min(delta_threshold - delta + best_child_phi, PROOF_INFINITY)
+			child_delta_threshold = min(phi_threshold, int(second_delta * (1 + SOLVER_EPSILON)) + 1)
+
+			undo = search_board.make_move(best_child[0])
+			self.mid(search_board, -player, child_phi_threshold, child_delta_threshold, ply + 1)
+			search_board.unmake_move(best_child[0], undo)
+
+		self.path.discard(key)
+		self.store(key, phi, delta)
+
+		return phi, delta
+
+	def get_proof_moves(self, search_board, player, player_wins):
+		'''Follow the table from a solved position: the winning side plays a proving move, the other side any move.
+		Returns the packed moves, stopping where the table no longer knows the line.'''
+
+		moves = []
+		made_moves = []
+		seen_keys = set(self.path)
+
+		for _ in range(self.max_plies):
+			seen_keys.add(search_board.get_key(player))
+			self.path = seen_keys
+
+			chosen_move = None
+			reaches_draw = False
+			for move, child_key, fixed_numbers in self.get_children(search_board, player):
+				child_phi, child_delta = fixed_numbers or self.lookup(child_key)
+
+				# the winning side needs a child that is lost for the opponent; the other side can play anything
+				if (player_wins and child_phi == PROOF_INFINITY and child_delta == 0) or (not player_wins and child_phi == 0):
+					chosen_move = move
+					reaches_draw = fixed_numbers is not None
+					break
+
+			if chosen_move is None:
+				break
+
+			moves.append(chosen_move)
+			made_moves.append((chosen_move, search_board.make_move(chosen_move)))
+			player = -player
+			player_wins = not player_wins
+
+			if reaches_draw:
+				break
+
+		for move, undo in reversed(made_moves):
+			search_board.unmake_move(move, undo)
+
+		return moves
+
+def main():
+	parser = argparse.ArgumentParser(description="Prove a checkers position won, lost or drawn.")
+	parser.add_argument("fen", help="position to solve, as a FEN string")
+	parser.add_argument("--nodes", type=int, default=SOLVER_NODE_LIMIT * 20, help="node limit")
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation backend")
+	args = parser.parse_args()
+
+	packed, player = packed_from_fen(args.fen)
+	search_board = SearchBoard(packed, get_backend(args.backend))
+
+	solver = ProofNumberSolver(node_limit=args.nodes)
+	result, moves, nodes = solver.solve(search_board, player, [search_board.get_key(player)])
+
+	print("{} for {} ({} nodes)".format(result, "white" if player == 1 else "black", nodes))
+	if moves:
+		print(" ".join(move_to_pdn(*move_to_locations(move)) for move in moves))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,58 @@
+# Will Kearney
+# symmetry.py
+#
+# Color-swap symmetry. Turning the board 180 degrees and swapping the colors of every piece (and of the side to move)
+# gives a position that plays exactly like the original: white's men still move up the board, and every move maps to
+# the mirrored move. In the packed square numbering the rotation is just square -> 31 - square.
+#
+# The canonical form of a position is the orientation with white to move, so each position and its color-reversed twin
+# share one canonical key. The transposition table and the analysis cache key on it, which lets either twin answer for
+# the other. A stored move or score then has to be mirrored back when the orientations differ: moves map square by
+# square, scores (positive for white) change sign, and lower and upper bounds swap.
+#
+# Only color-symmetric evaluators can share entries this way. The piece-square tables are (black's entries are white's
+# mirrored and negated), but the centroid term depends on which side the engine plays and a network is trained on
+# positions as they are, so SearchBoard only uses canonical keys when neither is in play.
+
+import numpy as np
+
+from .kernel import encode_move, decode_move
+from .notation import position_key
+from .constants import *
+
+# ZOBRIST_TABLE for the mirrored position: XORing these over the pieces of a position gives the hash of its twin
+MIRRORED_ZOBRIST_TABLE = [[ZOBRIST_TABLE[-value + 2][NUM_SQUARES - 1 - square] for square in range(NUM_SQUARES)] for value in range(-2, 3)]
+
+# how a bound on a score changes when the score changes sign
+MIRRORED_BOUNDS = {EXACT_BOUND: EXACT_BOUND, LOWER_BOUND: UPPER_BOUND, UPPER_BOUND: LOWER_BOUND}
+
+def mirror_squares(squares):
+	'''Returns a packed position turned 180 degrees with the colors swapped.'''
+
+	return -np.asarray(squares, dtype=np.int8)[::-1]
+
+def mirror_move(move):
+	'''Returns the packed move that plays move on the mirrored board.'''
+
+	from_square, to_square, captured_square = decode_move(move)
+
+	if captured_square >= 0:
+		captured_square = NUM_SQUARES - 1 - captured_square
+
+	return encode_move(NUM_SQUARES - 1 - from_square, NUM_SQUARES - 1 - to_square, captured_square)
+
+def canonical_position(squares, player):
+	'''Returns (squares, flipped) for the canonical form of a packed position with player to move: the position itself
+	if white is to move, or its mirror (with white to move) if black is.'''
+
+	if player == 1:
+		return np.array(squares, dtype=np.int8), False
+
+	return mirror_squares(squares), True
+
+def canonical_key(squares, player):
+	'''Returns the 64-bit key of the canonical form of a packed position (see notation.position_key).'''
+
+	canonical_squares, _ = canonical_position(squares, player)
+
+	return position_key(canonical_squares, 1)
@@ -0,0 +1,298 @@
+# Will Kearney
+# tournament.py
+#
+# An engine-vs-engine match harness. Two engine configurations play pairs of games from the same seeded random opening,
+# once with each color, spread across a process pool. The match stops early once a sequential probability ratio test
+# (SPRT) decides between "engine A is elo0 stronger" (H0) and "engine A is elo1 stronger" (H1).
+#
+# An engine is written as LEVEL or LEVEL:PROFILE, where PROFILE is one of EVALUATION_PROFILES or a network weights file
+# ending in .npz (see network.py), e.g.
+#   python -m checkers.tournament Hard:Normal Hard:Material --games 400 --elo0 0 --elo1 50
+#
+# Adding :mcts plays with Monte Carlo tree search (see mcts.py) instead of minimax_AB. To compare the two engines at
+# equal cost, give both the same number of seconds per move:
+#   python -m checkers.tournament Hard:mcts Hard --movetime 0.5
+
+import argparse
+import concurrent.futures
+import math
+import os
+import numpy as np
+
+from .game import CheckersGame
+from .kernel import get_backend
+from .network import get_network
+from .constants import *
+
+class EngineConfig(object):
+	"""The settings that make up one side of a match."""
+	def __init__(self, difficulty_level="Easy", evaluation_profile=DEFAULT_EVALUATION_PROFILE, network_path=None, engine="alphabeta", move_time=None):
+		super(EngineConfig, self).__init__()
+
+		self.difficulty_level = difficulty_level
+		self.evaluation_profile = evaluation_profile
+		self.network_path = network_path
+		self.engine = engine # "alphabeta" or "mcts"
+		self.move_time = move_time # seconds per move, instead of the difficulty level's setting
+
+	def __str__(self):
+		text = self.difficulty_level + ":" + (self.network_path or self.evaluation_profile)
+		if self.engine == "mcts":
+			text += ":mcts"
+
+		return text
+
+def parse_engine(text):
+	'''Parse an engine description like "Hard", "Medium:Aggressive" or "Hard:mcts" into an EngineConfig.'''
+
+	parts = text.split(":")
+
+	engine = "alphabeta"
+	if len(parts) > 1 and parts[-1].lower() == "mcts":
+		engine = "mcts"
+		parts = parts[:-1]
+
+	difficulty_level = parts[0].capitalize()
+	if difficulty_level not in AI_SETTINGS:
+		raise argparse.ArgumentTypeError("unknown level {!r}".format(parts[0]))
+
+	if len(parts) > 1 and parts[1].endswith(".npz"):
+		return EngineConfig(difficulty_level, network_path=parts[1], engine=engine)
+
+	evaluation_profile = DEFAULT_EVALUATION_PROFILE
+	if len(parts) > 1:
+		evaluation_profile = parts[1].capitalize()
+		if evaluation_profile not in EVALUATION_PROFILES:
+			raise argparse.ArgumentTypeError("unknown evaluation profile {!r}".format(parts[1]))
+
+	return EngineConfig(difficulty_level, evaluation_profile, engine=engine)
+
+def play_game(white_engine, black_engine, seed, opening_plies, max_plies, backend):
+	'''Play one game from a seeded random opening. Returns 1 if white wins, -1 if black wins, and 0 for a draw.'''
+
+	# the opening only depends on the seed, so both games of a pair start from the same position
+	opening_generator = np.random.default_rng(seed)
+
+	# each engine plays in a game of its own, so it never sees the other's transposition table, analysis or move cache;
+	# every move is played in both
+	games = {1: CheckersGame(backend=backend), -1: CheckersGame(backend=backend)}
+
+	for player, engine in ((1, white_engine), (-1, black_engine)):
+		games[player].difficulty_level = engine.difficulty_level
+		games[player].evaluation_profile = engine.evaluation_profile
+		games[player].network = get_network(engine.network_path) if engine.network_path else None
+		games[player].engine = engine.engine
+		games[player].move_time = engine.move_time
+
+	game = games[1]
+
+	for _ in range(opening_plies):
+		legal_moves = game.board.get_legal_moves(game.current_player)
+		if len(legal_moves) == 0:
+			break
+
+		from_location, to_location, _ = legal_moves[opening_generator.integers(len(legal_moves))]
+		for opening_game in games.values():
+			opening_game.board.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+			opening_game.current_player = opening_game.current_player * -1
+
+	for opening_game in games.values():
+		opening_game.reset_history()
+
+	# the search shuffles moves with numpy's global generator
+	np.random.seed(seed % (2**32))
+
+	for _ in range(max_plies):
+		if game.winner:
+			return game.winner
+		if game.is_draw:
+			return 0
+
+		player = game.current_player
+
+		if len(game.board.get_legal_moves(player)) == 0:
+			# a player who can't move loses
+			return -player
+
+		move = games[player].make_AI_move(player)
+		games[-player].play_move(move)
+
+	# adjudicate games that run too long as draws
+	return game.winner or 0
+
+def play_pair_game(engine_a, engine_b, pair_index, a_is_white, base_seed, opening_plies, max_plies, backend):
+	'''Play one game of a pair. Returns (pair index, result from engine A's point of view: 1, 0.5 or 0).'''
+
+	if a_is_white:
+		result = play_game(engine_a, engine_b, base_seed + pair_index, opening_plies, max_plies, backend)
+		a_result = result
+	else:
+		result = play_game(engine_b, engine_a, base_seed + pair_index, opening_plies, max_plies, backend)
+		a_result = -result
+
+	return pair_index, (a_result + 1) / 2
+
+def elo_from_score(score):
+	'''Convert an expected score (0 to 1) into an Elo difference.'''
+
+	if score <= 0:
+		return -np.inf
+	if score >= 1:
+		return np.inf
+
+	return 400 * math.log10(score / (1 - score))
+
+def score_from_elo(elo):
+	'''Convert an Elo difference into an expected score.'''
+
+	return 1 / (1 + 10 ** (-elo / 400))
+
+class MatchStatistics(object):
+	"""Class for tracking the wins, draws and losses of engine A, with Elo estimates and the SPRT log-likelihood ratio."""
+	def __init__(self, elo0=SPRT_ELO0, elo1=SPRT_ELO1, alpha=SPRT_ALPHA, beta=SPRT_BETA):
+		super(MatchStatistics, self).__init__()
+
+		self.wins = 0
+		self.draws = 0
+		self.losses = 0
+
+		self.elo0 = elo0
+		self.elo1 = elo1
+		self.lower_bound = math.log(beta / (1 - alpha))
+		self.upper_bound = math.log((1 - beta) / alpha)
+
+	def add_result(self, score):
+		'''Add a game result for engine A (1 = win, 0.5 = draw, 0 = loss).'''
+
+		if score == 1:
+			self.wins += 1
+		elif score == 0:
+			self.losses += 1
+		else:
+			self.draws += 1
+
+	def get_num_games(self):
+		return self.wins + self.draws + self.losses
+
+	def get_score_and_variance(self):
+		'''Returns engine A's mean score and the per-game variance of the score.'''
+
+		num_games = self.get_num_games()
+		score = (self.wins + 0.5 * self.draws) / num_games
+		variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / num_games
+
+		return score, variance
+
+	def get_elo(self):
+		'''Returns (Elo difference, 95% error margin) for engine A, from a normal approximation of the score.'''
+
+		if self.get_num_games() == 0:
+			return 0.0, np.inf
+
+		score, variance = self.get_score_and_variance()
+		margin = 1.96 * math.sqrt(variance / self.get_num_games())
+
+		elo = elo_from_score(score)
+		if not np.isfinite(elo):
+			# a clean sweep says nothing about the size of the difference
+			return elo, np.inf
+
+		elo_low = elo_from_score(score - margin)
+		elo_high = elo_from_score(score + margin)
+
+		return elo, (elo_high - elo_low) / 2
+
+	def get_llr(self):
+		'''Returns the generalized SPRT log-likelihood ratio of H1 (elo1) against H0 (elo0).'''
+
+		if self.get_num_games() == 0:
+			return 0.0
+
+		score, variance = self.get_score_and_variance()
+		if variance == 0:
+			# every game had the same result so far; estimate the variance as if half a game of each result had been played
+			num_games = self.get_num_games() + 1.5
+			smoothed_score = (self.wins + 0.5 + 0.5 * (self.draws + 0.5)) / num_games
+			variance = ((self.wins + 0.5) * (1 - smoothed_score) ** 2 + (self.draws + 0.5) * (0.5 - smoothed_score) ** 2 + (self.losses + 0.5) * smoothed_score ** 2) / num_games
+
+		score0 = score_from_elo(self.elo0)
+		score1 = score_from_elo(self.elo1)
+
+		return self.get_num_games() * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+	def get_decision(self):
+		'''Returns "H1" or "H0" once the SPRT has decided, otherwise None.'''
+
+		llr = self.get_llr()
+
+		if llr >= self.upper_bound:
+			return "H1"
+		if llr <= self.lower_bound:
+			return "H0"
+
+		return None
+
+	def __str__(self):
+		elo, margin = self.get_elo()
+		return "games {}: +{} ={} -{}  elo {:+.1f} +- {:.1f}  LLR {:.2f} [{:.2f}, {:.2f}]".format(self.get_num_games(), self.wins, self.draws, self.losses, elo, margin, self.get_llr(), self.lower_bound, self.upper_bound)
+
+def run_match(engine_a, engine_b, num_pairs, statistics, workers=None, seed=0, opening_plies=4, max_plies=200, backend="auto", report=print):
+	'''Play up to num_pairs game pairs across a process pool, stopping early once the SPRT decides. Returns the decision.'''
+
+	workers = workers or os.cpu_count() or 1
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=get_backend, initargs=(backend,)) as pool:
+		futures = []
+		for pair_index in range(num_pairs):
+			for a_is_white in (True, False):
+				futures.append(pool.submit(play_pair_game, engine_a, engine_b, pair_index, a_is_white, seed, opening_plies, max_plies, backend))
+
+		decision = None
+		for future in concurrent.futures.as_completed(futures):
+			_, score = future.result()
+			statistics.add_result(score)
+			report(str(statistics))
+
+			decision = statistics.get_decision()
+			if decision:
+				# no need to play the rest of the games
+				for pending in futures:
+					pending.cancel()
+				break
+
+	return decision
+
+def main():
+	parser = argparse.ArgumentParser(description="Play two engine configurations against each other with SPRT early stopping.")
+	parser.add_argument("engine_a", type=parse_engine, help="engine under test, e.g. Hard or Medium:Aggressive")
+	parser.add_argument("engine_b", type=parse_engine, help="baseline engine")
+	parser.add_argument("--games", type=int, default=200, help="maximum number of games (played in color-swapped pairs)")
+	parser.add_argument("--elo0", type=float, default=SPRT_ELO0, help="Elo difference under the null hypothesis")
+	parser.add_argument("--elo1", type=float, default=SPRT_ELO1, help="Elo difference under the alternative hypothesis")
+	parser.add_argument("--alpha", type=float, default=SPRT_ALPHA, help="false positive rate")
+	parser.add_argument("--beta", type=float, default=SPRT_BETA, help="false negative rate")
+	parser.add_argument("--seed", type=int, default=0, help="seed for openings and move shuffling")
+	parser.add_argument("--opening-plies", type=int, default=4, help="random plies played before the engines take over")
+	parser.add_argument("--max-plies", type=int, default=200, help="plies after which a game is adjudicated a draw")
+	parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+	parser.add_argument("--backend", choices=["auto", "python", "numba"], default="auto", help="move generation and evaluation backend")
+	parser.add_argument("--movetime", type=float, default=None, help="seconds per move for both engines, instead of their levels' settings")
+	args = parser.parse_args()
+
+	args.engine_a.move_time = args.movetime
+	args.engine_b.move_time = args.movetime
+
+	statistics = MatchStatistics(args.elo0, args.elo1, args.alpha, args.beta)
+
+	print("{} vs {}".format(args.engine_a, args.engine_b))
+	decision = run_match(args.engine_a, args.engine_b, (args.games + 1) // 2, statistics, args.workers, args.seed, args.opening_plies, args.max_plies, args.backend)
+
+	if decision == "H1":
+		print("SPRT: H1 accepted ({} is at least {} Elo stronger)".format(args.engine_a, args.elo1))
+	elif decision == "H0":
+		print("SPRT: H0 accepted ({} is not {} Elo stronger)".format(args.engine_a, args.elo1))
+	else:
+		print("SPRT: inconclusive after {} games".format(statistics.get_num_games()))
+
+if __name__ == '__main__':
+	main()
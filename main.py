@@ -5,6 +5,7 @@
 # Also contains a function for building some plots to analyze gameplay.
 
 import time
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import pygame
@@ -15,6 +16,10 @@ pygame.init()
 from checkers.constants import *
 
 from checkers.game import CheckersGame
+from checkers.analysis_cache import AnalysisCache
+from checkers.network import load_network
+from checkers.profiling import enable_profiling, enable_profiling_from_environment
+from checkers.search_trace import SearchTrace
 
 # setup the pygame window and title
 window = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -47,7 +52,7 @@ def make_centroid_plots():
 		game.aggressive_AI = True
 		current_turn = 0
 
-		while (not game.winner) and (current_turn < max_turns):
+		while (not game.winner) and (not game.is_draw) and (current_turn < max_turns):
 
 			print("\tCurrent turn: {}".format(current_turn))
 
@@ -74,7 +79,7 @@ def make_centroid_plots():
 		game.aggressive_AI = False
 		current_turn = 0
 
-		while (not game.winner) and (current_turn < max_turns):
+		while (not game.winner) and (not game.is_draw) and (current_turn < max_turns):
 
 			print("\tCurrent turn: {}".format(current_turn))
 
@@ -131,7 +136,7 @@ def make_centroid_plots():
 
 	plt.show()
 
-def main():
+def main(analysis_cache_path=None, network_path=None, trace_path=None):
 	# this tells us if the game is running or not
 	running = True
 
@@ -144,6 +149,17 @@ def main():
 	# create the initial board
 	game = CheckersGame()
 
+	if analysis_cache_path:
+		game.analysis_cache = AnalysisCache(analysis_cache_path)
+
+	if network_path:
+		game.network = load_network(network_path)
+
+	search_trace = None
+	if trace_path:
+		search_trace = SearchTrace(trace_path)
+		search_trace.attach(game)
+
 	# start the main event loop
 	while running:
 		# tick the clock forward
@@ -171,7 +187,7 @@ def main():
 
 			game.draw_splash_screen(window, position)
 
-		elif game.winner:
+		elif game.winner or game.is_draw:
 			time.sleep(0.5)
 
 			for event in pygame.event.get():
@@ -185,6 +201,7 @@ def main():
 					game.board.reset()
 					game.winner = None
 					game.current_player = -1
+					game.reset_history()
 					splash_screen = True
 
 			game.draw_game_over_screen(window)
@@ -225,8 +242,23 @@ def main():
 		pygame.display.flip() # I think this may be faster then pygame.display.update()?
 
 	# if we're here, quit the game
+	if search_trace is not None:
+		search_trace.close()
+
 	pygame.quit()
 
 if __name__ == '__main__':
-	main()
+	parser = argparse.ArgumentParser(description="Play checkers against the computer.")
+	parser.add_argument("--profile", metavar="DIR", help="write per-move profiling reports to DIR (or set CHECKERS_PROFILE=DIR)")
+	parser.add_argument("--analysis-cache", metavar="PATH", help="reuse AI search results stored in this SQLite file")
+	parser.add_argument("--network", metavar="PATH", help="evaluate positions with the network weights in this .npz file (see checkers/network.py)")
+	parser.add_argument("--trace", metavar="PATH", help="write a record of every node the AI searches to this file (see checkers/search_trace.py)")
+	args = parser.parse_args()
+
+	if args.profile:
+		enable_profiling(args.profile)
+	else:
+		enable_profiling_from_environment()
+
+	main(args.analysis_cache, args.network, args.trace)
 	# make_centroid_plots()
\ No newline at end of file
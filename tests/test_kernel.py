@@ -0,0 +1,190 @@
+# Will Kearney
+# test_kernel.py
+#
+# Checks the kernel backends against Board (perft, move generation and static evaluation), SearchBoard's incremental
+# updates and canonical keys, and the numba backend against the python one. Only the numba cases are skipped when numba
+# isn't installed.
+
+import numpy as np
+import pytest
+
+from checkers.board import Board
+from checkers.kernel import get_backend, board_perft, decode_move, BACKEND_NAMES
+from checkers.notation import pack_board, unpack_board
+from checkers.search_board import SearchBoard
+from checkers.symmetry import mirror_squares, mirror_move, canonical_key
+from checkers.evaluation import get_evaluation_profile
+from checkers.constants import *
+
+NUM_POSITIONS = 200
+
+def load_backend(name):
+	'''Returns the backend called name, skipping the test if it can't be built here.'''
+
+	if name == "numba":
+		pytest.importorskip("numba")
+
+	return get_backend(name)
+
+def random_positions(seed=0):
+	'''Yield NUM_POSITIONS random packed positions.'''
+
+	generator = np.random.default_rng(seed)
+	for _ in range(NUM_POSITIONS):
+		yield generator.choice(np.array([0, 0, 0, 1, 2, -1, -2], dtype=np.int8), size=NUM_SQUARES)
+
+@pytest.mark.parametrize("backend_name", BACKEND_NAMES)
+@pytest.mark.parametrize("depth", range(1, 5))
+def test_perft_matches_board(backend_name, depth):
+	backend = load_backend(backend_name)
+
+	assert backend.perft(pack_board(Board()), -1, depth) == board_perft(Board(), -1, depth)
+
+@pytest.mark.parametrize("backend_name", BACKEND_NAMES)
+def test_moves_match_board(backend_name):
+	backend = load_backend(backend_name)
+
+	for squares in random_positions():
+		board = unpack_board(squares)
+
+		for player in (1, -1):
+			moves = []
+			for move in backend.generate_moves(squares, player).tolist():
+				from_square, to_square, captured_square = decode_move(move)
+				captured_location = SQUARE_LOCATIONS[captured_square] if captured_square >= 0 else None
+				moves.append((SQUARE_LOCATIONS[from_square], SQUARE_LOCATIONS[to_square], captured_location))
+
+			assert sorted(moves) == sorted(board.get_legal_moves(player))
+
+@pytest.mark.parametrize("backend_name", BACKEND_NAMES)
+def test_evaluation_matches_board(backend_name):
+	backend = load_backend(backend_name)
+	material_table = get_evaluation_profile("Material").table
+
+	for squares in random_positions(1):
+		board = unpack_board(squares)
+
+		# the material profile with a centroid weight of 1 is the evaluation Board uses
+		for aggressive in (False, True):
+			expected = board.static_evaluation(aggressive)
+			evaluation = backend.evaluate(squares, material_table, 1.0 if aggressive else 0.0)
+
+			assert evaluation == expected or np.isclose(evaluation, expected)
+
+@pytest.mark.parametrize("profile_name", sorted(EVALUATION_PROFILES))
+def test_incremental_evaluation(profile_name):
+	backend = get_backend("python")
+	profile = get_evaluation_profile(profile_name)
+
+	for squares in random_positions(2):
+		search_board = SearchBoard(squares.copy(), backend, profile=profile)
+
+		# the incremental evaluation must match a full one after every move and take-back
+		for move in search_board.get_legal_moves(1):
+			undo = search_board.make_move(move)
+			expected = backend.evaluate(search_board.squares, profile.table, profile.centroid_weight)
+			evaluation = search_board.static_evaluation()
+			search_board.unmake_move(move, undo)
+
+			assert evaluation == expected or np.isclose(evaluation, expected)
+
+		assert (search_board.squares == squares).all()
+		assert np.isclose(search_board.static_evaluation(), backend.evaluate(squares, profile.table, profile.centroid_weight))
+
+@pytest.mark.parametrize("profile_name", sorted(EVALUATION_PROFILES))
+def test_incremental_table_score_is_exact(profile_name):
+	backend = get_backend("python")
+	profile = get_evaluation_profile(profile_name)
+	generator = np.random.default_rng(7)
+
+	search_board = SearchBoard(pack_board(Board()), backend, profile=profile)
+	player = -1
+	line = []
+
+	# a long random walk of moves and take-backs must leave the running score exactly equal to a fresh one
+	for _ in range(5000):
+		moves = search_board.get_legal_moves(player)
+		if line and (len(moves) == 0 or generator.random() < 0.45):
+			move, undo = line.pop()
+			search_board.unmake_move(move, undo)
+		elif len(moves) > 0:
+			move = moves[generator.integers(len(moves))]
+			line.append((move, search_board.make_move(move)))
+		else:
+			break
+
+		player = 1 if len(line) % 2 else -1
+
+	assert search_board.table_score == SearchBoard(search_board.squares.copy(), backend, profile=profile).table_score
+
+def test_symmetry():
+	backend = get_backend("python")
+
+	for squares in random_positions(3):
+		search_board = SearchBoard(squares.copy(), backend)
+		twin_board = SearchBoard(mirror_squares(squares), backend)
+
+		for player in (1, -1):
+			# a position and its color-reversed twin share a canonical key, and their moves mirror each other
+			assert search_board.get_table_key(player)[0] == canonical_key(squares, player)
+			assert twin_board.get_table_key(-player)[0] == canonical_key(squares, player)
+
+			moves = sorted(mirror_move(move) for move in backend.generate_moves(squares, player).tolist())
+			assert moves == sorted(backend.generate_moves(twin_board.squares, -player).tolist())
+
+@pytest.fixture(scope="module")
+def backends():
+	return get_backend("python"), load_backend("numba")
+
+@pytest.mark.parametrize("depth", range(5, 7))
+def test_numba_perft(backends, depth):
+	python_backend, numba_backend = backends
+	squares = pack_board(Board())
+
+	assert numba_backend.perft(squares.copy(), -1, depth) == python_backend.perft(squares.copy(), -1, depth)
+
+def test_numba_make_unmake(backends):
+	python_backend, numba_backend = backends
+
+	for squares in random_positions(4):
+		for player in (1, -1):
+			for move in python_backend.generate_moves(squares, player).tolist():
+				python_squares, numba_squares = squares.copy(), squares.copy()
+				python_undo = python_backend.make_move(python_squares, move)
+				numba_undo = numba_backend.make_move(numba_squares, move)
+
+				assert (numba_squares == python_squares).all()
+
+				python_backend.unmake_move(python_squares, move, python_undo)
+				numba_backend.unmake_move(numba_squares, move, numba_undo)
+
+				assert (python_squares == squares).all()
+				assert (numba_squares == squares).all()
+
+@pytest.mark.parametrize("profile_name", sorted(EVALUATION_PROFILES))
+def test_numba_evaluate(backends, profile_name):
+	python_backend, numba_backend = backends
+	profile = get_evaluation_profile(profile_name)
+
+	for squares in random_positions(5):
+		expected = python_backend.evaluate(squares, profile.table, profile.centroid_weight)
+		evaluation = numba_backend.evaluate(squares, profile.table, profile.centroid_weight)
+
+		assert evaluation == expected or np.isclose(evaluation, expected)
+
+		for player in (1, -1):
+			assert numba_backend.count_pieces(squares, player) == python_backend.count_pieces(squares, player)
+
+def test_numba_collect_leaves(backends):
+	for squares in random_positions(6):
+		results = []
+		for backend in backends:
+			leaves = np.zeros((4096, NUM_SQUARES), dtype=np.int8)
+			fixed_scores = np.zeros(4096, dtype=np.float64)
+			count = backend.collect_leaves(squares.copy(), -1, 2, leaves, fixed_scores, 0)
+			results.append((count, leaves[:count], fixed_scores[:count]))
+
+		(python_count, python_leaves, python_scores), (numba_count, numba_leaves, numba_scores) = results
+		assert numba_count == python_count
+		assert (numba_leaves == python_leaves).all()
+		assert np.array_equal(numba_scores, python_scores, equal_nan=True)
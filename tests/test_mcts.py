@@ -0,0 +1,33 @@
+# Will Kearney
+# test_mcts.py
+#
+# Checks that Monte Carlo tree search playouts keep their random numbers to themselves.
+
+import numpy as np
+import pytest
+
+from checkers.board import Board
+from checkers.kernel import get_backend, BACKEND_NAMES
+from checkers.notation import pack_board
+from checkers.evaluation import get_evaluation_profile
+
+@pytest.mark.parametrize("backend_name", BACKEND_NAMES)
+def test_playouts_leave_global_rng_alone(backend_name):
+	if backend_name == "numba":
+		pytest.importorskip("numba")
+
+	kernel = get_backend(backend_name)
+	table = get_evaluation_profile().table
+
+	np.random.seed(123)
+	expected = np.random.random(4)
+
+	np.random.seed(123)
+	kernel.seed_playouts(5)
+	results = [kernel.playout(pack_board(Board()), -1, 40, table, True) for _ in range(3)]
+
+	assert (np.random.random(4) == expected).all()
+
+	# and seeding playouts makes them repeatable
+	kernel.seed_playouts(5)
+	assert [kernel.playout(pack_board(Board()), -1, 40, table, True) for _ in range(3)] == results
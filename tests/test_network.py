@@ -0,0 +1,48 @@
+# Will Kearney
+# test_network.py
+#
+# Checks the network evaluator's name and its incrementally updated accumulator.
+
+import numpy as np
+
+from checkers.board import Board
+from checkers.kernel import get_backend
+from checkers.network import NeuralEvaluator, NUM_FEATURES
+from checkers.notation import pack_board
+from checkers.search_board import SearchBoard
+
+def make_network(seed=0, input_bias=0.5, output_bias=0.0):
+	generator = np.random.default_rng(seed)
+	return NeuralEvaluator(generator.normal(0.0, 0.1, (NUM_FEATURES, 8)), np.full(8, input_bias), generator.normal(0.0, 0.1, 8), output_bias)
+
+def test_name_covers_every_parameter():
+	names = {make_network().name, make_network(seed=1).name, make_network(input_bias=0.25).name, make_network(output_bias=0.1).name}
+
+	assert len(names) == 4
+	assert make_network().name == make_network().name
+
+def test_accumulator_stays_exact():
+	network = make_network()
+	backend = get_backend("python")
+	generator = np.random.default_rng(0)
+
+	search_board = SearchBoard(pack_board(Board()), backend, network=network)
+	player = -1
+	line = []
+
+	# a random walk of moves and take-backs; the incremental accumulator must always equal a fresh one
+	for _ in range(2000):
+		moves = search_board.get_legal_moves(player)
+		if line and (len(moves) == 0 or generator.random() < 0.4):
+			move, undo = line.pop()
+			search_board.unmake_move(move, undo)
+		elif len(moves) > 0:
+			move = moves[generator.integers(len(moves))]
+			line.append((move, search_board.make_move(move)))
+		else:
+			break
+
+		player = 1 if len(line) % 2 else -1
+		assert (search_board.accumulator == network.get_accumulator(search_board.squares)).all()
+
+	assert search_board.static_evaluation() == network.evaluate(search_board.squares) or search_board.num_white_pieces == 0 or search_board.num_black_pieces == 0
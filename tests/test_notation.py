@@ -0,0 +1,80 @@
+# Will Kearney
+# test_notation.py
+#
+# Checks FEN and PDN parsing: round trips through both board forms, and the inputs they must reject.
+
+import numpy as np
+import pytest
+
+from checkers.board import Board
+from checkers.notation import board_from_fen, board_to_fen, packed_from_fen, packed_to_fen, pack_board, parse_pdn_moves, moves_to_pdn, replay_pdn_moves, board_key
+
+FENS = [
+	"B:W21,22,23,24,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11,12",
+	"W:WK10,K19:B14",
+	"B:W18,22,K32:BK1,9,10",
+	"W:W:B5",
+]
+
+@pytest.mark.parametrize("fen", FENS)
+def test_fen_round_trip(fen):
+	board, player = board_from_fen(fen)
+	assert board_to_fen(board, player) == fen
+
+	packed, packed_player = packed_from_fen(fen)
+	assert packed_player == player
+	assert (packed == pack_board(board)).all()
+	assert packed_to_fen(packed, player) == fen
+
+def test_fen_ranges():
+	assert board_to_fen(*board_from_fen("B:W21-32:B1-12")) == FENS[0]
+	assert packed_to_fen(*packed_from_fen("W:WK1-3:B30-32")) == "W:WK1,K2,K3:B30,31,32"
+
+@pytest.mark.parametrize("fen", [
+	"B:W21,22:B21",      # a square for both colors
+	"B:W21,21:B1",       # a square listed twice
+	"B:W1-12:B5",        # a range overlapping the other color
+	"B:W12-1:B20",       # a range that runs backwards
+	"B:W33:B1",          # off the board
+	"B:W0:B1",
+	"X:W1:B2",           # not a side to move
+	"B:W1",              # missing a color
+])
+def test_fen_rejected(fen):
+	with pytest.raises(ValueError):
+		board_from_fen(fen)
+	with pytest.raises(ValueError):
+		packed_from_fen(fen)
+
+def test_pdn_round_trip():
+	text = "1. 11-15 23-18 2. 9-14 18x9 3. 5x14 22-17"
+	moves = parse_pdn_moves(text)
+	assert parse_pdn_moves(moves_to_pdn(moves)) == moves
+
+	board, player = replay_pdn_moves(text)
+
+	# the same moves played by hand
+	expected = Board()
+	for from_location, to_location in moves:
+		expected.move_piece(from_location[0], from_location[1], to_location[0], to_location[1])
+
+	assert player == -1
+	assert board_key(board, player) == board_key(expected, player)
+
+def test_pdn_from_fen():
+	board, player = replay_pdn_moves("10x17", "W:WK10,K19:B14")
+
+	assert player == -1
+	assert board_to_fen(board, player) == "B:WK17,K19:B"
+
+@pytest.mark.parametrize("text, fen", [
+	("11-20", None),                          # not a legal move
+	("11-15 11-16", None),                    # no piece left to move
+	("23-19", None),                          # the wrong side
+	("10-15", "W:WK10,K19:B14"),              # ignores a forced capture
+	("11-15 23-18 15-19 18x11", None),        # captures nothing
+	("11-15 bad", None),                      # not a move at all
+])
+def test_pdn_rejected(text, fen):
+	with pytest.raises(ValueError):
+		replay_pdn_moves(text, fen)
@@ -0,0 +1,33 @@
+# Will Kearney
+# test_selfplay.py
+#
+# Checks that a self-play batch collects the same leaves however often it has to grow.
+
+import numpy as np
+import pytest
+
+from checkers.board import Board
+from checkers.kernel import get_backend, BACKEND_NAMES
+from checkers.notation import pack_board
+from checkers.selfplay import PositionBatch
+
+@pytest.mark.parametrize("backend_name", BACKEND_NAMES)
+def test_add_tree_overflow(backend_name):
+	if backend_name == "numba":
+		pytest.importorskip("numba")
+
+	kernel = get_backend(backend_name)
+	squares = pack_board(Board())
+	original = squares.copy()
+
+	large_batch = PositionBatch(capacity=4096)
+	large_batch.add_tree(kernel, squares, 1, 3)
+
+	# too small for the tree, so collect_leaves runs out of room and the batch grows several times
+	small_batch = PositionBatch(capacity=4)
+	small_batch.add_tree(kernel, squares, 1, 3)
+
+	assert (squares == original).all()
+	assert small_batch.count == large_batch.count
+	assert (small_batch.leaves[:small_batch.count] == large_batch.leaves[:large_batch.count]).all()
+	assert np.array_equal(small_batch.fixed_scores[:small_batch.count], large_batch.fixed_scores[:large_batch.count], equal_nan=True)